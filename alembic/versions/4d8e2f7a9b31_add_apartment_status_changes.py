@@ -0,0 +1,43 @@
+"""add apartment status change log
+
+Revision ID: 4d8e2f7a9b31
+Revises: 3c172cad203c
+Create Date: 2025-12-15 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8e2f7a9b31'
+down_revision: Union[str, None] = '3c172cad203c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('apartment_status_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('complex_id', sa.Integer(), nullable=False),
+    sa.Column('apartment_id', sa.Integer(), nullable=True),
+    sa.Column('block_name', sa.String(), nullable=True),
+    sa.Column('floor', sa.Integer(), nullable=True),
+    sa.Column('unit_number', sa.String(), nullable=True),
+    sa.Column('old_status', sa.String(), nullable=True),
+    sa.Column('new_status', sa.String(), nullable=True),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['complex_id'], ['residential_complexes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['apartment_id'], ['apartment_units.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_apartment_status_changes_complex_seq', 'apartment_status_changes', ['complex_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_apartment_status_changes_complex_seq', table_name='apartment_status_changes')
+    op.drop_table('apartment_status_changes')
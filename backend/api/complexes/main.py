@@ -1,52 +1,94 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import re
 import shutil
-import tempfile
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-import fitz
+import numpy as np
 from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, HTTPException, Body, Query, UploadFile, File, Form, Depends, Response
-from starlette.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Body, Query, UploadFile, File, Form, Depends, Request, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, StreamingResponse
 
 from math import isfinite
 from sqlalchemy.orm import Session, joinedload
 from fastapi_cache.decorator import cache
 
 from backend.core.google_sheets import (
-    get_price_data_for_sheet,
     get_shaxmatka_data,
-    get_price_data_for_sheet_all,
 )
 from backend.core.excel_importer import (
+    _coerce_float,
     import_chess_from_excel,
     import_price_from_excel,
     import_contract_registry_from_excel,
 )
-from backend.database import get_db
+from backend.api.complexes.schemas import ApartmentInfoBatchRequest
+from backend.database import SessionLocal, get_db
+from backend.database.apartment_status_service import (
+    chess_reloaded_since,
+    get_status_changes_since,
+    latest_status_sequence,
+    record_chess_reload,
+    status_change_payload,
+    status_channel,
+)
 from backend.database.models import ResidentialComplex, ContractRegistryEntry
-from backend.core.cache_utils import invalidate_complex_cache
+from backend.core.asset_manifest import ComplexAssets, asset_manifests
+from backend.core.cache_stats import cache_stats
+from backend.core.cache_utils import (
+    clear_complex_caches,
+    collect_plan_prewarm_targets,
+    invalidate_complex,
+    start_plan_prewarm,
+)
+from backend.core.chess_snapshot import ROW_COLUMNS, chess_snapshots
+from backend.core.data_versions import CHESS, PRICES, REGISTRY, RENDERS, SETTINGS, data_versions
+from backend.core.event_hub import event_hub
+from backend.core.floor_plan_cache import PDF_PAGE_OVERRIDES, floor_page_index, page_renders
+from backend.core.compression import supported_encodings
+from backend.core.deps import get_current_user_from_cookie
+from backend.core.hot_keys import hot_keys
+from backend.core.http_cache import conditional_response, make_etag
+from backend.core.payload_cache import (
+    COLUMNAR,
+    PAYLOAD_FORMATS,
+    CachedPayload,
+    apartment_info_payloads,
+    columnar,
+    dumps,
+    json_bytes_response,
+    payload_cache,
+    records_columnar,
+)
 from backend.core.plan_cache import ensure_plan_image_cached
+from backend.core.plan_prewarm import plan_prewarm
+from backend.core.plan_tiles import TILE_ID_LENGTH, plan_tiles
+from backend.core.price_grid import PAYMENT_SHARES, price_grids
+from backend.core.single_flight import single_flight
+from backend.core.search_index import MAX_PAGE_SIZE, SORT_PATTERN, search_indexes
+from backend.core.static import image_variant_response
+from backend.core.unit_prices import unit_price_tables
+from backend.core.warmup import cache_warmup
+from settings import settings
 
 router = APIRouter(prefix='/api/complexes')
 
 BASE_COMPLEX_STATIC = Path('static') / 'Жилые_Комплексы'
 CACHE_TTL_LANDING_SECONDS = 3600  # 1 hour for landing pages
+REGISTRY_CONTRACT_FIELDS = ("block", "blockNormalized", "floor", "apartmentNumber", "contractNumber", "contractDate")
+# ?format=columnar — массивы по колонкам вместо списка строк (меньше JSON, быстрее разбор на клиенте)
+FORMAT_QUERY = Query("rows", alias="format", pattern=f"^({'|'.join(PAYLOAD_FORMATS)})$")
+PRICES_QUERY = Query(False, description="Добавить цены всех квартир по всем вариантам оплаты (prices)")
 
 
 def _collect_render_paths(complex_name: str) -> List[str]:
-    render_dir = BASE_COMPLEX_STATIC / complex_name / 'render'
-    if not render_dir.exists() or not render_dir.is_dir():
-        return []
-    return [
-        f"/static/Жилые_Комплексы/{complex_name}/render/{file.name}"
-        for file in sorted(render_dir.iterdir())
-        if file.is_file() and file.suffix.lower() in {'.png', '.jpg', '.jpeg', '.svg'}
-    ]
+    return list(asset_manifests.get(complex_name).renders)
 
 
 def _sanitize_shaxmatka_rows(rows: Any) -> Tuple[List[List[Any]], List[str], List[int]]:
@@ -199,11 +241,11 @@ async def _get_complexes_impl(db: Session) -> Dict[str, Any]:
 
     response: List[Dict[str, Any]] = []
 
-    if not complexes and BASE_COMPLEX_STATIC.exists():
-        for folder in sorted(p for p in BASE_COMPLEX_STATIC.iterdir() if p.is_dir()):
-            renders = _collect_render_paths(folder.name)
+    if not complexes:
+        for folder_name in asset_manifests.complex_names():
+            renders = _collect_render_paths(folder_name)
             response.append({
-                "name": folder.name,
+                "name": folder_name,
                 "slug": None,
                 "render": renders[0] if renders else "/static/images/default-placeholder.png",
             })
@@ -240,6 +282,14 @@ async def get_complexes_nocache(response: Response, db: Session = Depends(get_db
 
 async def _get_jk_data_impl(jk_name: str, db: Session) -> Dict[str, Any]:
     """Internal implementation for getting JK data (shared by cached and non-cached endpoints)."""
+    complex_record = (
+        db.query(ResidentialComplex)
+        .filter(ResidentialComplex.name == jk_name)
+        .first()
+    )
+    # Номер последнего изменения берём до чтения шахматки: изменения после него клиент дотянет дельтой
+    status_sequence = latest_status_sequence(db, complex_record.id) if complex_record else 0
+
     try:
         shaxmatka_rows = await get_shaxmatka_data(jk_name)
     except HTTPException as exc:
@@ -253,11 +303,6 @@ async def _get_jk_data_impl(jk_name: str, db: Session) -> Dict[str, Any]:
     renders = _collect_render_paths(jk_name)
     sanitized, blocks, floors = _sanitize_shaxmatka_rows(shaxmatka_rows)
     registry_contracts: List[Dict[str, Any]] = []
-    complex_record = (
-        db.query(ResidentialComplex)
-        .filter(ResidentialComplex.name == jk_name)
-        .first()
-    )
     if complex_record:
         registry_contracts = _build_registry_contracts(db, complex_record.id)
     return {
@@ -267,75 +312,425 @@ async def _get_jk_data_impl(jk_name: str, db: Session) -> Dict[str, Any]:
         "floors": floors,
         "render": renders[1] if len(renders) > 1 else (renders[0] if renders else None),
         "registryContracts": registry_contracts,
+        "statusSequence": status_sequence,
+    }
+
+
+def _jk_data_etag(jk_name: str, payload_format: str, with_prices: bool = False) -> str:
+    return make_etag(
+        "jk",
+        jk_name,
+        payload_format,
+        data_versions.current(jk_name, CHESS),
+        data_versions.current(jk_name, REGISTRY),
+        _renders_version(jk_name),
+        data_versions.current(jk_name, PRICES) if with_prices else None,
+    )
+
+
+def _jk_cache_key(jk_name: str, payload_format: str, with_prices: bool) -> Tuple[str, ...]:
+    return ("jk", jk_name, payload_format, "prices") if with_prices else ("jk", jk_name, payload_format)
+
+
+def _columnar_jk_data(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **payload,
+        "format": COLUMNAR,
+        "shaxmatka": columnar(payload["shaxmatka"], ROW_COLUMNS),
+        "registryContracts": records_columnar(payload["registryContracts"], REGISTRY_CONTRACT_FIELDS),
     }
 
 
+async def _preload_chess_snapshot(jk_name: str) -> None:
+    """Loads the chess snapshot in the thread pool, so the event loop keeps serving other requests."""
+    try:
+        await run_in_threadpool(chess_snapshots.get, jk_name)
+    except Exception:  # noqa: BLE001 - the handler reading the snapshot reports the error
+        pass
+
+
+async def _build_jk_payload(
+        jk_name: str,
+        payload_format: str,
+        etag: str,
+        db: Session,
+        with_prices: bool = False,
+) -> Any:
+    """Builds and caches the JK body; returns the CachedPayload, or the error payload as is."""
+    cache_key = _jk_cache_key(jk_name, payload_format, with_prices)
+    # Тяжёлые части (загрузка шахматки, сериализация) — в пуле потоков, чтобы не блокировать цикл событий
+    await _preload_chess_snapshot(jk_name)
+    payload = await _get_jk_data_impl(jk_name, db)
+    if payload.get("status") != "success":
+        # Ошибка сборки: старое тело больше не отдаём
+        payload_cache.discard(cache_key)
+        return payload
+    if payload_format == COLUMNAR:
+        payload = _columnar_jk_data(payload)
+    if with_prices:
+        # Цены всех квартир по всем вариантам оплаты, в порядке строк шахматки
+        table = await run_in_threadpool(unit_price_tables.get, jk_name)
+        payload["prices"] = table.columns() if payload_format == COLUMNAR else table.rows()
+    body = await run_in_threadpool(dumps, payload)
+    return payload_cache.put(cache_key, etag, body)
+
+
+async def _rebuild_jk_payload(jk_name: str, payload_format: str, etag: str, with_prices: bool = False) -> Any:
+    """
+    Builds the JK body in its own session: the build is shared by coalesced
+    requests and may outlive them (stale-while-revalidate, a disconnected client).
+    """
+    db = SessionLocal()
+    try:
+        return await _build_jk_payload(jk_name, payload_format, etag, db, with_prices)
+    finally:
+        db.close()
+
+
+def _serve_stale(
+        request: Request,
+        response: Response,
+        cache_key: Tuple[Any, ...],
+        refresh_key: Tuple[Any, ...],
+        refresh: Any,
+) -> Optional[Response]:
+    """
+    Stale-while-revalidate: answers with the previous body (under its own ETag)
+    and starts one background rebuild. None when there is nothing stale to serve.
+    """
+    if not settings.CACHE_STALE_WHILE_REVALIDATE:
+        return None
+    stale = payload_cache.get_stale(cache_key)
+    if stale is None:
+        return None
+    stale_etag, cached = stale
+    single_flight.refresh(refresh_key, refresh, f"payload:{cache_key[0]}", cache_key[1])
+    cache_stats.stale(f"payload:{cache_key[0]}", cache_key[1])
+    response.headers["ETag"] = str(stale_etag)
+    return json_bytes_response(request, response, cached)
+
+
+async def _jk_data_response(
+        request: Request,
+        response: Response,
+        jk_name: str,
+        payload_format: str,
+        allow_stale: bool = False,
+        with_prices: bool = False,
+) -> Any:
+    """
+    Serves JK data from the pre-serialized body cache; ETag doubles as the cache version.
+    Concurrent misses share one rebuild; with ``allow_stale`` they get the previous body meanwhile.
+    """
+    etag = _jk_data_etag(jk_name, payload_format, with_prices)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    cache_key = _jk_cache_key(jk_name, payload_format, with_prices)
+    cached = payload_cache.get(cache_key, etag)
+    if cached is None:
+        refresh_key = (cache_key, etag)
+        if allow_stale:
+            stale_response = _serve_stale(
+                request, response, cache_key, refresh_key,
+                lambda: _rebuild_jk_payload(jk_name, payload_format, etag, with_prices),
+            )
+            if stale_response is not None:
+                return stale_response
+        result = await single_flight.run(
+            refresh_key,
+            lambda: _rebuild_jk_payload(jk_name, payload_format, etag, with_prices),
+            "payload:jk",
+            jk_name,
+        )
+        if not isinstance(result, CachedPayload):
+            return result
+        cached = result
+    return json_bytes_response(request, response, cached)
+
+
 @router.get("/jk/{jk_name}")
-@cache(expire=CACHE_TTL_LANDING_SECONDS, namespace="complexes:jk")
-async def get_jk_data(jk_name: str, db: Session = Depends(get_db)):
-    """Get JK data WITH CACHING - for landing pages."""
-    return await _get_jk_data_impl(jk_name, db)
+async def get_jk_data(
+        request: Request,
+        response: Response,
+        jk_name: str,
+        payload_format: str = FORMAT_QUERY,
+        prices: bool = PRICES_QUERY,
+):
+    """Get JK data WITH HTTP CACHING (ETag) - for landing pages."""
+    return await _jk_data_response(
+        request, response, jk_name, payload_format, allow_stale=True, with_prices=prices,
+    )
 
 
 @router.get("/nocache/jk/{jk_name}")
-async def get_jk_data_nocache(response: Response, jk_name: str, db: Session = Depends(get_db)):
-    """Get JK data WITHOUT CACHING - for CRM real-time updates."""
-    # Отключаем кеширование браузера
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+async def get_jk_data_nocache(
+        request: Request,
+        response: Response,
+        jk_name: str,
+        payload_format: str = FORMAT_QUERY,
+        prices: bool = PRICES_QUERY,
+):
+    """Get JK data WITHOUT STALE CACHING - for CRM real-time updates (revalidated by ETag on every request)."""
+    # Браузер обязан проверять актуальность при каждом запросе; 304 если данные не менялись
+    response.headers["Cache-Control"] = "no-cache, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
-    return await _get_jk_data_impl(jk_name, db)
+    return await _jk_data_response(request, response, jk_name, payload_format, with_prices=prices)
+
+
+@router.get("/nocache/status-changes/{jk_name}", summary="Изменения статусов квартир после номера изменения")
+async def get_status_changes(
+        jk_name: str,
+        since: int = Query(0, ge=0, description="statusSequence из /jk или sequence из прошлого ответа"),
+        limit: int = Query(1000, ge=1, le=5000),
+        db: Session = Depends(get_db),
+):
+    """
+    Only the apartments whose status changed after ``since``, oldest first.
+    ``reset`` means the chessboard was reloaded and the client must re-fetch /jk.
+    """
+    complex_record = (
+        db.query(ResidentialComplex)
+        .filter(ResidentialComplex.name == jk_name)
+        .first()
+    )
+    if not complex_record:
+        return {"status": "error", "message": f"ЖК '{jk_name}' не найден"}
+
+    sequence = latest_status_sequence(db, complex_record.id)
+    if chess_reloaded_since(db, complex_record.id, since):
+        return {"status": "success", "reset": True, "sequence": sequence, "hasMore": False, "changes": []}
+
+    changes = get_status_changes_since(db, complex_record.id, since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    return {
+        "status": "success",
+        "reset": False,
+        "sequence": changes[-1].id if has_more else max(sequence, since),
+        "hasMore": has_more,
+        "changes": [status_change_payload(change) for change in changes],
+    }
+
+
+SSE_HEARTBEAT_SECONDS = 15.0
+# Сколько пропущенных изменений досылать при переподключении; больше — клиенту проще перезапросить /jk
+SSE_REPLAY_LIMIT = 1000
+
+
+def _sse_message(payload: Dict[str, Any]) -> str:
+    lines = []
+    if payload.get("sequence") is not None:
+        lines.append(f"id: {payload['sequence']}")
+    lines.append(f"event: {payload.get('type', 'status')}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/nocache/events/{jk_name}", summary="SSE-поток изменений статусов квартир ЖК")
+async def stream_status_events(
+        request: Request,
+        jk_name: str,
+        since: Optional[int] = Query(None, ge=0, description="Дослать изменения после этого номера"),
+        db: Session = Depends(get_db),
+):
+    """
+    Server-Sent Events stream of apartment status changes of one complex.
+
+    Events are pushed as soon as the change commits. On reconnect the browser
+    sends Last-Event-ID and missed changes are replayed from the status log first.
+    """
+    complex_record = (
+        db.query(ResidentialComplex)
+        .filter(ResidentialComplex.name == jk_name)
+        .first()
+    )
+    if not complex_record:
+        raise HTTPException(status_code=404, detail=f"ЖК '{jk_name}' не найден")
+
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    channel = status_channel(complex_record.id)
+    # Подписываемся до чтения журнала, чтобы не потерять изменения между ними
+    queue = event_hub.subscribe(channel)
+    try:
+        backlog: List[Dict[str, Any]] = []
+        if since is not None:
+            if chess_reloaded_since(db, complex_record.id, since):
+                backlog = [{"type": "reset", "sequence": latest_status_sequence(db, complex_record.id)}]
+            else:
+                changes = get_status_changes_since(db, complex_record.id, since, SSE_REPLAY_LIMIT + 1)
+                if len(changes) > SSE_REPLAY_LIMIT:
+                    backlog = [{"type": "reset", "sequence": latest_status_sequence(db, complex_record.id)}]
+                else:
+                    backlog = [status_change_payload(change) for change in changes]
+    except Exception:
+        event_hub.unsubscribe(channel, queue)
+        raise
+
+    async def event_stream():
+        last_sequence = backlog[-1]["sequence"] if backlog else (since or 0)
+        try:
+            yield "retry: 3000\n\n"
+            for payload in backlog:
+                yield _sse_message(payload)
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                sequence = payload.get("sequence")
+                if sequence is not None:
+                    if sequence <= last_sequence:
+                        continue
+                    last_sequence = sequence
+                yield _sse_message(payload)
+        finally:
+            event_hub.unsubscribe(channel, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Готовые элементы /aggregate по ЖК: имя -> (ключ актуальности, элемент)
+_AGGREGATE_ENTRIES: Dict[str, Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+
+
+def _renders_version(jk_name: str) -> int:
+    """Version of the render folder; the asset manifest bumps it when the folder changes on disk."""
+    asset_manifests.get(jk_name)
+    return data_versions.current(jk_name, RENDERS)
+
+
+async def _get_aggregate_entry(jk_name: str, complex_id: Optional[int]) -> Dict[str, Any]:
+    """Aggregate element of one complex, rebuilt only when its chess data or renders change."""
+    chess_version = data_versions.current(jk_name, CHESS)
+    key = (complex_id, chess_version, _renders_version(jk_name))
+    cached = _AGGREGATE_ENTRIES.get(jk_name)
+    if cached is not None and cached[0] == key:
+        cache_stats.hit("aggregate-entry", jk_name)
+        return cached[1]
+    cache_stats.miss("aggregate-entry", jk_name)
+    return await single_flight.run(
+        ("aggregate-entry", jk_name, key),
+        lambda: _build_aggregate_entry(jk_name, complex_id, key),
+        "aggregate-entry",
+        jk_name,
+    )
+
+
+async def _build_aggregate_entry(jk_name: str, complex_id: Optional[int], key: Tuple[Any, ...]) -> Dict[str, Any]:
+    """
+    Builds and stores the element under ``key``. When the chessboard fails to
+    load, the previous element is served and stays under its old key, so the
+    next request retries; without a previous element the error propagates.
+    """
+    await _preload_chess_snapshot(jk_name)
+    try:
+        shaxmatka_rows = await get_shaxmatka_data(jk_name)
+    except Exception as exc:
+        previous = _AGGREGATE_ENTRIES.get(jk_name)
+        if previous is None:
+            raise
+        print(f"[aggregate] failed to load shaxmatka for {jk_name}: {exc}; serving the previous entry")
+        return previous[1]
+
+    sanitized, blocks, floors = _sanitize_shaxmatka_rows(shaxmatka_rows)
+    renders = _collect_render_paths(jk_name)
+
+    entry = {
+        "id": complex_id,
+        "name": jk_name,
+        "slug": None,
+        "render": renders[0] if renders else "/static/images/default-placeholder.png",
+        "renders": renders,
+        "blocks": blocks,
+        "floors": floors,
+        "shaxmatka": sanitized,
+        "version": max(key[1:]),
+        "updatedAt": datetime.utcnow().isoformat() + "Z",
+    }
+    _AGGREGATE_ENTRIES[jk_name] = (key, entry)
+    return entry
 
 
 @router.get("/aggregate", summary="Получить агрегированные данные по ЖК")
-async def get_complexes_aggregate(db: Session = Depends(get_db)):
+async def get_complexes_aggregate(
+        request: Request,
+        response: Response,
+        since: Optional[int] = Query(None, description="Вернуть только ЖК, изменившиеся после этой версии"),
+        payload_format: str = FORMAT_QUERY,
+        db: Session = Depends(get_db),
+):
     complexes = (
         db.query(ResidentialComplex)
         .order_by(ResidentialComplex.name.asc())
         .all()
     )
 
-    response: List[Dict[str, Any]] = []
-
     names: List[str]
     id_map: Dict[str, Optional[int]]
 
     if complexes:
         names = [c.name for c in complexes]
         id_map = {c.name: c.id for c in complexes}
-    elif BASE_COMPLEX_STATIC.exists():
-        names = [folder.name for folder in BASE_COMPLEX_STATIC.iterdir() if folder.is_dir()]
-        id_map = {name: None for name in names}
     else:
-        names = []
-        id_map = {}
+        names = list(asset_manifests.complex_names())
+        id_map = {name: None for name in names}
 
-    for jk_name in sorted(names):
+    names = sorted(names)
+    entries = []
+    for jk_name in names:
         try:
-            shaxmatka_rows = await get_shaxmatka_data(jk_name)
+            entries.append(await _get_aggregate_entry(jk_name, id_map.get(jk_name)))
         except Exception as exc:
+            # ЖК без готового элемента пропускаем: ETag ответа без него другой, и следующий запрос повторит сборку
             print(f"[aggregate] failed to load shaxmatka for {jk_name}: {exc}")
-            shaxmatka_rows = []
-
-        sanitized, blocks, floors = _sanitize_shaxmatka_rows(shaxmatka_rows)
-        renders = _collect_render_paths(jk_name)
-
-        response.append({
-            "id": id_map.get(jk_name),
-            "name": jk_name,
-            "slug": None,
-            "render": renders[0] if renders else "/static/images/default-placeholder.png",
-            "renders": renders,
-            "blocks": blocks,
-            "floors": floors,
-            "shaxmatka": sanitized,
-        })
-
-    return {
-        "status": "success",
-        "updatedAt": datetime.utcnow().isoformat() + "Z",
-        "complexes": response,
-    }
+    for stale_name in set(_AGGREGATE_ENTRIES) - set(names):
+        _AGGREGATE_ENTRIES.pop(stale_name, None)
+
+    version = max((entry["version"] for entry in entries), default=0)
+    etag = make_etag(
+        "aggregate",
+        since,
+        payload_format,
+        tuple((entry["name"], entry["id"], entry["version"]) for entry in entries),
+    )
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    cache_key = ("aggregate", None, since, payload_format)
+    cached = payload_cache.get(cache_key, etag)
+    if cached is None:
+        updated_at = max((entry["updatedAt"] for entry in entries), default=None)
+        if since is not None:
+            entries = [entry for entry in entries if entry["version"] > since]
+        if payload_format == COLUMNAR:
+            entries = [{**entry, "shaxmatka": columnar(entry["shaxmatka"], ROW_COLUMNS)} for entry in entries]
+
+        payload: Dict[str, Any] = {
+            "status": "success",
+            "version": version,
+            "updatedAt": updated_at or datetime.utcnow().isoformat() + "Z",
+            "names": names,
+            "complexes": entries,
+        }
+        if payload_format == COLUMNAR:
+            payload["format"] = COLUMNAR
+        cached = payload_cache.put(cache_key, etag, dumps(payload))
+    return json_bytes_response(request, response, cached)
 
 
 def extract_price_value(price_data: Any, key: str) -> Optional[float]:
@@ -371,9 +766,11 @@ def extract_price_value(price_data: Any, key: str) -> Optional[float]:
 
 @router.get("/plan-image")
 async def get_plan_image(
+        request: Request,
         jkName: str = Query(..., alias="jkName"),
         blockName: str = Query(..., alias="blockName"),
-        apartmentSize: str = Query(..., alias="apartmentSize")
+        apartmentSize: str = Query(..., alias="apartmentSize"),
+        w: Optional[int] = Query(None, ge=1, description="Ширина: уменьшенная копия WebP/AVIF по Accept"),
 ):
     if not all([jkName, blockName, apartmentSize]):
         raise HTTPException(status_code=400, detail="Отсутствуют обязательные параметры")
@@ -385,16 +782,16 @@ async def get_plan_image(
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Не удалось подготовить план: {exc}") from exc
 
+    variant = await image_variant_response(
+        cached_path, w, request.headers.get("accept"), settings.IMAGE_VARIANTS_AVIF
+    )
+    if variant is not None:
+        return variant
     return FileResponse(cached_path)
 
 
 # (floor-plan endpoint, add-complex, etc., would continue below with DB/caching logic)
 
-def _natural_key(path: str) -> List[Any]:
-    name = os.path.basename(path)
-    return [int(fragment) if fragment.isdigit() else fragment.lower() for fragment in re.split(r'(\d+)', name)]
-
-
 def _sanitize_token(value: Optional[str]) -> List[str]:
     if value is None:
         return []
@@ -422,150 +819,97 @@ def _sanitize_token(value: Optional[str]) -> List[str]:
     return list(variants)
 
 
-@router.get("/floor-plan")
-async def get_floor_plan(
-        jkName: str = Query(..., alias="jkName"),
-        floor: str = Query(..., alias="floor"),
-        blockName: Optional[str] = Query(None, alias="blockName")
-):
-    if not jkName or not floor:
-        raise HTTPException(status_code=400, detail="Параметры jkName и floor обязательны")
-
-    base_dir = os.path.join('static', 'Жилые_Комплексы', jkName)
-    if not os.path.isdir(base_dir):
-        raise HTTPException(status_code=404, detail=f"ЖК {jkName} не найден")
-
-    pdf_candidates = [
-        os.path.join(base_dir, name)
-        for name in ("plan_roof.pdf", "Plan pradaja.pdf")
-        if os.path.exists(os.path.join(base_dir, name))
-    ]
-    PDF_PAGE_OVERRIDES: Dict[str, int] = {
-        "ЖК_Рассвет": 1,
-    }
-
-    pdf_plan_path = pdf_candidates[0] if pdf_candidates else None
-
+async def _load_unique_floors(jk_name: str) -> List[int]:
+    """Этажи из шахматки в порядке появления (нужны, только если в PDF нет подписи этажа)."""
     try:
-        floor_number = int(float(str(floor).replace(',', '.')))
-    except ValueError:
-        floor_number = None
-
-    unique_floors: List[int] = []
-    try:
-        shaxmatka_data = await get_shaxmatka_data(jkName)
+        shaxmatka_data = await get_shaxmatka_data(jk_name)
     except Exception as exc:
-        print(f"[floor-plan] failed to load shaxmatka for {jkName}: {exc}")
-        shaxmatka_data = None
+        print(f"[floor-plan] failed to load shaxmatka for {jk_name}: {exc}")
+        return []
 
-    if shaxmatka_data:
-        seen = set()
-        for row in shaxmatka_data:
-            if len(row) < 7:
-                continue
-            val = row[6]
-            if val in (None, ''):
+    floors: List[int] = []
+    seen = set()
+    for row in shaxmatka_data or ():
+        if len(row) < 7:
+            continue
+        val = row[6]
+        if val in (None, ''):
+            continue
+        try:
+            num = int(float(str(val).replace(',', '.')))
+        except (ValueError, TypeError):
+            continue
+        if num not in seen:
+            floors.append(num)
+            seen.add(num)
+    return floors
+
+
+async def _fallback_floor_page(jk_name: str, floor_number: Optional[int], page_count: int) -> int:
+    """Страница этажа, когда в PDF нет его подписи: по PDF_PAGE_OVERRIDES или по этажам шахматки."""
+    if page_count <= 0:
+        return 0
+    if floor_number is None:
+        return 0
+    override = PDF_PAGE_OVERRIDES.get(jk_name)
+    if override is not None:
+        adjusted = override + max(0, floor_number - 1)
+        return max(0, min(adjusted, page_count - 1))
+    unique_floors = await _load_unique_floors(jk_name)
+    if unique_floors:
+        floors_sorted = sorted(unique_floors)
+        min_floor = floors_sorted[0]
+        max_floor = floors_sorted[-1]
+
+        ordered_sequences: List[List[int]] = []
+        if (max_floor - floor_number) <= (floor_number - min_floor):
+            ordered_sequences.append(sorted(unique_floors, reverse=True))
+            ordered_sequences.append(sorted(unique_floors))
+        else:
+            ordered_sequences.append(sorted(unique_floors))
+            ordered_sequences.append(sorted(unique_floors, reverse=True))
+        ordered_sequences.append(unique_floors)
+
+        seen_sequences = set()
+        for seq in ordered_sequences:
+            key = tuple(seq)
+            if not seq or key in seen_sequences:
                 continue
+            seen_sequences.add(key)
             try:
-                num = int(float(str(val).replace(',', '.')))
-            except (ValueError, TypeError):
+                idx = seq.index(floor_number)
+                return max(0, min(idx, page_count - 1))
+            except ValueError:
                 continue
-            if num not in seen:
-                unique_floors.append(num)
-                seen.add(num)
-
-    def fallback_index(page_count: int) -> int:
-        if page_count <= 0:
-            return 0
-        if floor_number is None:
-            return 0
-        override = PDF_PAGE_OVERRIDES.get(jkName)
-        if override is not None:
-            adjusted = override + max(0, floor_number - 1)
-            return max(0, min(adjusted, page_count - 1))
-        if unique_floors:
-            floors_sorted = sorted(unique_floors)
-            min_floor = floors_sorted[0]
-            max_floor = floors_sorted[-1]
-
-            ordered_sequences: List[List[int]] = []
-            if (max_floor - floor_number) <= (floor_number - min_floor):
-                ordered_sequences.append(sorted(unique_floors, reverse=True))
-                ordered_sequences.append(sorted(unique_floors))
-            else:
-                ordered_sequences.append(sorted(unique_floors))
-                ordered_sequences.append(sorted(unique_floors, reverse=True))
-            ordered_sequences.append(unique_floors)
-
-            seen_sequences = set()
-            for seq in ordered_sequences:
-                key = tuple(seq)
-                if not seq or key in seen_sequences:
-                    continue
-                seen_sequences.add(key)
-                try:
-                    idx = seq.index(floor_number)
-                    return max(0, min(idx, page_count - 1))
-                except ValueError:
-                    continue
-        return max(0, min(floor_number - 1, page_count - 1))
+    return max(0, min(floor_number - 1, page_count - 1))
 
-    def find_pdf_page_index(doc: fitz.Document) -> Optional[int]:
-        if floor_number is None:
-            return None
-        override = PDF_PAGE_OVERRIDES.get(jkName)
-        if override is not None:
-            return max(0, min(override + max(0, floor_number - 1), doc.page_count - 1))
-        tokens = {
-            str(floor_number),
-            f"{floor_number:02d}",
-            str(floor_number).replace('.', ','),
-            str(floor_number).replace('.', ' ')
-        }
-        for idx, page in enumerate(doc):
-            text = page.get_text() or ''
-            normalized = re.sub(r'\s+', '', text.lower())
-            for token in tokens:
-                if f"этаж{token}" in normalized or f"floor{token}" in normalized:
-                    return idx
+
+def _parse_floor_number(floor: str) -> Optional[int]:
+    try:
+        return int(float(str(floor).replace(',', '.')))
+    except ValueError:
         return None
 
-    precomputed_dir = os.path.join('static', 'floorplans', jkName)
-    if os.path.isdir(precomputed_dir):
-        png_files = sorted(
-            [
-                os.path.join(precomputed_dir, name)
-                for name in os.listdir(precomputed_dir)
-                if name.lower().endswith('.png')
-            ],
-            key=_natural_key
-        )
 
-        if png_files:
-            page_index = None
-            doc = None
-            if pdf_plan_path:
-                try:
-                    doc = fitz.open(pdf_plan_path)
-                    page_index = find_pdf_page_index(doc)
-                except Exception as exc:
-                    print(f"[floor-plan] failed to analyse PDF {pdf_plan_path}: {exc}")
-                finally:
-                    if doc:
-                        doc.close()
-            if page_index is None:
-                page_index = fallback_index(len(png_files))
-            page_index = max(0, min(page_index, len(png_files) - 1))
-            return FileResponse(png_files[page_index])
+def _floor_plan_pdf(assets: ComplexAssets) -> Optional[str]:
+    """Общий PDF планов этажей ЖК."""
+    for name in ("plan_roof.pdf", "Plan pradaja.pdf"):
+        path = assets.root_file(name)
+        if path:
+            return path
+    return None
+
 
+def _floor_plan_candidates(floor: str, block_name: Optional[str]) -> List[str]:
+    """Имена файлов плана этажа в порядке предпочтения."""
     floor_tokens = _sanitize_token(floor)
-    block_tokens = _sanitize_token(blockName) if blockName else []
+    block_tokens = _sanitize_token(block_name) if block_name else []
 
     candidates: List[str] = []
 
     def add_candidates(prefix: str) -> None:
         for ext in ('.png', '.jpg', '.jpeg', '.webp', '.svg', '.pdf'):
-            candidates.append(os.path.join(base_dir, prefix + ext))
+            candidates.append(prefix + ext)
 
     if block_tokens:
         for block_token in block_tokens:
@@ -581,29 +925,65 @@ async def get_floor_plan(
     add_candidates('floorplan')
     add_candidates('plan_roof')
 
-    seen = set()
-    for path in candidates:
-        if path in seen:
-            continue
-        seen.add(path)
-        if not os.path.exists(path):
+    return list(dict.fromkeys(candidates))
+
+
+async def _floor_pdf_page(jk_name: str, pdf_path: Path, floor_number: Optional[int]) -> Tuple[int, str]:
+    """(страница этажа, хэш PDF) по индексу «этаж → страница»; без подписи этажа — запасной вариант."""
+    page_index, page_count, pdf_hash = await run_in_threadpool(
+        floor_page_index.page_for_floor, jk_name, pdf_path, floor_number,
+    )
+    if page_index is None:
+        page_index = await _fallback_floor_page(jk_name, floor_number, page_count)
+    return max(0, min(page_index, page_count - 1)), pdf_hash
+
+
+@router.get("/floor-plan")
+async def get_floor_plan(
+        jkName: str = Query(..., alias="jkName"),
+        floor: str = Query(..., alias="floor"),
+        blockName: Optional[str] = Query(None, alias="blockName")
+):
+    if not jkName or not floor:
+        raise HTTPException(status_code=400, detail="Параметры jkName и floor обязательны")
+
+    assets = asset_manifests.get(jkName)
+    if not assets.exists:
+        raise HTTPException(status_code=404, detail=f"ЖК {jkName} не найден")
+
+    pdf_plan_path = _floor_plan_pdf(assets)
+    floor_number = _parse_floor_number(floor)
+
+    png_files = assets.floorplan_pages
+    if png_files:
+        page_index = None
+        if pdf_plan_path:
+            try:
+                # Индекс «этаж → страница» хранится на диске, PDF читается только после изменения
+                page_index, _, _ = await run_in_threadpool(
+                    floor_page_index.page_for_floor, jkName, Path(pdf_plan_path), floor_number,
+                )
+            except Exception as exc:
+                print(f"[floor-plan] failed to analyse PDF {pdf_plan_path}: {exc}")
+        if page_index is None:
+            page_index = await _fallback_floor_page(jkName, floor_number, len(png_files))
+        page_index = max(0, min(page_index, len(png_files) - 1))
+        return FileResponse(png_files[page_index])
+
+    for name in _floor_plan_candidates(floor, blockName):
+        # Имена проверяем по манифесту ЖК, без обращения к диску
+        path = assets.root_file(name)
+        if path is None:
             continue
 
         ext = os.path.splitext(path)[1].lower()
         if ext == '.pdf':
             try:
-                doc = fitz.open(path)
-                page_index = find_pdf_page_index(doc)
-                if page_index is None:
-                    page_index = fallback_index(doc.page_count)
-                page_index = max(0, min(page_index, doc.page_count - 1))
-                page = doc.load_page(page_index)
-                pix = page.get_pixmap()
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
-                    pix.save(tmp_file.name)
-                    tmp_path = tmp_file.name
-                doc.close()
-                return FileResponse(tmp_path, media_type="image/png")
+                pdf_path = Path(path)
+                page_index, pdf_hash = await _floor_pdf_page(jkName, pdf_path, floor_number)
+                # Готовая картинка страницы из дискового кэша; рендерим только при первом запросе
+                rendered = await run_in_threadpool(page_renders.get, pdf_path, pdf_hash, page_index)
+                return FileResponse(rendered, media_type="image/png")
             except Exception as exc:
                 print(f"[floor-plan] Ошибка обработки PDF {path}: {exc}")
                 continue
@@ -613,6 +993,73 @@ async def get_floor_plan(
     raise HTTPException(status_code=404, detail="План этажа не найден")
 
 
+@router.get("/floor-plan/tiles")
+async def get_floor_plan_tiles(
+        jkName: str = Query(..., alias="jkName"),
+        floor: str = Query(..., alias="floor"),
+        blockName: Optional[str] = Query(None, alias="blockName")
+):
+    """Описание пирамиды тайлов (Deep Zoom) для страницы плана этажа: ссылка на .dzi и размеры."""
+    assets = asset_manifests.get(jkName)
+    if not assets.exists:
+        raise HTTPException(status_code=404, detail=f"ЖК {jkName} не найден")
+
+    # Тот же PDF, что и у /floor-plan: общий PDF ЖК, затем PDF из имён-кандидатов
+    pdf_plan_path = _floor_plan_pdf(assets)
+    if pdf_plan_path is None:
+        pdf_plan_path = next(
+            (
+                path for path in (assets.root_file(name) for name in _floor_plan_candidates(floor, blockName))
+                if path and path.lower().endswith('.pdf')
+            ),
+            None,
+        )
+    if pdf_plan_path is None:
+        raise HTTPException(status_code=404, detail="PDF плана этажа не найден")
+
+    pdf_path = Path(pdf_plan_path)
+    page_index, pdf_hash = await _floor_pdf_page(jkName, pdf_path, _parse_floor_number(floor))
+    tile_id = pdf_hash[:TILE_ID_LENGTH]
+    geometry = await run_in_threadpool(plan_tiles.geometry, pdf_path, tile_id, page_index)
+    return {
+        "status": "success",
+        "page": page_index,
+        "dzi": f"/api/complexes/plan-tiles/{tile_id}/{page_index}.dzi",
+        **geometry.to_dict(),
+    }
+
+
+_TILE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/plan-tiles/{pdf_hash}/{page_index}.dzi")
+async def get_plan_tiles_descriptor(pdf_hash: str, page_index: int):
+    """Deep Zoom дескриптор страницы PDF (адрес по хэшу содержимого — не меняется)."""
+    pdf_path = await run_in_threadpool(plan_tiles.resolve, pdf_hash)
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail="PDF не найден или изменился")
+    try:
+        descriptor = await run_in_threadpool(plan_tiles.dzi, pdf_path, pdf_hash, page_index)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Страница не найдена")
+    return Response(
+        descriptor, media_type="application/xml", headers={"Cache-Control": _TILE_CACHE_CONTROL},
+    )
+
+
+@router.get("/plan-tiles/{pdf_hash}/{page_index}_files/{level}/{column}_{row}.png")
+async def get_plan_tile(pdf_hash: str, page_index: int, level: int, column: int, row: int):
+    """Тайл 256×256 страницы PDF; рендерится при первом запросе и хранится на диске."""
+    pdf_path = await run_in_threadpool(plan_tiles.resolve, pdf_hash)
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail="PDF не найден или изменился")
+    try:
+        tile = await run_in_threadpool(plan_tiles.tile, pdf_path, pdf_hash, page_index, level, column, row)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Тайл не найден")
+    return FileResponse(tile, media_type="image/png", headers={"Cache-Control": _TILE_CACHE_CONTROL})
+
+
 async def _get_blocks_impl(jk_name: str) -> Dict[str, Any]:
     """Internal implementation for getting blocks (shared by cached and non-cached endpoints)."""
     try:
@@ -624,21 +1071,199 @@ async def _get_blocks_impl(jk_name: str) -> Dict[str, Any]:
     return {"status": "success", "blocks": blocks}
 
 
+def _blocks_etag(jk_name: str) -> str:
+    return make_etag("blocks", jk_name, data_versions.current(jk_name, CHESS))
+
+
+async def _build_blocks_payload(jk_name: str, etag: str) -> Any:
+    await _preload_chess_snapshot(jk_name)
+    payload = await _get_blocks_impl(jk_name)
+    if payload.get("status") != "success":
+        payload_cache.discard(("blocks", jk_name))
+        return payload
+    return payload_cache.put(("blocks", jk_name), etag, dumps(payload))
+
+
+async def _blocks_response(request: Request, jk_name: str, response: Response, allow_stale: bool = False) -> Any:
+    etag = _blocks_etag(jk_name)
+    cache_key = ("blocks", jk_name)
+    cached = payload_cache.get(cache_key, etag)
+    if cached is None:
+        refresh_key = (cache_key, etag)
+        if allow_stale:
+            stale_response = _serve_stale(
+                request, response, cache_key, refresh_key,
+                lambda: _build_blocks_payload(jk_name, etag),
+            )
+            if stale_response is not None:
+                return stale_response
+        result = await single_flight.run(
+            refresh_key, lambda: _build_blocks_payload(jk_name, etag), "payload:blocks", jk_name,
+        )
+        if not isinstance(result, CachedPayload):
+            return result
+        cached = result
+    return json_bytes_response(request, response, cached)
+
+
 @router.get("/blocks/{jk_name}")
-@cache(expire=CACHE_TTL_LANDING_SECONDS, namespace="complexes:blocks")
-async def get_blocks(jk_name: str):
-    """Get blocks WITH CACHING - for landing pages."""
-    return await _get_blocks_impl(jk_name)
+async def get_blocks(request: Request, response: Response, jk_name: str):
+    """Get blocks WITH HTTP CACHING (ETag) - for landing pages."""
+    etag = _blocks_etag(jk_name)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+    return await _blocks_response(request, jk_name, response, allow_stale=True)
 
 
 @router.get("/nocache/blocks/{jk_name}")
-async def get_blocks_nocache(response: Response, jk_name: str):
-    """Get blocks WITHOUT CACHING - for CRM real-time updates."""
-    # Отключаем кеширование браузера
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+async def get_blocks_nocache(request: Request, response: Response, jk_name: str):
+    """Get blocks WITHOUT STALE CACHING - for CRM real-time updates (revalidated by ETag on every request)."""
+    # Браузер обязан проверять актуальность при каждом запросе; 304 если данные не менялись
+    response.headers["Cache-Control"] = "no-cache, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
-    return await _get_blocks_impl(jk_name)
+    not_modified = conditional_response(request, response, _blocks_etag(jk_name))
+    if not_modified is not None:
+        return not_modified
+    return await _blocks_response(request, jk_name, response)
+
+
+def _months_left_until_delivery(complex_record: Optional[ResidentialComplex]) -> int:
+    """Количество полных месяцев до окончания рассрочки ЖК."""
+    try:
+        if complex_record and complex_record.installment_start_date:
+            start_date = datetime.combine(complex_record.installment_start_date, datetime.min.time())
+            installment_months = complex_record.installment_months
+        else:
+            start_date = datetime(2025, 12, 1)
+            installment_months = 36
+
+        end_date = start_date + relativedelta(months=installment_months)
+
+        today = datetime.today()
+        diff_years = end_date.year - today.year
+        diff_months = end_date.month - today.month
+        months_left = diff_years * 12 + diff_months
+        if today.day > 1:
+            months_left -= 1
+        return max(months_left, 0)
+    except Exception as e:
+        print(f"Ошибка при расчете месяцев до сдачи: {e}")
+        return 0
+
+
+async def _load_apartment_info_context(jkName: str) -> Dict[str, Any]:
+    """
+    Loads everything apartment-info needs for one complex: the chessboard snapshot,
+    the price grid, months left and installment settings. Computed once and reused
+    for every apartment of a batch; concurrent requests for the same data versions
+    share one load.
+    """
+    key = (
+        "apartment-info-context",
+        jkName,
+        data_versions.current(jkName, CHESS),
+        data_versions.current(jkName, PRICES),
+        data_versions.current(jkName, SETTINGS),
+    )
+    return await single_flight.run(
+        key, lambda: _build_apartment_info_context(jkName), "apartment-info-context", jkName,
+    )
+
+
+async def _build_apartment_info_context(jkName: str) -> Dict[str, Any]:
+    snapshot = await run_in_threadpool(chess_snapshots.get, jkName)
+
+    # Своя сессия: загрузку делят несколько запросов, и она может пережить любой из них
+    db = SessionLocal()
+    try:
+        complex_record = (
+            db.query(ResidentialComplex)
+            .filter(ResidentialComplex.name == jkName)
+            .first()
+        )
+    finally:
+        db.close()
+
+    try:
+        price_grid = await run_in_threadpool(price_grids.get, jkName)
+    except Exception as e:
+        print(f"Ошибка при загрузке цен для ЖК {jkName}: {e}")
+        price_grid = None
+
+    return {
+        "snapshot": snapshot,
+        "price_grid": price_grid,
+        "months_left": _months_left_until_delivery(complex_record),
+        "hybrid_installment_enabled": complex_record.hybrid_installment_enabled if complex_record else False,
+        "installment_months": complex_record.installment_months if complex_record else 36,
+    }
+
+
+def _resolve_apartment_infos(
+        context: Dict[str, Any],
+        apartments: List[Tuple[Any, Any, Any, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Builds apartment-info responses from a preloaded context for
+    (blockName, apartmentSize, floor, apartmentNumber) tuples. Prices for all
+    apartments come from one vectorized price grid lookup.
+    """
+    price_grid = context["price_grid"]
+    if price_grid is not None:
+        price_rows = price_grid.unit_prices([floor for _, _, floor, _ in apartments], PAYMENT_SHARES)
+    else:
+        price_rows = np.full((len(apartments), len(PAYMENT_SHARES)), np.nan)
+
+    snapshot = context["snapshot"]
+    results: List[Dict[str, Any]] = []
+    for (blockName, apartmentSize, floor, apartmentNumber), price_row in zip(apartments, price_rows):
+        if not all([blockName, apartmentSize, floor, apartmentNumber]):
+            results.append({"status": "error", "message": "Отсутствуют обязательные параметры"})
+            continue
+
+        # Площадь разбираем так же, как snapshot.find: запятая вместо точки, пробелы
+        target_size = _coerce_float(apartmentSize)
+        if target_size is None:
+            results.append({"status": "error", "message": "Некорректная площадь квартиры"})
+            continue
+
+        position = snapshot.find(blockName, floor, apartmentNumber, area=target_size)
+        if position is None:
+            results.append({"status": "error", "message": "Квартира не найдена"})
+            continue
+
+        prices = {
+            str(share): None if np.isnan(value) else float(value)
+            for share, value in zip(PAYMENT_SHARES, price_row)
+        }
+
+        total_price = None
+        if prices.get("100"):
+            total_price = prices["100"] * target_size
+
+        response_data = {
+            "pricePerM2_100": round(prices.get("100") or 0),
+            "pricePerM2_70": round(prices.get("70") or 0),
+            "pricePerM2_50": round(prices.get("50") or 0),
+            "pricePerM2_30": round(prices.get("30") or 0),
+            "total_price": round(total_price) if total_price else None,
+            "status": snapshot.status_at(position),
+            "floor": floor,
+            "size": apartmentSize,
+            "apartment_number": apartmentNumber,
+            "months_left": context["months_left"],
+            "roomsCount": snapshot.rooms_at(position),
+            "unitType": snapshot.unit_type_at(position),
+            "hybrid_installment_enabled": context["hybrid_installment_enabled"],
+            "installment_months": context["installment_months"],
+        }
+        results.append({
+            "status": "success",
+            "data": response_data
+        })
+    return results
 
 
 async def _get_apartment_info_impl(
@@ -647,167 +1272,182 @@ async def _get_apartment_info_impl(
         apartmentSize: str,
         floor: str,
         apartmentNumber: str,
-        db: Session
 ) -> Dict[str, Any]:
     """Internal implementation for getting apartment info (shared by cached and non-cached endpoints)."""
     if not all([jkName, blockName, apartmentSize, floor, apartmentNumber]):
         return {"status": "error", "message": "Отсутствуют обязательные параметры"}
 
     try:
-        shaxmatka_rows = await get_shaxmatka_data(jkName)
-        if isinstance(shaxmatka_rows, dict) and "error" in shaxmatka_rows:
-            return {"status": "error", "message": shaxmatka_rows["error"]}
-        sanitized_rows, _, _ = _sanitize_shaxmatka_rows(shaxmatka_rows)
+        context = await _load_apartment_info_context(jkName)
     except HTTPException as e:
         return {"status": "error", "message": e.detail}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-    target_status = None
-    target_rooms = None
-    target_unit_type = None
-    normalized_block = blockName.strip().lower()
-    target_floor = int(float(str(floor).replace(',', '.')))
-    target_size = float(str(apartmentSize).replace(',', '.'))
-    target_number = str(apartmentNumber).strip()
+    return _resolve_apartment_infos(context, [(blockName, apartmentSize, floor, apartmentNumber)])[0]
 
-    for row in sanitized_rows:
-        if len(row) < 7:
-            continue
-        row_block = str(row[0]).strip().lower()
-        try:
-            row_floor = int(float(str(row[6]).replace(',', '.')))
-            row_size = float(str(row[5]).replace(',', '.'))
-        except (ValueError, TypeError):
-            continue
-        row_number = str(row[4]).strip() if row[4] is not None else ""
-
-        if (
-            row_block == normalized_block and
-            row_floor == target_floor and
-            abs(row_size - target_size) <= 0.15 and
-            row_number == target_number
-        ):
-            target_status = row[2]
-            if len(row) > 1:
-                target_unit_type = row[1] if row[1] is not None else None
-            if len(row) > 3:
-                rooms_value = row[3]
-                if rooms_value is not None:
-                    try:
-                        target_rooms = int(float(str(rooms_value).replace(',', '.')))
-                    except (ValueError, TypeError):
-                        target_rooms = rooms_value
-                else:
-                    target_rooms = None
-            else:
-                target_rooms = None
-            break
 
-    if target_status is None:
-        return {"status": "error", "message": "Квартира не найдена"}
+def _apartment_info_etag(jkName: str, blockName: str, apartmentSize: str, floor: str, apartmentNumber: str) -> str:
+    # months_left зависит от текущей даты; статусы других блоков на ответ не влияют
+    return make_etag(
+        "apartment-info",
+        jkName, blockName, apartmentSize, floor, apartmentNumber,
+        data_versions.current_scoped(jkName, CHESS, _normalize_block_name(blockName)),
+        data_versions.current(jkName, PRICES),
+        data_versions.current(jkName, SETTINGS),
+        datetime.today().date().isoformat(),
+    )
 
-    try:
-        complex_record = (
-            db.query(ResidentialComplex)
-            .filter(ResidentialComplex.name == jkName)
-            .first()
-        )
 
-        if complex_record and complex_record.installment_start_date:
-            from datetime import datetime as dt
-            start_date = dt.combine(complex_record.installment_start_date, dt.min.time())
-            installment_months = complex_record.installment_months
-        else:
-            start_date = datetime(2025, 12, 1)
-            installment_months = 36
+APARTMENT_INFO = "apartment-info"
 
-        end_date = start_date + relativedelta(months=installment_months)
 
-        today = datetime.today()
-        diff_years = end_date.year - today.year
-        diff_months = end_date.month - today.month
-        months_left = diff_years * 12 + diff_months
-        if today.day > 1:
-            months_left -= 1
-        months_left = max(months_left, 0)
-    except Exception as e:
-        print(f"Ошибка при расчете месяцев до сдачи: {e}")
-        months_left = 0
+async def _build_apartment_info_payload(cache_key: Tuple[str, ...], etag: str) -> Any:
+    """Builds and caches one apartment-info body; errors (unknown apartment) are returned as is."""
+    _, jkName, blockName, apartmentSize, floor, apartmentNumber = cache_key
+    payload = await _get_apartment_info_impl(jkName, blockName, apartmentSize, floor, apartmentNumber)
+    if payload.get("status") != "success":
+        return payload
+    return apartment_info_payloads.put(cache_key, etag, dumps(payload))
 
-    price_keys = {
-        "100": f"{jkName}_{floor}_100",
-        "70": f"{jkName}_{floor}_0.7",
-        "50": f"{jkName}_{floor}_0.5",
-        "30": f"{jkName}_{floor}_0.3",
-    }
-    prices: Dict[str, Optional[float]] = {}
-    for key, price_key in price_keys.items():
-        try:
-            price_data = await get_price_data_for_sheet(price_key)
-            prices[key] = extract_price_value(price_data, price_key)
-        except Exception as e:
-            print(f"Ошибка при извлечении цены для ключа {price_key}: {e}")
-            prices[key] = None
-
-    total_price = None
-    if prices.get("100"):
-        total_price = prices["100"] * target_size
-
-    response_data = {
-        "pricePerM2_100": round(prices.get("100") or 0),
-        "pricePerM2_70": round(prices.get("70") or 0),
-        "pricePerM2_50": round(prices.get("50") or 0),
-        "pricePerM2_30": round(prices.get("30") or 0),
-        "total_price": round(total_price) if total_price else None,
-        "status": target_status,
-        "floor": floor,
-        "size": apartmentSize,
-        "apartment_number": apartmentNumber,
-        "months_left": months_left,
-        "roomsCount": target_rooms,
-        "unitType": target_unit_type,
-        "hybrid_installment_enabled": complex_record.hybrid_installment_enabled if complex_record else False,
-        "installment_months": complex_record.installment_months if complex_record else 36,
-    }
 
-    return {
-        "status": "success",
-        "data": response_data
-    }
+async def _apartment_info_response(
+        request: Request,
+        response: Response,
+        jkName: str,
+        blockName: str,
+        apartmentSize: str,
+        floor: str,
+        apartmentNumber: str,
+) -> Any:
+    """apartment-info from the body cache keyed by the request parameters; the ETag is the version."""
+    etag = _apartment_info_etag(jkName, blockName, apartmentSize, floor, apartmentNumber)
+    cache_key = (APARTMENT_INFO, jkName, blockName, apartmentSize, floor, apartmentNumber)
+    # Частые квартиры прогреваются заранее (_warm_apartment_info). Считаем только найденные квартиры
+    # (в кэше лежат лишь успешные ответы), чтобы произвольные jkName не копились в рейтинге
+    params = (blockName, apartmentSize, floor, apartmentNumber)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        if apartment_info_payloads.contains(cache_key, etag):
+            hot_keys.record(APARTMENT_INFO, jkName, params)
+        return not_modified
+
+    cached = apartment_info_payloads.get(cache_key, etag)
+    if cached is None:
+        result = await single_flight.run(
+            (cache_key, etag),
+            lambda: _build_apartment_info_payload(cache_key, etag),
+            "payload:apartment-info",
+            jkName,
+        )
+        if not isinstance(result, CachedPayload):
+            return result
+        cached = result
+    hot_keys.record(APARTMENT_INFO, jkName, params)
+    return json_bytes_response(request, response, cached)
 
 
 @router.get("/apartment-info")
-@cache(expire=CACHE_TTL_LANDING_SECONDS, namespace="complexes:apartment-info")
 async def get_apartment_info(
+        request: Request,
+        response: Response,
         jkName: str = Query(..., alias="jkName"),
         blockName: str = Query(..., alias="blockName"),
         apartmentSize: str = Query(..., alias="apartmentSize"),
         floor: str = Query(..., alias="floor"),
         apartmentNumber: str = Query(..., alias="apartmentNumber"),
-        db: Session = Depends(get_db)
 ):
-    """Get apartment info WITH CACHING - for landing pages."""
-    return await _get_apartment_info_impl(jkName, blockName, apartmentSize, floor, apartmentNumber, db)
+    """Get apartment info WITH HTTP CACHING (ETag) - for landing pages."""
+    return await _apartment_info_response(
+        request, response, jkName, blockName, apartmentSize, floor, apartmentNumber,
+    )
 
 
 @router.get("/nocache/apartment-info")
 async def get_apartment_info_nocache(
+        request: Request,
         response: Response,
         jkName: str = Query(..., alias="jkName"),
         blockName: str = Query(..., alias="blockName"),
         apartmentSize: str = Query(..., alias="apartmentSize"),
         floor: str = Query(..., alias="floor"),
         apartmentNumber: str = Query(..., alias="apartmentNumber"),
-        db: Session = Depends(get_db)
 ):
-    """Get apartment info WITHOUT CACHING - for CRM real-time updates."""
-    # Отключаем кеширование браузера
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    """Get apartment info WITHOUT STALE CACHING - for CRM real-time updates (revalidated by ETag on every request)."""
+    # Браузер обязан проверять актуальность при каждом запросе; 304 если данные не менялись
+    response.headers["Cache-Control"] = "no-cache, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
-    return await _get_apartment_info_impl(jkName, blockName, apartmentSize, floor, apartmentNumber, db)
+    return await _apartment_info_response(
+        request, response, jkName, blockName, apartmentSize, floor, apartmentNumber,
+    )
+
+
+@router.post("/apartment-info/batch")
+async def get_apartment_info_batch(payload: ApartmentInfoBatchRequest):
+    """
+    Apartment info for many apartments of one complex in a single request.
+
+    The chessboard, price matrix and installment settings are loaded once per batch;
+    results come back in request order, each in the same shape as /apartment-info.
+    """
+    if not payload.jkName:
+        return {"status": "error", "message": "Отсутствуют обязательные параметры"}
 
+    try:
+        context = await _load_apartment_info_context(payload.jkName)
+    except HTTPException as e:
+        return {"status": "error", "message": e.detail}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+    results = _resolve_apartment_infos(context, [
+        (item.blockName, str(item.apartmentSize), str(item.floor), str(item.apartmentNumber))
+        for item in payload.apartments
+    ])
+    return {"status": "success", "results": results}
+
+
+@router.get("/search", summary="Поиск квартир по всем ЖК")
+async def search_apartments(
+        request: Request,
+        response: Response,
+        jkName: Optional[List[str]] = Query(None, description="ЖК (можно несколько)"),
+        status: Optional[List[str]] = Query(None, description="Статусы (можно несколько)"),
+        rooms: Optional[List[int]] = Query(None, description="Число комнат (можно несколько)"),
+        areaMin: Optional[float] = Query(None, ge=0),
+        areaMax: Optional[float] = Query(None, ge=0),
+        floorMin: Optional[int] = Query(None),
+        floorMax: Optional[int] = Query(None),
+        priceMin: Optional[float] = Query(None, ge=0, description="Полная стоимость при 100% оплате"),
+        priceMax: Optional[float] = Query(None, ge=0),
+        sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="price, area, floor; -price — по убыванию"),
+        skip: int = Query(0, ge=0, description="Пропустить N квартир"),
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Квартир на странице"),
+        db: Session = Depends(get_db),
+):
+    """Квартиры всех ЖК по фильтрам, с сортировкой, постраничностью и счётчиками по значениям фильтров."""
+    names = [name for (name,) in db.query(ResidentialComplex.name).order_by(ResidentialComplex.name).all()]
+    # Индекс пересобирается только после изменения шахматки или цен какого-либо ЖК
+    index = await run_in_threadpool(search_indexes.get, names)
+
+    etag = make_etag("search", index.key, tuple(sorted(request.query_params.multi_items())))
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    result = index.query(
+        complexes=jkName or (),
+        statuses=status or (),
+        rooms=rooms or (),
+        area=(areaMin, areaMax),
+        floor=(floorMin, floorMax),
+        price=(priceMin, priceMax),
+        sort=sort,
+        skip=skip,
+        limit=limit,
+    )
+    return {"status": "success", "skip": skip, "limit": limit, **result}
 
 
 def _slugify(name: str) -> Optional[str]:
@@ -874,13 +1514,16 @@ async def add_complex(
 
     try:
         apartments = import_chess_from_excel(db, complex_record, str(complex_dir / "jk_data.xlsx"))
+        record_chess_reload(db, complex_record.id)
         prices = import_price_from_excel(db, complex_record, str(complex_dir / "price_shaxamtka.xlsx"))
         db.commit()
     except Exception as exc:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка импорта Excel данных: {exc}") from exc
 
-    await invalidate_complex_cache()
+    asset_manifests.invalidate(name)
+    # Новый ЖК: все виды данных этого ЖК и список комплексов
+    await invalidate_complex(name)
 
     return {
         "message": "ЖК успешно добавлен",
@@ -893,13 +1536,150 @@ async def add_complex(
     }
 
 
+async def _require_admin(current_user=Depends(get_current_user_from_cookie)) -> None:
+    """Служебные эндпоинты кэша: роутер публичный, поэтому проверяем роль здесь."""
+    if not getattr(current_user, "role", None) or current_user.role.name != "Админ":
+        raise HTTPException(status_code=403, detail="Доступно только администраторам")
+
+
 @router.post("/clear-cache")
 async def clear_cache():
     """Очистить кеш комплексов (для разработки)."""
-    await invalidate_complex_cache()
+    await clear_complex_caches()
     return {"status": "success", "message": "Кеш успешно очищен"}
 
 
+@router.get("/cache-stats", dependencies=[Depends(_require_admin)])
+async def get_cache_stats(reset: bool = Query(False, description="Обнулить счётчики после чтения")):
+    """Попадания и промахи кешей по каждому ЖК."""
+    caches = cache_stats.snapshot()
+    if reset:
+        cache_stats.reset()
+    return {"status": "success", "caches": caches}
+
+
+async def _precompress(payload: CachedPayload) -> None:
+    """Builds the gzip/Brotli variants a visitor would otherwise wait for."""
+    for encoding in supported_encodings():
+        await run_in_threadpool(payload.encoded, encoding)
+
+
+async def _warm_jk(jk_name: str) -> int:
+    built = 0
+    for payload_format in PAYLOAD_FORMATS:
+        etag = _jk_data_etag(jk_name, payload_format)
+        cache_key = ("jk", jk_name, payload_format)
+        if payload_cache.contains(cache_key, etag):
+            continue
+        result = await single_flight.run(
+            (cache_key, etag),
+            lambda: _rebuild_jk_payload(jk_name, payload_format, etag),
+            "payload:jk",
+            jk_name,
+        )
+        if isinstance(result, CachedPayload):
+            await _precompress(result)
+            built += 1
+    return built
+
+
+async def _warm_blocks(jk_name: str) -> int:
+    etag = _blocks_etag(jk_name)
+    cache_key = ("blocks", jk_name)
+    if payload_cache.contains(cache_key, etag):
+        return 0
+    result = await single_flight.run(
+        (cache_key, etag), lambda: _build_blocks_payload(jk_name, etag), "payload:blocks", jk_name,
+    )
+    if not isinstance(result, CachedPayload):
+        return 0
+    await _precompress(result)
+    return 1
+
+
+async def _warm_aggregate(jk_name: str) -> int:
+    db = SessionLocal()
+    try:
+        complex_record = db.query(ResidentialComplex).filter(ResidentialComplex.name == jk_name).first()
+    finally:
+        db.close()
+    await _get_aggregate_entry(jk_name, complex_record.id if complex_record else None)
+    return 1
+
+
+async def _warm_apartment_info(jk_name: str) -> int:
+    """Loads the complex's apartment-info context and builds the bodies of its most requested apartments."""
+    context = await _load_apartment_info_context(jk_name)
+
+    pending: List[Tuple[Tuple[str, ...], str]] = []
+    for blockName, apartmentSize, floor, apartmentNumber in hot_keys.top(
+            APARTMENT_INFO, jk_name, settings.CACHE_WARMUP_APARTMENT_INFO,
+    ):
+        cache_key = (APARTMENT_INFO, jk_name, blockName, apartmentSize, floor, apartmentNumber)
+        etag = _apartment_info_etag(jk_name, blockName, apartmentSize, floor, apartmentNumber)
+        if not apartment_info_payloads.contains(cache_key, etag):
+            pending.append((cache_key, etag))
+    if not pending:
+        return 0
+
+    def build() -> int:
+        # Одним пакетом, как /apartment-info/batch: цены всех квартир — один векторный запрос
+        results = _resolve_apartment_infos(context, [cache_key[2:] for cache_key, _ in pending])
+        built = 0
+        for (cache_key, etag), result in zip(pending, results):
+            if result.get("status") == "success":
+                apartment_info_payloads.put(cache_key, etag, dumps(result))
+                built += 1
+        return built
+
+    return await run_in_threadpool(build)
+
+
+cache_warmup.register("jk", _warm_jk)
+cache_warmup.register("blocks", _warm_blocks)
+cache_warmup.register("aggregate", _warm_aggregate)
+cache_warmup.register(APARTMENT_INFO, _warm_apartment_info)
+
+
+@router.get("/warmup")
+async def get_warmup_status():
+    """Последний прогрев кэшей: время и число собранных записей по каждому ЖК и эндпоинту."""
+    return {"status": "success", "warmup": cache_warmup.status()}
+
+
+@router.post("/warmup", dependencies=[Depends(_require_admin)])
+async def run_warmup(
+        jkName: Optional[str] = Query(None, alias="jkName", description="Только этот ЖК (по умолчанию — все)"),
+        db: Session = Depends(get_db),
+):
+    """Прогреть кэши эндпоинтов сейчас и вернуть время по каждому ЖК."""
+    if jkName:
+        names = [jkName]
+    else:
+        names = [name for (name,) in db.query(ResidentialComplex.name).order_by(ResidentialComplex.name).all()]
+    return {
+        "status": "success",
+        "warmup": await cache_warmup.run(names, settings.CACHE_WARMUP_CONCURRENCY),
+    }
+
+
+@router.get("/plan-prewarm", dependencies=[Depends(_require_admin)])
+async def get_plan_prewarm_status():
+    """Ход прогрева планировок в этом воркере (busy — прогрев выполняет другой воркер)."""
+    return {"status": "success", "prewarm": plan_prewarm.status()}
+
+
+@router.post("/plan-prewarm", dependencies=[Depends(_require_admin)])
+async def run_plan_prewarm():
+    """Запустить прогрев планировок сейчас; неизменённые с прошлого прогрева планировки пропускаются."""
+    started = start_plan_prewarm(await run_in_threadpool(collect_plan_prewarm_targets))
+    return {
+        "status": "success" if started else "running",
+        "message": "Прогрев планировок запущен" if started else "Прогрев планировок уже выполняется",
+        "prewarm": plan_prewarm.status(),
+    }
+
+
 @router.get("/installment-settings/{jk_name}")
 async def get_installment_settings(jk_name: str, db: Session = Depends(get_db)):
     """Получить настройки рассрочки для жилого комплекса."""
@@ -960,7 +1740,7 @@ async def update_installment_settings(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при обновлении: {str(e)}")
 
-    await invalidate_complex_cache()
+    await invalidate_complex(jk_name, SETTINGS)
 
     return {
         "status": "success",
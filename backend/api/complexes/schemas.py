@@ -0,0 +1,20 @@
+from typing import List, Union
+
+from pydantic import BaseModel, Field
+
+# Верхняя граница размера пакета: полный ЖК укладывается с запасом
+MAX_APARTMENT_INFO_BATCH = 2000
+
+
+class ApartmentInfoQuery(BaseModel):
+    """Одна квартира в пакетном запросе apartment-info"""
+    blockName: str
+    floor: Union[int, str]
+    apartmentSize: Union[float, str]
+    apartmentNumber: Union[int, str]
+
+
+class ApartmentInfoBatchRequest(BaseModel):
+    """Пакетный запрос информации по квартирам одного ЖК"""
+    jkName: str
+    apartments: List[ApartmentInfoQuery] = Field(..., max_length=MAX_APARTMENT_INFO_BATCH)
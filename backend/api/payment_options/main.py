@@ -1,165 +1,145 @@
-import os
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import Dict, Any
-from sqlalchemy.orm import Session
-from backend.core.google_sheets import get_price_data_for_sheet
-from backend.api.complexes.main import extract_price_value
-from backend.database import get_db
-from backend.database.models import ResidentialComplex
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional
+
+from backend.core.http_cache import conditional_response, make_etag
+from backend.core.payload_cache import CachedPayload, dumps, json_bytes_response, payload_cache
+from backend.core.payment_scenarios import PaymentScenarios, payment_scenarios
+from backend.core.single_flight import single_flight
+from backend.core.warmup import cache_warmup
 
 router = APIRouter(prefix="/api/payment-options")
 
+PAYMENT_OPTIONS = "payment-options"
+
+# Этаж, для которого лендинг показывает примеры
+DEFAULT_FLOOR = 5
+
+# Комплексы, которые показывает лендинг
+LANDING_COMPLEXES = ["ЖК_Рассвет", "ЖК_Бахор"]
+
+
 def format_number(num):
     """Форматирует число с пробелами для разделения тысяч"""
     if num is None or num == 0:
         return "0"
     return f"{int(num):,}".replace(",", " ")
 
-async def load_payment_options_for_complex(complex_name: str, floor: str = "5", db: Session = None) -> Dict[str, Any]:
-    """
-    Загружает данные о способах оплаты для конкретного комплекса из тех же Excel файлов, что и цены
-    """
+
+def _parse_floor(floor: Any) -> int:
     try:
-        # Получаем цены из тех же файлов, что и в apartment-info
-        price_keys = {
-            "100": f"{complex_name}_5_100",
-            "70": f"{complex_name}_5_70",
-            "50": f"{complex_name}_5_50",
-            "30": f"{complex_name}_5_30"
-        }
+        return int(float(str(floor).strip().replace(",", ".")))
+    except (TypeError, ValueError):
+        return DEFAULT_FLOOR
 
 
-        prices = {}
-        for suffix, key in price_keys.items():
-            price_data = await get_price_data_for_sheet(key)
-            prices[suffix] = extract_price_value(price_data, key)
-
-        if any(price is None for price in prices.values()):
-            raise HTTPException(status_code=404, detail="Не найдены цены для некоторых вариантов оплаты")
-
-        # Берем цену за 30% как базовую для расчетов
-        base_price = prices["30"]
-
-        # Вычисляем оставшиеся месяцы (как в apartment-info)
-        from datetime import datetime
-        from dateutil.relativedelta import relativedelta
-
-        # Получаем настройки рассрочки из базы данных
-        if db:
-            complex_record = (
-                db.query(ResidentialComplex)
-                .filter(ResidentialComplex.name == complex_name)
-                .first()
-            )
-
-            if complex_record and complex_record.installment_start_date:
-                start_date = datetime.combine(complex_record.installment_start_date, datetime.min.time())
-                installment_months = complex_record.installment_months
-            else:
-                # Значения по умолчанию
-                start_date = datetime(2025, 12, 1)
-                installment_months = 36
-        else:
-            # Если db не передана, используем значения по умолчанию
-            start_date = datetime(2025, 12, 1)
-            installment_months = 36
-
-        end_date = start_date + relativedelta(months=installment_months)
-
-        # Текущая дата
-        today = datetime.today()
-        diff_years = end_date.year - today.year
-        diff_months = end_date.month - today.month
-        total_months_left = diff_years * 12 + diff_months
-        if today.day > 1:
-            total_months_left -= 1
-        total_months_left = max(total_months_left, 0)
-
-        # Примерная площадь квартиры для расчетов (65 м²)
-        if complex_name == "ЖК_Бахор":
-            example_area = 55.67
-        else:
-            example_area = 65.38
-        example_total_price = base_price * example_area
-
-        # Рассрочка 30%
-        installment_30_initial = example_total_price * 0.3
-        installment_30_monthly = (example_total_price - installment_30_initial) / installment_months
-
-        # Рассрочка 50%
-        installment_50_initial = example_total_price * 0.5
-        installment_50_monthly = (example_total_price - installment_50_initial) / installment_months
-
-        # Рассрочка 70%
-        installment_70_initial = example_total_price * 0.7
-        installment_70_monthly = (example_total_price - installment_70_initial) / installment_months
-
-        # Гибридная рассрочка
-        hybrid_initial = example_total_price * 0.3
-        hybrid_final = example_total_price * 0.3
-        hybrid_middle = example_total_price - hybrid_initial - hybrid_final
-        hybrid_monthly = hybrid_middle / 18  # 18 месяцев для гибридной
-
-        # Ипотека
-        mortgage_initial = example_total_price * 0.2
-        mortgage_amount = example_total_price - mortgage_initial
-        mortgage_monthly = mortgage_amount * 0.01  # Примерная ставка
-
-        return {
-            "descriptions": {
-                "installment": f"До {installment_months} месяцев",
-                "hybrid": "С отложенным платежом до 30%",
-                "mortgage": "В удобный момент без потерь"
+def render_payment_options(scenarios: PaymentScenarios, floor: int) -> Dict[str, Any]:
+    """
+    Тексты и HTML блока способов оплаты на лендинге из заранее посчитанных сценариев этажа
+    """
+    plans = scenarios.floor(floor)
+    if plans is None:
+        raise HTTPException(status_code=404, detail="Не найдены цены для некоторых вариантов оплаты")
+
+    installment_months = scenarios.settings.months
+    installment = plans["installment_30"]
+    hybrid = plans["hybrid"]
+    mortgage = plans["mortgage"]
+    example_total_price = installment["total"]
+
+    return {
+        "descriptions": {
+            "installment": f"До {installment_months} месяцев",
+            "hybrid": "С отложенным платежом до 30%",
+            "mortgage": "В удобный момент без потерь"
+        },
+        "details": {
+            "installment": {
+                "title": "Рассрочка — удобно и без переплат.",
+                "lines": [
+                    "<strong>Варианты:</strong> 70%, 50% или 30%",
+                    f"<strong>Первоначальный взнос</strong> — от {format_number(installment['downPayment'])} сум",
+                    f"<strong>Ежемесячная оплата</strong> — от {format_number(installment['monthlyPayment'])} сум ({installment_months} месяцев, без переплат)"
+                ]
             },
-            "details": {
-                "installment": {
-                    "title": "Рассрочка — удобно и без переплат.",
-                    "lines": [
-                        "<strong>Варианты:</strong> 70%, 50% или 30%",
-                        f"<strong>Первоначальный взнос</strong> — от {format_number(installment_30_initial)} сум",
-                        f"<strong>Ежемесячная оплата</strong> — от {format_number(installment_30_monthly)} сум ({installment_months} месяцев, без переплат)"
-                    ]
-                },
-                "hybrid": {
-                    "title": "Ваш комфорт в приоритете:",
-                    "lines": [
-                        f"<strong>Первоначальный взнос</strong> — {format_number(hybrid_initial)} сум",
-                        f"<strong>Ежемесячный платёж</strong> — {format_number(hybrid_monthly)} сум",
-                        "<strong>До 30% суммы</strong> можно отложить на удобный момент"
-                    ]
-                },
-                "mortgage": {
-                    "title": "30% оплачиваются при сдаче объекта.",
-                    "lines": [
-                        f"<strong>Стоимость квартиры</strong> — от {format_number(example_total_price)} сум",
-                        f"<strong>Сумма ипотеки</strong> — от {format_number(mortgage_amount)} сум",
-                        "Если к этому моменту будет удобнее — вы сможете оформить ипотеку и рассчитаться комфортно, без лишних забот."
-                    ]
-                }
+            "hybrid": {
+                "title": "Ваш комфорт в приоритете:",
+                "lines": [
+                    f"<strong>Первоначальный взнос</strong> — {format_number(hybrid['downPayment'])} сум",
+                    f"<strong>Ежемесячный платёж</strong> — {format_number(hybrid['monthlyPayment'])} сум",
+                    "<strong>До 30% суммы</strong> можно отложить на удобный момент"
+                ]
             },
-            "modals": {
-                "installment": f"<h3>Пример рассрочки</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос:</strong> {format_number(installment_30_initial)} сум (30%)</p><p><strong>Ежемесячный платеж:</strong> {format_number(installment_30_monthly)} сум</p><p><strong>Срок рассрочки:</strong> {installment_months} месяцев</p><p><strong>Переплата:</strong> 0 сум</p>",
-                "hybrid": f"<h3>Пример гибридной рассрочки</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос (30%):</strong> {format_number(hybrid_initial)} сум</p><p><strong>Ежемесячная оплата (18 мес., 40%):</strong> {format_number(hybrid_monthly)} сум</p><p><strong>Последний платёж (19-й месяц, 30%):</strong> {format_number(hybrid_final)} сум</p>",
-                "mortgage": f"<h3>Переход на ипотеку</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос:</strong> {format_number(mortgage_initial)} сум (20%)</p><p><strong>Сумма ипотеки:</strong> {format_number(mortgage_amount)} сум</p><p><strong>Ставка:</strong> от 18% годовых</p><p><strong>Срок:</strong> до 20 лет</p><p><strong>Ежемесячный платеж:</strong> от {format_number(mortgage_monthly)} сум</p>"
+            "mortgage": {
+                "title": "30% оплачиваются при сдаче объекта.",
+                "lines": [
+                    f"<strong>Стоимость квартиры</strong> — от {format_number(example_total_price)} сум",
+                    f"<strong>Сумма ипотеки</strong> — от {format_number(mortgage['loanAmount'])} сум",
+                    "Если к этому моменту будет удобнее — вы сможете оформить ипотеку и рассчитаться комфортно, без лишних забот."
+                ]
             }
+        },
+        "modals": {
+            "installment": f"<h3>Пример рассрочки</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос:</strong> {format_number(installment['downPayment'])} сум (30%)</p><p><strong>Ежемесячный платеж:</strong> {format_number(installment['monthlyPayment'])} сум</p><p><strong>Срок рассрочки:</strong> {installment_months} месяцев</p><p><strong>Переплата:</strong> 0 сум</p>",
+            "hybrid": f"<h3>Пример гибридной рассрочки</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос (30%):</strong> {format_number(hybrid['downPayment'])} сум</p><p><strong>Ежемесячная оплата (18 мес., 40%):</strong> {format_number(hybrid['monthlyPayment'])} сум</p><p><strong>Последний платёж (19-й месяц, 30%):</strong> {format_number(hybrid['finalPayment'])} сум</p>",
+            "mortgage": f"<h3>Переход на ипотеку</h3><p><strong>Стоимость квартиры:</strong> {format_number(example_total_price)} сум</p><p><strong>Первоначальный взнос:</strong> {format_number(mortgage['downPayment'])} сум (20%)</p><p><strong>Сумма ипотеки:</strong> {format_number(mortgage['loanAmount'])} сум</p><p><strong>Ставка:</strong> от 18% годовых</p><p><strong>Срок:</strong> до 20 лет</p><p><strong>Ежемесячный платеж:</strong> от {format_number(mortgage['monthlyPayment'])} сум</p>"
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка обработки данных: {str(e)}")
+    }
+
+
+def _payment_options_etag(complex_name: str, floor: Optional[int], view: str) -> str:
+    # Версии цен, настроек рассрочки и шахматки лежат в памяти: без запроса к БД
+    return make_etag(PAYMENT_OPTIONS, view, complex_name, floor, payment_scenarios.key(complex_name))
+
+
+async def _build_payment_options_payload(complex_name: str, floor: int, etag: str) -> CachedPayload:
+    scenarios = await run_in_threadpool(payment_scenarios.get, complex_name)
+    body = dumps(render_payment_options(scenarios, floor))
+    return payload_cache.put((PAYMENT_OPTIONS, complex_name, floor), etag, body)
+
+
+async def _payment_options_payload(complex_name: str, floor: int, etag: str) -> CachedPayload:
+    """Готовое тело блока способов оплаты; сценарии пересчитываются только после изменения цен или настроек"""
+    cache_key = (PAYMENT_OPTIONS, complex_name, floor)
+    cached = payload_cache.get(cache_key, etag)
+    if cached is not None:
+        return cached
+    return await single_flight.run(
+        (cache_key, etag),
+        lambda: _build_payment_options_payload(complex_name, floor, etag),
+        f"payload:{PAYMENT_OPTIONS}",
+        complex_name,
+    )
+
+
+async def _warm_payment_options(complex_name: str) -> int:
+    etag = _payment_options_etag(complex_name, DEFAULT_FLOOR, "html")
+    if payload_cache.contains((PAYMENT_OPTIONS, complex_name, DEFAULT_FLOOR), etag):
+        return 0
+    try:
+        await _payment_options_payload(complex_name, DEFAULT_FLOOR, etag)
+    except HTTPException as e:
+        if e.status_code == 404:
+            # Для этажа нет полного набора цен — показывать нечего
+            return 0
+        raise
+    return 1
+
+
+cache_warmup.register(PAYMENT_OPTIONS, _warm_payment_options)
+
 
 @router.get("/")
-async def get_payment_options(db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def get_payment_options() -> Dict[str, Any]:
     """
-    Возвращает данные о способах оплаты для всех комплексов из Excel файлов
+    Возвращает данные о способах оплаты для всех комплексов лендинга
     """
     result = {}
 
-    # Список комплексов для обработки
-    complexes = ["ЖК_Рассвет", "ЖК_Бахор"]
-
-    for complex_name in complexes:
+    for complex_name in LANDING_COMPLEXES:
         try:
-            result[complex_name] = await load_payment_options_for_complex(complex_name, db=db)
+            scenarios = await run_in_threadpool(payment_scenarios.get, complex_name)
+            result[complex_name] = render_payment_options(scenarios, DEFAULT_FLOOR)
         except HTTPException as e:
             # Если данные не найдены, пропускаем этот комплекс
             if e.status_code == 404:
@@ -172,13 +152,43 @@ async def get_payment_options(db: Session = Depends(get_db)) -> Dict[str, Any]:
 
     return result
 
+
+@router.get("/{complex_name}/scenarios")
+async def get_payment_scenarios(
+    request: Request,
+    response: Response,
+    complex_name: str,
+    floor: Optional[str] = Query(None, description="Только этот этаж (по умолчанию — все)"),
+) -> Any:
+    """
+    Сценарии оплаты по этажам: стоимость примерной квартиры, первоначальный взнос,
+    ежемесячный платёж и срок для каждого способа оплаты
+    """
+    floor_number = _parse_floor(floor) if floor is not None else None
+    etag = _payment_options_etag(complex_name, floor_number, "json")
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    scenarios = await run_in_threadpool(payment_scenarios.get, complex_name)
+    return {"status": "success", **scenarios.to_dict(floor_number)}
+
+
 @router.get("/{complex_name}")
 async def get_payment_options_for_complex_endpoint(
+    request: Request,
+    response: Response,
     complex_name: str,
     floor: str = Query("5", description="Этаж для расчета цен"),
-    db: Session = Depends(get_db)
-) -> Dict[str, Any]:
+) -> Any:
     """
     Возвращает данные о способах оплаты для конкретного комплекса
     """
-    return await load_payment_options_for_complex(complex_name, floor, db=db)
+    floor_number = _parse_floor(floor)
+    etag = _payment_options_etag(complex_name, floor_number, "html")
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    cached = await _payment_options_payload(complex_name, floor_number, etag)
+    return json_bytes_response(request, response, cached)
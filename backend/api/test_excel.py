@@ -10,12 +10,16 @@ from docxtpl import DocxTemplate, InlineImage
 from fastapi import APIRouter, HTTPException, Body, Query, Path, Depends
 from fastapi import Form, UploadFile, File
 import shutil
+import tempfile
 from num2words import num2words
 from openpyxl.workbook import Workbook
 from pydantic import BaseModel, Field, validator
 import openpyxl
 import os
 import traceback  # Для логирования ошибок
+from math import isnan
+
+import numpy as np
 
 from starlette.responses import StreamingResponse, FileResponse
 from urllib.parse import quote
@@ -33,9 +37,22 @@ from backend.database.models import (
     Lead,
 )
 from backend.api.leads.schemas import LeadState
-from backend.core.cache_utils import invalidate_complex_cache
+from backend.core.cache_utils import invalidate_complex
+from backend.core.chess_snapshot import chess_snapshots
+from backend.core.data_versions import CHESS, PRICES, REGISTRY
+from backend.core.price_grid import PAYMENT_SHARES
+from backend.core.unit_prices import unit_price_tables
+from backend.database.apartment_status_service import (
+    SOURCE_DELETE_CONTRACT,
+    SOURCE_GENERATE_CONTRACT,
+    SOURCE_REGISTRY_SYNC,
+    SOURCE_UPDATE_CHESS,
+    SOURCE_UPDATE_STATUS,
+    record_chess_import,
+    set_apartment_status,
+)
 from backend.core.excel_importer import (
-    import_chess_from_excel,
+    sync_chess_from_excel,
     import_price_from_excel,
     import_contract_registry_from_excel,
 )
@@ -220,6 +237,16 @@ def _find_apartment_unit(
     if not normalized_number or floor_int is None:
         return None
 
+    # Быстрый путь: ключевой индекс уже загруженного снимка шахматки (без загрузки снимка внутри транзакции).
+    complex_obj = db.get(ResidentialComplex, complex_id)
+    snapshot = chess_snapshots.peek(complex_obj.name) if complex_obj else None
+    if snapshot is not None:
+        position = snapshot.find(block_name, floor_int, normalized_number)
+        if position is not None:
+            unit = db.get(ApartmentUnit, int(snapshot.ids[position]))
+            if unit is not None:
+                return unit
+
     candidates = (
         db.query(ApartmentUnit)
         .filter(
@@ -303,7 +330,7 @@ def _extract_contract_sequence(value: Any) -> Optional[int]:
 
 
 # --- Обновленная логика работы со статусами квартир ---
-def _update_apartment_status_db(db: Session, update_data: ApartmentStatusUpdate) -> bool:
+def _update_apartment_status_db(db: Session, update_data: ApartmentStatusUpdate) -> Optional[ApartmentUnit]:
     complex_obj = _get_db_complex(db, update_data.jkName)
     apartment = _find_apartment_unit(
         db,
@@ -313,15 +340,10 @@ def _update_apartment_status_db(db: Session, update_data: ApartmentStatusUpdate)
         update_data.apartmentNumber,
     )
     if not apartment:
-        return False
+        return None
 
-    apartment.status = update_data.newStatus
-    payload = dict(apartment.raw_payload or {})
-    for key in list(payload.keys()):
-        if isinstance(key, str) and "статус" in key.lower():
-            payload[key] = update_data.newStatus
-    apartment.raw_payload = payload or None
-    return True
+    set_apartment_status(db, apartment, update_data.newStatus, SOURCE_UPDATE_STATUS)
+    return apartment
 
 
 @router.post("/update-status")
@@ -330,8 +352,8 @@ async def update_excel_status_endpoint(
         db: Session = Depends(get_db),
 ):
     print(f"Запрос: {update_data.dict()}")
-    updated = _update_apartment_status_db(db, update_data)
-    if not updated:
+    apartment = _update_apartment_status_db(db, update_data)
+    if apartment is None:
         return {"status": "warning", "message": f"Квартира не найдена для '{update_data.jkName}'"}
 
     try:
@@ -340,7 +362,8 @@ async def update_excel_status_endpoint(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Не удалось обновить статус: {exc}") from exc
 
-    await invalidate_complex_cache()
+    # Сбрасываем кеши только этого ЖК; apartment-info — только по блоку квартиры
+    await invalidate_complex(update_data.jkName, CHESS, blocks=[apartment.block_name])
     return {"status": "success", "message": "Apartment status updated successfully"}
 
 
@@ -508,12 +531,7 @@ async def generate_contract(
 
         entry, apartment = _create_contract_registry_entry(db, complex_obj, data, contract_number)
         if apartment:
-            apartment.status = SOLD_STATUS_IN_CHESS
-            payload = dict(apartment.raw_payload or {})
-            for key in list(payload.keys()):
-                if isinstance(key, str) and "статус" in key.lower():
-                    payload[key] = SOLD_STATUS_IN_CHESS
-            apartment.raw_payload = payload or None
+            set_apartment_status(db, apartment, SOLD_STATUS_IN_CHESS, SOURCE_GENERATE_CONTRACT)
 
         if lead_obj:
             total_amount = clean_number(data.totalPrice)
@@ -550,7 +568,7 @@ async def generate_contract(
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Ошибка обработки договора: {str(e)}")
 
-    await invalidate_complex_cache()
+    await invalidate_complex(data.jkName, CHESS, REGISTRY, blocks=[data.blockName])
 
     return StreamingResponse(
         contract_buffer,
@@ -952,12 +970,7 @@ def sync_chess_with_registry(db: Session, jkName: str) -> dict:
             _normalize_unit_number(apartment.unit_number),
         )
         if key in sold_keys and (apartment.status or "").strip().lower() != SOLD_STATUS_IN_CHESS:
-            apartment.status = SOLD_STATUS_IN_CHESS
-            payload = dict(apartment.raw_payload or {})
-            for column_key in list(payload.keys()):
-                if isinstance(column_key, str) and "статус" in column_key.lower():
-                    payload[column_key] = SOLD_STATUS_IN_CHESS
-            apartment.raw_payload = payload or None
+            set_apartment_status(db, apartment, SOLD_STATUS_IN_CHESS, SOURCE_REGISTRY_SYNC)
             updated += 1
 
     if updated:
@@ -1018,12 +1031,7 @@ async def delete_contract_from_registry_and_update_shaxmatка(
 
     apartment_updated = False
     if apartment:
-        apartment.status = NEW_STATUS_ON_DELETE
-        payload = dict(apartment.raw_payload or {})
-        for key in list(payload.keys()):
-            if isinstance(key, str) and "статус" in key.lower():
-                payload[key] = NEW_STATUS_ON_DELETE
-        apartment.raw_payload = payload or None
+        set_apartment_status(db, apartment, NEW_STATUS_ON_DELETE, SOURCE_DELETE_CONTRACT)
         apartment_updated = True
 
     try:
@@ -1032,7 +1040,10 @@ async def delete_contract_from_registry_and_update_shaxmatка(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Не удалось удалить договор: {exc}") from exc
 
-    await invalidate_complex_cache()
+    if apartment_updated:
+        await invalidate_complex(jkName, CHESS, REGISTRY, blocks=[apartment.block_name])
+    else:
+        await invalidate_complex(jkName, REGISTRY)
 
     message = f"Договор '{contractNumber}' удален из реестра."
     if apartment_updated:
@@ -1053,7 +1064,8 @@ async def api_sync_chess_with_registry(
         db: Session = Depends(get_db),
 ):
     result = sync_chess_with_registry(db, jkName)
-    await invalidate_complex_cache()
+    if result.get("updated"):
+        await invalidate_complex(jkName, CHESS)
     return result
 
 
@@ -1196,12 +1208,7 @@ async def update_price(
         db.bulk_save_objects(new_entries)
     db.commit()
 
-    await invalidate_complex_cache([
-        "complexes:price-by-key",
-        "complexes:price-all",
-        "complexes:aggregate",
-        "complexes:apartment-info",
-    ])
+    await invalidate_complex(jkName, PRICES)
 
     return {
         "status": "success",
@@ -1220,7 +1227,11 @@ class ChessUpdates(BaseModel):
 
 
 @router.get("/complexes/{jkName}/chess", summary="Get full chess grid")
-async def get_chess(jkName: str, db: Session = Depends(get_db)):
+async def get_chess(
+        jkName: str,
+        prices: bool = Query(False, description="Добавить цены за м² и стоимость по всем вариантам оплаты"),
+        db: Session = Depends(get_db),
+):
     complex_obj = _get_db_complex(db, jkName)
 
     apartments = (
@@ -1249,6 +1260,20 @@ async def get_chess(jkName: str, db: Session = Depends(get_db)):
             row.update(unit.raw_payload)
         grid.append(row)
 
+    if prices:
+        # Все цены ЖК одним векторным расчётом (кэш по версиям шахматки и цен)
+        table = unit_price_tables.get(jkName)
+        positions = table.positions(unit.id for unit in apartments)
+        found = positions >= 0
+        per_m2 = np.full((len(apartments), len(PAYMENT_SHARES)), np.nan)
+        totals = np.full((len(apartments), len(PAYMENT_SHARES)), np.nan)
+        per_m2[found] = np.round(table.per_m2[positions[found]])
+        totals[found] = table.totals[positions[found]]
+        for row, unit_per_m2, unit_totals in zip(grid, per_m2.tolist(), totals.tolist()):
+            for share, price, total in zip(PAYMENT_SHARES, unit_per_m2, unit_totals):
+                row[f"pricePerM2_{share}"] = None if isnan(price) else int(price)
+                row[f"total_{share}"] = None if isnan(total) else int(total)
+
     return {"grid": grid}
 
 
@@ -1271,6 +1296,7 @@ async def update_chess(data: ChessUpdates, db: Session = Depends(get_db)):
     """
     not_found: List[str] = []
     updated = 0
+    touched_blocks: Dict[str, set[str]] = {}
 
     for upd in data.updates:
         try:
@@ -1304,17 +1330,14 @@ async def update_chess(data: ChessUpdates, db: Session = Depends(get_db)):
             )
             continue
 
-        target_unit.status = upd.newStatus
-        payload = dict(target_unit.raw_payload or {})
-        for key in list(payload.keys()):
-            if isinstance(key, str) and "статус" in key.lower():
-                payload[key] = upd.newStatus
-        target_unit.raw_payload = payload or None
+        set_apartment_status(db, target_unit, upd.newStatus, SOURCE_UPDATE_CHESS)
+        touched_blocks.setdefault(complex_obj.name, set()).add(target_unit.block_name)
         updated += 1
 
     if updated:
         db.commit()
-        await invalidate_complex_cache()
+        for jk_name, blocks in touched_blocks.items():
+            await invalidate_complex(jk_name, CHESS, blocks=blocks)
     else:
         db.rollback()
 
@@ -1324,16 +1347,34 @@ async def update_chess(data: ChessUpdates, db: Session = Depends(get_db)):
     return {"detail": "Все статусы успешно сохранены", "updated": updated}
 
 
+def _preview_chess_import(db: Session, complex_obj: ResidentialComplex, file: UploadFile) -> Dict[str, Any]:
+    """Сравнивает загруженную шахматку с квартирами ЖК, ничего не меняя"""
+    fd, temp_path = tempfile.mkstemp(suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as out_file:
+            shutil.copyfileobj(file.file, out_file)
+        diff = sync_chess_from_excel(db, complex_obj, temp_path, dry_run=True)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Ошибка при чтении шахматки: {exc}") from exc
+    finally:
+        db.rollback()
+        os.remove(temp_path)
+    return {"status": "success", "dryRun": True, "changes": diff.to_dict()}
+
+
 # --- Новый эндпоинт для замены файла в папке ЖК ---
 @router.post("/replace-file", summary="Replace a file in a given residential complex")
 async def replace_file(
         name: str = Form(..., description="Название жилого комплекса (jkName)"),
         category: str = Form(..., description="Категория файла: 'jk_data', 'price', 'template', 'registry', 'tamplate_empty'"),
         file: UploadFile = File(..., description="Загружаемый файл"),
+        dry_run: bool = Form(False, description="Только показать, что изменит импорт шахматки, без замены файла"),
         db: Session = Depends(get_db),
 ):
     """
     Загружает новый файл и заменяет существующий в папке ЖК.
+    Шахматка импортируется по разнице: меняются только изменившиеся квартиры.
+    С dry_run файл не заменяется, а в ответе — что изменил бы импорт.
     """
     # Определяем директорию комплекса
     complex_dir = os.path.join(BASE_STATIC_PATH, name)
@@ -1354,6 +1395,11 @@ async def replace_file(
     if not target_filename:
         raise HTTPException(status_code=400, detail=f"Неизвестная категория файла: {category}")
 
+    if dry_run:
+        if category != "jk_data":
+            raise HTTPException(status_code=400, detail="Пробный импорт доступен только для шахматки (jk_data)")
+        return _preview_chess_import(db, complex_obj, file)
+
     target_path = os.path.join(complex_dir, target_filename)
     try:
         with open(target_path, "wb") as out_file:
@@ -1362,11 +1408,14 @@ async def replace_file(
         raise HTTPException(status_code=500, detail=f"Ошибка при сохранении файла: {e}")
 
     imports_summary: Dict[str, Any] = {}
+    chess_diff = None
 
     try:
         if category == "jk_data":
-            apartments = import_chess_from_excel(db, complex_obj, target_path)
-            imports_summary["apartments"] = apartments
+            chess_diff = sync_chess_from_excel(db, complex_obj, target_path)
+            record_chess_import(db, complex_obj.id, chess_diff)
+            imports_summary["apartments"] = chess_diff.total
+            imports_summary["changes"] = chess_diff.to_dict()
         elif category == "price":
             prices = import_price_from_excel(db, complex_obj, target_path)
             imports_summary["prices"] = prices
@@ -1378,7 +1427,16 @@ async def replace_file(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при импорте данных из Excel: {exc}") from exc
 
-    await invalidate_complex_cache()
+    if category == "jk_data":
+        # Файл без изменений не сбрасывает кэши шахматки
+        if chess_diff.changed:
+            # Удалённые квартиры отвязывают свои договоры (apartment_id → NULL): реестр тоже изменился
+            kinds = (CHESS, REGISTRY) if chess_diff.deleted else (CHESS,)
+            await invalidate_complex(name, *kinds, blocks=chess_diff.blocks)
+    elif category == "price":
+        await invalidate_complex(name, PRICES)
+    elif category == "registry":
+        await invalidate_complex(name, REGISTRY)
 
     return {
         "status": "success",
@@ -1420,33 +1478,13 @@ async def get_apartment_status(
         blockName: str = Query(..., description="Block name"),
         floor: int = Query(..., description="Floor number"),
         apartmentNumber: Union[int, str] = Query(..., description="Apartment number"),
-        db: Session = Depends(get_db),
 ):
-    complex_obj = _get_db_complex(db, jkName)
-
-    normalized_number = _normalize_unit_number(apartmentNumber)
-    candidates = (
-        db.query(ApartmentUnit)
-        .filter(
-            ApartmentUnit.complex_id == complex_obj.id,
-            ApartmentUnit.floor == floor,
-            ApartmentUnit.unit_number == normalized_number,
-        )
-        .all()
-    )
-
-    target_unit = next(
-        (
-        unit for unit in candidates
-        if _normalize_block_name(unit.block_name) == _normalize_block_name(blockName)
-        ),
-        None,
-    )
-
-    if not target_unit:
+    snapshot = chess_snapshots.get(jkName)
+    position = snapshot.find(blockName, floor, apartmentNumber)
+    if position is None:
         raise HTTPException(status_code=404, detail="Apartment not found")
 
-    return {"apartmentStatus": target_unit.status}
+    return {"apartmentStatus": snapshot.status_at(position)}
 
 
 # --- Новый эндпоинт: Скачать один из трех файлов для ЖК ---
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.core.data_versions import RENDERS, data_versions
+
+ASSET_ROOT = Path("static") / "Жилые_Комплексы"
+FLOORPLAN_ROOT = Path("static") / "floorplans"
+
+RENDER_DIR = "render"
+PLANS_DIR = "Planirovki"
+DOCUMENTS_DIR = "Документы"
+
+RENDER_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".svg"})
+
+# Directory mtimes are re-checked at most this often per complex.
+CHECK_INTERVAL_SECONDS = 1.0
+
+_SEPARATORS = re.compile(r"[\s,._\-]+")
+
+_DirStamp = Tuple[Tuple[str, Optional[int]], ...]
+
+
+def normalize_asset_name(value: str) -> str:
+    """Case- and separator-insensitive key: 'Блок 1,2', 'блок_1-2' and 'БЛОК 1.2' all map to 'блок_1_2'."""
+    return _SEPARATORS.sub("_", str(value).strip().lower()).strip("_")
+
+
+def _natural_key(name: str) -> List[object]:
+    return [int(fragment) if fragment.isdigit() else fragment.lower() for fragment in re.split(r"(\d+)", name)]
+
+
+def _list_files(directory: Path) -> List[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return [entry.name for entry in entries if entry.is_file()]
+    except OSError:
+        return []
+
+
+def _mtime(directory: Path) -> Optional[int]:
+    try:
+        return directory.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ComplexAssets:
+    """
+    Snapshot of one complex's static files.
+
+    Built from a handful of directory listings; afterwards every lookup is a
+    dictionary or set access. Paths are relative to the working directory, in
+    the same form the request handlers used to build by hand.
+    """
+
+    def __init__(self, name: str, stamp: _DirStamp) -> None:
+        self.name = name
+        self.stamp = stamp
+        base_dir = ASSET_ROOT / name
+        self.base_dir = base_dir
+        self.exists = base_dir.is_dir()
+
+        # Top-level files of the complex folder (plan_roof.pdf, floor plans, templates)
+        self.root_files = frozenset(_list_files(base_dir))
+
+        render_names = sorted(
+            file_name for file_name in _list_files(base_dir / RENDER_DIR)
+            if os.path.splitext(file_name)[1].lower() in RENDER_SUFFIXES
+        )
+        self.renders: Tuple[str, ...] = tuple(
+            f"/static/Жилые_Комплексы/{name}/{RENDER_DIR}/{file_name}" for file_name in render_names
+        )
+
+        plans_dir = base_dir / PLANS_DIR
+        plan_names = _list_files(plans_dir)
+        self.plan_files = frozenset(plan_names)
+        self.plan_pdfs: Tuple[Path, ...] = tuple(
+            plans_dir / file_name for file_name in plan_names if file_name.lower().endswith(".pdf")
+        )
+        # Normalized PDF stem (usually a block name) -> file
+        self.block_pdfs: Dict[str, Path] = {}
+        for path in self.plan_pdfs:
+            self.block_pdfs.setdefault(normalize_asset_name(path.stem), path)
+
+        self.documents: Tuple[Path, ...] = tuple(
+            base_dir / DOCUMENTS_DIR / file_name
+            for file_name in sorted(_list_files(base_dir / DOCUMENTS_DIR), key=_natural_key)
+        )
+
+        floorplan_dir = FLOORPLAN_ROOT / name
+        self.floorplan_pages: Tuple[str, ...] = tuple(
+            os.path.join(str(floorplan_dir), file_name)
+            for file_name in sorted(
+                (file_name for file_name in _list_files(floorplan_dir) if file_name.lower().endswith(".png")),
+                key=_natural_key,
+            )
+        )
+
+    def root_file(self, file_name: str) -> Optional[str]:
+        """Path of a top-level file if it exists (exact, case-sensitive name)."""
+        if file_name in self.root_files:
+            return os.path.join(str(self.base_dir), file_name)
+        return None
+
+    def plan_file(self, file_name: str) -> Optional[Path]:
+        if file_name in self.plan_files:
+            return self.base_dir / PLANS_DIR / file_name
+        return None
+
+    def block_pdf(self, block_name: str) -> Optional[Path]:
+        """Plan PDF of a block: 'Блок 1,2' finds 'Блок 1,2.pdf' or 'блок_1-2.pdf'; 'Блок 3' also finds '3.pdf'."""
+        normalized = normalize_asset_name(block_name)
+        path = self.block_pdfs.get(normalized)
+        if path is None and normalized.startswith("блок"):
+            path = self.block_pdfs.get(normalized[len("блок"):].strip("_"))
+        return path
+
+
+def _stamp(jk_name: str) -> _DirStamp:
+    base_dir = ASSET_ROOT / jk_name
+    directories = (
+        base_dir,
+        base_dir / RENDER_DIR,
+        base_dir / PLANS_DIR,
+        base_dir / DOCUMENTS_DIR,
+        FLOORPLAN_ROOT / jk_name,
+    )
+    return tuple((str(directory), _mtime(directory)) for directory in directories)
+
+
+class AssetManifestStore:
+    """
+    Per-complex asset manifests, rebuilt when one of the watched directories
+    changes its mtime. A changed render folder bumps the RENDERS data version.
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS) -> None:
+        self._lock = threading.Lock()
+        self._check_interval = check_interval
+        self._manifests: Dict[str, ComplexAssets] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._names: Optional[Tuple[Optional[int], Tuple[str, ...]]] = None
+
+    def get(self, jk_name: str) -> ComplexAssets:
+        manifest = self._manifests.get(jk_name)
+        now = time.monotonic()
+        if manifest is not None and now - self._checked_at.get(jk_name, 0.0) < self._check_interval:
+            return manifest
+
+        stamp = _stamp(jk_name)
+        with self._lock:
+            manifest = self._manifests.get(jk_name)
+            if manifest is None or manifest.stamp != stamp:
+                previous = manifest
+                manifest = ComplexAssets(jk_name, stamp)
+                self._manifests[jk_name] = manifest
+                if previous is not None and previous.stamp[1] != stamp[1]:
+                    data_versions.bump(jk_name, RENDERS)
+            self._checked_at[jk_name] = now
+        return manifest
+
+    def complex_names(self) -> Tuple[str, ...]:
+        """Complex folders under static/Жилые_Комплексы, sorted."""
+        mtime = _mtime(ASSET_ROOT)
+        cached = self._names
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with os.scandir(ASSET_ROOT) as entries:
+                names = tuple(sorted(entry.name for entry in entries if entry.is_dir()))
+        except OSError:
+            names = ()
+        self._names = (mtime, names)
+        return names
+
+    def build_all(self) -> int:
+        """Builds (or refreshes) manifests of every complex folder; returns their number."""
+        names = self.complex_names()
+        for jk_name in names:
+            self.get(jk_name)
+        return len(names)
+
+    def invalidate(self, jk_name: str) -> None:
+        """Forces a directory check on the next lookup instead of waiting for the check interval."""
+        with self._lock:
+            self._checked_at.pop(jk_name, None)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._checked_at.clear()
+            self._names = None
+
+
+asset_manifests = AssetManifestStore()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from starlette.concurrency import run_in_threadpool
+
+try:  # redis is optional: only needed for CACHE_BACKEND=redis
+    import redis as syncredis
+    from redis import asyncio as aioredis
+except ImportError:  # pragma: no cover - depends on the environment
+    syncredis = None
+    aioredis = None
+
+# Where FastAPICache entries live and how invalidations reach the other workers.
+MEMORY = "memory"  # private to the worker, single-worker deployments only
+REDIS = "redis"  # shared Redis, invalidations over pub/sub
+SQLITE = "sqlite"  # shared file on one host, invalidations through a polled table
+
+CACHE_BACKENDS: Tuple[str, ...] = (MEMORY, REDIS, SQLITE)
+
+SQLITE_TIMEOUT_SECONDS = 5.0
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Connection to the shared cache file; WAL lets workers read while one of them writes."""
+    connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def redis_client(url: str) -> Any:
+    if aioredis is None:
+        raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+    return aioredis.from_url(url)
+
+
+def redis_sync_client(url: str) -> Any:
+    """Blocking client for code that runs outside the event loop (data versions)."""
+    if syncredis is None:
+        raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+    return syncredis.Redis.from_url(url)
+
+
+class SQLiteBackend(Backend):
+    """
+    FastAPICache backend in a SQLite file, shared by all workers of one host.
+
+    No extra service or package: the file is opened by every worker and WAL
+    mode keeps reads concurrent. Expired rows are skipped on read and removed
+    on the next write of the same key or namespace clear. Entries set without
+    ``expire`` never expire (``expires_at`` is +inf). The sqlite3 calls block,
+    so they run in the thread pool rather than on the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def _row(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def _set(self, key: str, value: bytes, expire: Optional[int]) -> None:
+        expires_at = math.inf if expire is None else time.time() + expire
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def _clear(self, namespace: Optional[str], key: Optional[str]) -> int:
+        with self._lock:
+            if namespace:
+                cursor = self._connection.execute(
+                    "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ? OR expires_at < ?",
+                    (len(namespace), namespace, time.time()),
+                )
+            elif key:
+                cursor = self._connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            else:
+                return 0
+            return cursor.rowcount
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        row = await run_in_threadpool(self._row, key)
+        if row is None:
+            return 0, None
+        # -1 for no expiry, as Redis' TTL reports it
+        return (-1 if math.isinf(row[1]) else int(row[1] - time.time())), row[0]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        row = await run_in_threadpool(self._row, key)
+        return row[0] if row is not None else None
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await run_in_threadpool(self._set, key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await run_in_threadpool(self._clear, namespace, key)
+
+
+def create_backend(kind: str, redis_url: str, sqlite_path: str, redis: Any = None) -> Backend:
+    """FastAPICache backend for ``kind``; ``redis`` may pass a ready client (e.g. a fake in tests)."""
+    if kind == MEMORY:
+        return InMemoryBackend()
+    if kind == REDIS:
+        from fastapi_cache.backends.redis import RedisBackend
+
+        return RedisBackend(redis if redis is not None else redis_client(redis_url))
+    if kind == SQLITE:
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown cache backend '{kind}', expected one of: {', '.join(CACHE_BACKENDS)}")
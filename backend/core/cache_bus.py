@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import orjson
+
+from backend.core.cache_backend import connect_sqlite
+
+BUS_CHANNEL = "estate:cache-bus"
+
+# SQLite transport: how often workers look for new messages and how long messages are kept.
+POLL_INTERVAL_SECONDS = 0.5
+RETENTION_SECONDS = 3600
+
+# Redis transport: pause before reconnecting after a dropped connection, doubled up to the maximum.
+RECONNECT_DELAY_SECONDS = 0.5
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+_Receiver = Callable[[bytes], Awaitable[None]]
+
+
+class LocalTransport:
+    """Single worker: nobody else to notify."""
+
+    async def start(self, receive: _Receiver) -> None:
+        return None
+
+    async def publish(self, data: bytes) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+
+class RedisTransport:
+    """
+    Redis pub/sub; ``client`` is any redis.asyncio compatible client. A dropped
+    connection is re-established with backoff and the channel subscribed again;
+    messages sent meanwhile are lost, the periodic data version refresh
+    catches up with them.
+    """
+
+    def __init__(
+            self,
+            client: Any,
+            channel: str = BUS_CHANNEL,
+            reconnect_delay: float = RECONNECT_DELAY_SECONDS,
+            max_reconnect_delay: float = MAX_RECONNECT_DELAY_SECONDS,
+    ) -> None:
+        self._client = client
+        self._channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._pubsub: Any = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self._channel)
+
+    async def _close_pubsub(self) -> None:
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is None:
+            return
+        try:
+            await pubsub.close()
+        except Exception:  # noqa: BLE001 - the connection is already gone
+            pass
+
+    async def start(self, receive: _Receiver) -> None:
+        await self._client.ping()
+        await self._subscribe()
+        self._task = asyncio.create_task(self._listen(receive))
+
+    async def _listen(self, receive: _Receiver) -> None:
+        delay = self._reconnect_delay
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    print(f"[cache-bus] Resubscribed to '{self._channel}'")
+                    delay = self._reconnect_delay
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "message":
+                        await receive(message["data"])
+                raise ConnectionError("subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - reconnect, never stop listening
+                print(f"[cache-bus] Redis subscription lost: {exc}; reconnecting in {delay:.1f}s")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_reconnect_delay)
+
+    async def publish(self, data: bytes) -> None:
+        await self._client.publish(self._channel, data)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self._channel)
+            except Exception:  # noqa: BLE001 - closing anyway
+                pass
+            await self._close_pubsub()
+
+
+class SQLiteTransport:
+    """
+    Message table in the shared cache file, polled by every worker. Needs no
+    extra service; delivery lags by up to ``poll_interval``.
+    """
+
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL_SECONDS) -> None:
+        self._connection = connect_sqlite(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_bus ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " message BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._poll_interval = poll_interval
+        self._last_seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, receive: _Receiver) -> None:
+        row = self._connection.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_bus").fetchone()
+        self._last_seq = row[0]
+        self._task = asyncio.create_task(self._poll(receive))
+
+    async def _poll(self, receive: _Receiver) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                rows = self._connection.execute(
+                    "SELECT seq, message FROM cache_bus WHERE seq > ? ORDER BY seq", (self._last_seq,)
+                ).fetchall()
+            except Exception as exc:  # noqa: BLE001 - keep polling
+                print(f"[cache-bus] Failed to read messages: {exc}")
+                continue
+            for seq, message in rows:
+                self._last_seq = seq
+                await receive(message)
+
+    async def publish(self, data: bytes) -> None:
+        now = time.time()
+        self._connection.execute("INSERT INTO cache_bus (message, created_at) VALUES (?, ?)", (data, now))
+        self._connection.execute("DELETE FROM cache_bus WHERE created_at < ?", (now - RETENTION_SECONDS,))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class CacheBus:
+    """
+    Broadcasts cache invalidations (and other worker-local events) to the
+    other workers of a deployment.
+
+    Each message is ``{"op": ..., "origin": ..., **fields}``. The sender has
+    already applied the change locally, so a worker ignores its own messages;
+    the others dispatch them to the handler registered for ``op``.
+    """
+
+    def __init__(self) -> None:
+        self._origin = uuid.uuid4().hex
+        self._transport: Any = LocalTransport()
+        self._handlers: Dict[str, Handler] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def on(self, op: str, handler: Handler) -> None:
+        self._handlers[op] = handler
+
+    async def start(self, transport: Any) -> None:
+        await self.stop()
+        self._loop = asyncio.get_running_loop()
+        await transport.start(self._receive)
+        self._transport = transport
+
+    async def stop(self) -> None:
+        transport, self._transport = self._transport, LocalTransport()
+        await transport.stop()
+
+    async def publish(self, op: str, **fields: Any) -> None:
+        data = orjson.dumps({"op": op, "origin": self._origin, **fields})
+        try:
+            await self._transport.publish(data)
+        except Exception as exc:  # noqa: BLE001 - the local change is already applied
+            print(f"[cache-bus] Failed to publish '{op}': {exc}")
+
+    def publish_threadsafe(self, op: str, **fields: Any) -> None:
+        """``publish`` for synchronous code, possibly running in a worker thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or isinstance(self._transport, LocalTransport):
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._spawn(op, fields)
+        else:
+            loop.call_soon_threadsafe(self._spawn, op, fields)
+
+    def _spawn(self, op: str, fields: Dict[str, Any]) -> None:
+        task = asyncio.get_running_loop().create_task(self.publish(op, **fields))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _receive(self, data: bytes) -> None:
+        try:
+            message = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return
+        if message.get("origin") == self._origin:
+            return
+        handler = self._handlers.get(message.get("op"))
+        if handler is None:
+            return
+        try:
+            await handler(message)
+        except Exception as exc:  # noqa: BLE001 - one bad message must not stop the listener
+            print(f"[cache-bus] Failed to apply '{message.get('op')}': {exc}")
+
+
+cache_bus = CacheBus()
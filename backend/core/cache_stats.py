@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_Key = Tuple[str, Optional[str]]
+
+_COUNTER_NAMES = ("hits", "misses", "evicted", "coalesced", "stale")
+
+
+class CacheStats:
+    """
+    Hit/miss counters of the in-process caches, per cache and per complex.
+
+    Counting is a dict update under a lock, cheap enough to stay on in
+    production and compare cache efficiency before and after a change.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, List[int]] = {}
+
+    def _count(self, cache: str, jk_name: Optional[str], index: int, count: int = 1) -> None:
+        with self._lock:
+            counters = self._counters.get((cache, jk_name))
+            if counters is None:
+                counters = self._counters[(cache, jk_name)] = [0] * len(_COUNTER_NAMES)
+            counters[index] += count
+
+    def hit(self, cache: str, jk_name: Optional[str] = None) -> None:
+        self._count(cache, jk_name, 0)
+
+    def miss(self, cache: str, jk_name: Optional[str] = None) -> None:
+        self._count(cache, jk_name, 1)
+
+    def evicted(self, cache: str, jk_name: Optional[str] = None, count: int = 1) -> None:
+        """Entries dropped by targeted invalidation."""
+        self._count(cache, jk_name, 2, count)
+
+    def coalesced(self, cache: str, jk_name: Optional[str] = None) -> None:
+        """A miss that joined a computation already in flight instead of starting its own."""
+        self._count(cache, jk_name, 3)
+
+    def stale(self, cache: str, jk_name: Optional[str] = None) -> None:
+        """A miss answered with the previous version while it is being rebuilt."""
+        self._count(cache, jk_name, 4)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{cache: {hits, misses, evicted, coalesced, stale, hitRate, complexes: {jk: {...}}}}"""
+        with self._lock:
+            items = [(key, list(counters)) for key, counters in self._counters.items()]
+
+        result: Dict[str, Any] = {}
+        for (cache, jk_name), counters in sorted(items, key=lambda item: (item[0][0], item[0][1] or "")):
+            total = result.setdefault(cache, {**dict.fromkeys(_COUNTER_NAMES, 0), "complexes": {}})
+            for name, value in zip(_COUNTER_NAMES, counters):
+                total[name] += value
+            if jk_name is not None:
+                total["complexes"][jk_name] = {
+                    **dict(zip(_COUNTER_NAMES, counters)),
+                    "hitRate": _hit_rate(counters[0], counters[1]),
+                }
+        for total in result.values():
+            total["hitRate"] = _hit_rate(total["hits"], total["misses"])
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+def _hit_rate(hits: int, misses: int) -> Optional[float]:
+    lookups = hits + misses
+    return round(hits / lookups, 4) if lookups else None
+
+
+cache_stats = CacheStats()
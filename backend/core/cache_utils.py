@@ -1,13 +1,28 @@
 from __future__ import annotations
 
-from typing import Iterable, Sequence
+import asyncio
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
 
 from fastapi_cache import FastAPICache
+from starlette.concurrency import run_in_threadpool
 
-from backend.core.google_sheets import get_price_data_for_sheet_all, get_shaxmatka_data
-from backend.core.plan_cache import prewarm_plan_cache
+from backend.core.asset_manifest import asset_manifests
+from backend.core.cache_backend import MEMORY, REDIS, SQLITE, create_backend, redis_client
+from backend.core.cache_bus import LocalTransport, RedisTransport, SQLiteTransport, cache_bus
+from backend.core.chess_snapshot import chess_snapshots
+from backend.core.data_versions import ALL_KINDS, CHESS, REGISTRY, RENDERS, create_version_store, data_versions
+from backend.core.excel_importer import _normalize_block_name
+from backend.core.hot_keys import hot_keys
+from backend.core.payload_cache import apartment_info_payloads, payload_cache
+from backend.core.payment_scenarios import payment_scenarios
+from backend.core.plan_prewarm import plan_prewarm
+from backend.core.price_grid import price_grids
+from backend.core.search_index import search_indexes
+from backend.core.unit_prices import unit_price_tables
+from backend.core.warmup import cache_warmup
 from backend.database import SessionLocal
 from backend.database.models import ApartmentUnit, ResidentialComplex
+from settings import settings
 
 DEFAULT_COMPLEX_CACHE_NAMESPACES: Sequence[str] = (
     "complexes:list",
@@ -24,6 +39,14 @@ DEFAULT_COMPLEX_CACHE_NAMESPACES: Sequence[str] = (
     "shaxmatka",
 )
 
+# Data kinds the pre-serialized payloads (jk, blocks, aggregate) are built from
+PAYLOAD_KINDS: Sequence[str] = (CHESS, REGISTRY, RENDERS)
+
+# How often a worker pulls the data versions bumped elsewhere (a missed bus message, an import script)
+VERSION_REFRESH_SECONDS = 2.0
+
+_version_refresh_task: Optional[asyncio.Task] = None
+
 
 async def invalidate_complex_cache(namespaces: Iterable[str] | None = None) -> None:
     """Safely clears FastAPI cache namespaces used for complex data."""
@@ -39,38 +62,211 @@ async def invalidate_complex_cache(namespaces: Iterable[str] | None = None) -> N
             print(f"[cache] Failed to clear namespace '{namespace}': {exc}")
 
 
-async def warmup_complex_caches() -> None:
-    """Loads shaxmatka, price data, and plan previews into cache for all complexes."""
+async def invalidate_complex(
+        jk_name: str,
+        *kinds: str,
+        blocks: Iterable[str] = (),
+        broadcast: bool = True,
+) -> int:
+    """
+    Invalidates the caches of one complex after a change of the given data kinds
+    (all kinds when omitted). With ``blocks`` only those blocks count as changed
+    for block-level entries (apartment-info); complex-level entries still move.
+    Other complexes keep their cached entries. The other workers get the same
+    invalidation over the cache bus. Returns the new data version, or None when
+    the version store is unavailable: this worker then drops everything it
+    holds for the complex, and the bump is stored by the next refresh.
+    """
+    blocks = [str(block) for block in blocks if block]
+    scopes = {_normalize_block_name(block) for block in blocks}
+    scopes.discard("")
+    # A scoped bump still moves the complex-level version used by jk, blocks and aggregate
+    version = data_versions.bump(jk_name, *(kinds or ALL_KINDS), scopes=sorted(scopes))
+    if version is None:
+        _discard_local_state(jk_name)
+    await _drop_local_entries(jk_name, kinds)
+    if broadcast:
+        await cache_bus.publish("complex", jk=jk_name, kinds=list(kinds), blocks=blocks)
+    return version
+
+
+def _discard_local_state(jk_name: str) -> None:
+    """Drops this worker's version-keyed data of a complex whose version could not move."""
+    chess_snapshots.discard(jk_name)
+    price_grids.discard(jk_name)
+    unit_price_tables.discard(jk_name)
+    payment_scenarios.discard(jk_name)
+    search_indexes.discard(jk_name)
+    payload_cache.invalidate(jk_name)
+    apartment_info_payloads.invalidate(jk_name)
+
+
+async def _drop_local_entries(jk_name: str, kinds: Sequence[str]) -> None:
+    """Releases this worker's entries of a complex whose data versions have moved."""
+    if not kinds or set(kinds) & set(PAYLOAD_KINDS):
+        payload_cache.invalidate(jk_name)
+    # The landing list only shows names and renders
+    if not kinds or RENDERS in kinds:
+        await invalidate_complex_cache(["complexes:list"])
+    if settings.CACHE_WARMUP_ON_INVALIDATE:
+        # Пересобираем кэши ЖК до прихода посетителя; серия изменений даёт один прогрев
+        cache_warmup.schedule(jk_name)
+
+
+async def refresh_data_versions() -> int:
+    """Pulls the versions bumped by other workers or processes; returns the number of changed complexes."""
+    changed = await run_in_threadpool(data_versions.refresh)
+    for jk_name, kinds in changed.items():
+        await _drop_local_entries(jk_name, sorted(kinds))
+    return len(changed)
+
+
+async def _refresh_data_versions_periodically() -> None:
+    while True:
+        await asyncio.sleep(VERSION_REFRESH_SECONDS)
+        try:
+            await refresh_data_versions()
+        except Exception as exc:  # noqa: BLE001 - keep refreshing
+            print(f"[cache] Failed to refresh data versions: {exc}")
+
+
+async def clear_complex_caches(broadcast: bool = True) -> None:
+    """Drops every complex cache of this worker and, over the cache bus, of the others."""
+    chess_snapshots.invalidate_all()
+    price_grids.invalidate_all()
+    payload_cache.invalidate_all()
+    apartment_info_payloads.invalidate_all()
+    asset_manifests.invalidate_all()
+    await invalidate_complex_cache()
+    if broadcast:
+        await cache_bus.publish("clear")
+
+
+async def _apply_remote_invalidation(message: Dict[str, Any]) -> None:
+    # The sender has stored the new versions: take its numbers instead of bumping our own
+    await refresh_data_versions()
+
+
+async def _apply_remote_clear(message: Dict[str, Any]) -> None:
+    await clear_complex_caches(broadcast=False)
+
+
+cache_bus.on("complex", _apply_remote_invalidation)
+cache_bus.on("clear", _apply_remote_clear)
+
+
+async def init_shared_cache() -> None:
+    """
+    Sets up FastAPICache, the data version store and the cache bus for
+    ``settings.CACHE_BACKEND``: memory (one worker), redis or sqlite (several
+    workers sharing the cache).
+    """
+    global _version_refresh_task
+
+    hot_keys.configure(settings.CACHE_HOT_KEYS_PATH)
+    kind = settings.CACHE_BACKEND
+    data_versions.configure(create_version_store(kind, settings.CACHE_REDIS_URL, settings.CACHE_SQLITE_PATH))
+    redis = redis_client(settings.CACHE_REDIS_URL) if kind == REDIS else None
+    FastAPICache.init(
+        create_backend(kind, settings.CACHE_REDIS_URL, settings.CACHE_SQLITE_PATH, redis=redis),
+        prefix="fastapi-cache",
+    )
+    await cache_bus.start(_bus_transport(kind, redis))
+    if _version_refresh_task is None or _version_refresh_task.done():
+        _version_refresh_task = asyncio.create_task(_refresh_data_versions_periodically())
+    if kind != MEMORY:
+        print(f"[cache] Shared cache backend: {kind}")
+
+
+def _bus_transport(kind: str, redis: Any = None) -> Any:
+    if kind == REDIS:
+        return RedisTransport(redis if redis is not None else redis_client(settings.CACHE_REDIS_URL))
+    if kind == SQLITE:
+        return SQLiteTransport(settings.CACHE_SQLITE_PATH)
+    return LocalTransport()
+
+
+async def announce_complex_changes(changes: Dict[str, Sequence[str]]) -> None:
+    """
+    For processes outside the server (import scripts): stores new data versions
+    of the changed complexes and tells the running workers over the cache bus.
+    Without a bus (memory backend) the workers pick the versions up at their
+    next refresh.
+    """
+    kind = settings.CACHE_BACKEND
+    data_versions.configure(create_version_store(kind, settings.CACHE_REDIS_URL, settings.CACHE_SQLITE_PATH))
+    await cache_bus.start(_bus_transport(kind))
+    try:
+        for jk_name, kinds in changes.items():
+            data_versions.bump(jk_name, *kinds)
+            await cache_bus.publish("complex", jk=jk_name, kinds=list(kinds), blocks=[])
+    finally:
+        await cache_bus.stop()
+
+
+async def stop_shared_cache() -> None:
+    global _version_refresh_task
+
+    if _version_refresh_task is not None:
+        _version_refresh_task.cancel()
+        _version_refresh_task = None
+    await cache_bus.stop()
+
+
+def _plan_prewarm_pairs(session: Any, complex_id: int) -> Set[Tuple[str, str]]:
+    """Unique block/size combinations of a complex's apartments."""
+    units = (
+        session.query(ApartmentUnit.block_name, ApartmentUnit.area_sqm)
+        .filter(ApartmentUnit.complex_id == complex_id)
+        .all()
+    )
+    return {
+        (block_name or "", f"{area:.2f}")
+        for block_name, area in units
+        if block_name and area is not None
+    }
+
+
+def collect_plan_prewarm_targets() -> Dict[str, Set[Tuple[str, str]]]:
+    """Block/size combinations of every complex, for ``start_plan_prewarm``."""
     session = SessionLocal()
     try:
-        complexes = session.query(ResidentialComplex).all()
-        if not complexes:
-            return
+        return {
+            complex_obj.name: _plan_prewarm_pairs(session, complex_obj.id)
+            for complex_obj in session.query(ResidentialComplex).all()
+        }
+    finally:
+        session.close()
 
-        for complex_obj in complexes:
-            jk_name = complex_obj.name
-            try:
-                await get_shaxmatka_data(jk_name)
-            except Exception as exc:  # noqa: BLE001
-                print(f"[cache] Failed shaxmatka warmup for {jk_name}: {exc}")
 
-            try:
-                await get_price_data_for_sheet_all(jk_name)
-            except Exception as exc:  # noqa: BLE001
-                print(f"[cache] Failed price warmup for {jk_name}: {exc}")
+def start_plan_prewarm(targets: Dict[str, Set[Tuple[str, str]]]) -> bool:
+    """Starts the plan preview prewarm in a process pool; False when a run is already in progress."""
+    targets = {jk_name: pairs for jk_name, pairs in targets.items() if pairs}
+    return plan_prewarm.start(targets, workers=settings.PLAN_PREWARM_WORKERS or None)
 
+
+async def warmup_complex_caches() -> None:
+    """
+    Fills the endpoint caches of all complexes through ``cache_warmup`` (the
+    warmers are registered by the endpoints), then starts the plan preview
+    prewarm without waiting for it.
+    """
+    asset_manifests.build_all()
+    plan_targets: Dict[str, Set[Tuple[str, str]]] = {}
+    session = SessionLocal()
+    try:
+        complexes = session.query(ResidentialComplex).all()
+        for complex_obj in complexes:
             # Pre-cache plan images for unique block/size combinations.
-            units = (
-                session.query(ApartmentUnit.block_name, ApartmentUnit.area_sqm)
-                .filter(ApartmentUnit.complex_id == complex_obj.id)
-                .all()
-            )
-            unique_pairs = {
-                (block_name or "", f"{area:.2f}")
-                for block_name, area in units
-                if block_name and area is not None
-            }
-            if unique_pairs:
-                prewarm_plan_cache(jk_name, unique_pairs)
+            plan_targets[complex_obj.name] = _plan_prewarm_pairs(session, complex_obj.id)
     finally:
         session.close()
+    if not complexes:
+        return
+
+    # Merge the request counts of all workers first: the apartment-info warmer ranks by them
+    await run_in_threadpool(hot_keys.save)
+    await cache_warmup.run([complex_obj.name for complex_obj in complexes], settings.CACHE_WARMUP_CONCURRENCY)
+
+    if not start_plan_prewarm(plan_targets):
+        print("[cache] Plan prewarm is still running, skipping this round")
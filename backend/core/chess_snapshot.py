@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from backend.core.cache_stats import cache_stats
+from backend.core.data_versions import CHESS, data_versions
+from backend.core.excel_importer import (
+    _coerce_float,
+    _coerce_int,
+    _normalize_block_name,
+    _normalize_unit_number,
+)
+from backend.database import SessionLocal
+from backend.database.models import ApartmentUnit, ResidentialComplex
+
+_DISPLAY_NUMBER_KEYS = ("номер помещение ", "номер помещение")
+
+# Area tolerance (m²) used when matching an apartment by its size.
+AREA_TOLERANCE = 0.15
+
+# Column names of ``ChessSnapshot.rows()`` (legacy shaxmatka layout).
+ROW_COLUMNS: Tuple[str, ...] = ("block", "type", "status", "rooms", "number", "area", "floor")
+
+_UnitKey = Tuple[str, int, str]
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _StringTable:
+    """Maps repeated strings (blocks, statuses, unit types) to small integer codes."""
+
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(_intern(value))
+        return code
+
+
+class ChessSnapshot:
+    """
+    Immutable column-oriented view of one complex's chessboard.
+
+    Numeric columns live in NumPy arrays, repeated strings are stored once in
+    lookup tables and referenced by code. ``version`` is the chess data version
+    the snapshot was built from.
+    """
+
+    def __init__(
+            self,
+            complex_id: int,
+            name: str,
+            version: int,
+            ids: np.ndarray,
+            block_codes: np.ndarray,
+            type_codes: np.ndarray,
+            status_codes: np.ndarray,
+            rooms: np.ndarray,
+            areas: np.ndarray,
+            floors: np.ndarray,
+            unit_numbers: Sequence[str],
+            display_numbers: Sequence[Any],
+            block_names: Sequence[Optional[str]],
+            unit_types: Sequence[Optional[str]],
+            statuses: Sequence[Optional[str]],
+    ) -> None:
+        self.complex_id = complex_id
+        self.name = name
+        self.version = version
+        self.ids = ids
+        self.block_codes = block_codes
+        self.type_codes = type_codes
+        self.status_codes = status_codes
+        self.rooms = rooms
+        self.areas = areas
+        self.floors = floors
+        self.unit_numbers = tuple(unit_numbers)
+        self.display_numbers = tuple(display_numbers)
+        self.block_names = tuple(block_names)
+        self.unit_types = tuple(unit_types)
+        self.statuses = tuple(statuses)
+        self._rows: Optional[Tuple[Tuple[Any, ...], ...]] = None
+        self._index: Optional[Dict[_UnitKey, Tuple[int, ...]]] = None
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @property
+    def blocks(self) -> List[str]:
+        """Sorted distinct non-empty block names."""
+        return sorted({str(name).strip() for name in self.block_names if name})
+
+    @property
+    def floor_numbers(self) -> List[int]:
+        return [int(floor) for floor in np.unique(self.floors)]
+
+    def status_at(self, position: int) -> Optional[str]:
+        return self.statuses[self.status_codes[position]]
+
+    def unit_type_at(self, position: int) -> Optional[str]:
+        return self.unit_types[self.type_codes[position]]
+
+    def area_at(self, position: int) -> Optional[float]:
+        area = self.areas[position]
+        return None if np.isnan(area) else float(area)
+
+    def rooms_at(self, position: int) -> Optional[int]:
+        rooms = self.rooms[position]
+        return None if rooms < 0 else int(rooms)
+
+    def row_at(self, position: int) -> Tuple[Any, ...]:
+        return (
+            self.block_names[self.block_codes[position]],
+            self.unit_type_at(position),
+            self.status_at(position),
+            self.rooms_at(position),
+            self.display_numbers[position],
+            self.area_at(position),
+            int(self.floors[position]),
+        )
+
+    def rows(self) -> List[List[Any]]:
+        """Rows in the legacy shaxmatka layout: block, type, status, rooms, number, area, floor."""
+        if self._rows is None:
+            self._rows = tuple(self.row_at(position) for position in range(len(self)))
+        return [list(row) for row in self._rows]
+
+    def _unit_index(self) -> Dict[_UnitKey, Tuple[int, ...]]:
+        if self._index is None:
+            normalized_blocks = [_normalize_block_name(name) for name in self.block_names]
+            index: Dict[_UnitKey, List[int]] = {}
+            for position in range(len(self)):
+                number = _normalize_unit_number(self.unit_numbers[position])
+                if not number:
+                    continue
+                block = normalized_blocks[self.block_codes[position]]
+                index.setdefault((block, int(self.floors[position]), number), []).append(position)
+            self._index = {key: tuple(positions) for key, positions in index.items()}
+        return self._index
+
+    def find(
+            self,
+            block_name: Any,
+            floor: Any,
+            unit_number: Any,
+            area: Any = None,
+            tolerance: float = AREA_TOLERANCE,
+    ) -> Optional[int]:
+        """
+        Returns the row position of an apartment or None.
+
+        Matches on (normalized block, floor, ``unit_number``), the same key as
+        the SQL lookup in the Excel API; the display number is not indexed.
+        When ``area`` is given the unit's area must also be within ``tolerance``
+        of it.
+        """
+        floor_int = _coerce_int(floor)
+        if floor_int is None:
+            return None
+        positions = self._unit_index().get(
+            (_normalize_block_name(block_name), floor_int, _normalize_unit_number(unit_number))
+        )
+        if not positions:
+            return None
+        if area is None:
+            return positions[0]
+
+        target_area = _coerce_float(area)
+        if target_area is None:
+            return None
+        for position in positions:
+            if abs(self.areas[position] - target_area) <= tolerance:
+                return position
+        return None
+
+
+def _load_snapshot(jk_name: str, version: int) -> ChessSnapshot:
+    session = SessionLocal()
+    try:
+        complex_obj = (
+            session.query(ResidentialComplex)
+            .filter(ResidentialComplex.name == jk_name)
+            .first()
+        )
+        if not complex_obj:
+            raise HTTPException(status_code=404, detail=f"ЖК '{jk_name}' не найден")
+
+        units = (
+            session.query(
+                ApartmentUnit.id,
+                ApartmentUnit.block_name,
+                ApartmentUnit.unit_type,
+                ApartmentUnit.status,
+                ApartmentUnit.rooms,
+                ApartmentUnit.unit_number,
+                ApartmentUnit.area_sqm,
+                ApartmentUnit.floor,
+                ApartmentUnit.raw_payload,
+            )
+            .filter(ApartmentUnit.complex_id == complex_obj.id)
+            .order_by(ApartmentUnit.block_name.asc(), ApartmentUnit.floor.asc(), ApartmentUnit.unit_number.asc())
+            .all()
+        )
+        complex_id = complex_obj.id
+    finally:
+        session.close()
+
+    count = len(units)
+    ids = np.empty(count, dtype=np.int64)
+    block_codes = np.empty(count, dtype=np.int32)
+    type_codes = np.empty(count, dtype=np.int16)
+    status_codes = np.empty(count, dtype=np.int16)
+    rooms = np.empty(count, dtype=np.int32)
+    areas = np.empty(count, dtype=np.float64)
+    floors = np.empty(count, dtype=np.int32)
+    unit_numbers: List[str] = []
+    display_numbers: List[Any] = []
+    block_table, type_table, status_table = _StringTable(), _StringTable(), _StringTable()
+
+    for position, unit in enumerate(units):
+        payload = unit.raw_payload or {}
+        ids[position] = unit.id
+        block_codes[position] = block_table.code(unit.block_name)
+        type_codes[position] = type_table.code(unit.unit_type)
+        status_codes[position] = status_table.code(unit.status)
+        rooms[position] = unit.rooms if unit.rooms is not None else -1
+        areas[position] = unit.area_sqm if unit.area_sqm is not None else np.nan
+        floors[position] = unit.floor
+        unit_numbers.append(_intern(unit.unit_number))
+        display_number = next((payload[key] for key in _DISPLAY_NUMBER_KEYS if payload.get(key)), None)
+        display_numbers.append(_intern(display_number or unit.unit_number))
+
+    return ChessSnapshot(
+        complex_id=complex_id,
+        name=jk_name,
+        version=version,
+        ids=ids,
+        block_codes=block_codes,
+        type_codes=type_codes,
+        status_codes=status_codes,
+        rooms=rooms,
+        areas=areas,
+        floors=floors,
+        unit_numbers=unit_numbers,
+        display_numbers=display_numbers,
+        block_names=block_table.values,
+        unit_types=type_table.values,
+        statuses=status_table.values,
+    )
+
+
+class ChessSnapshotStore:
+    """Keeps the latest chessboard snapshot per complex and reloads it only when its version moves."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, ChessSnapshot] = {}
+
+    def get(self, jk_name: str) -> ChessSnapshot:
+        version = data_versions.current(jk_name, CHESS)
+        snapshot = self._snapshots.get(jk_name)
+        if snapshot is not None and snapshot.version == version:
+            cache_stats.hit("chess-snapshot", jk_name)
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(jk_name)
+            if snapshot is None or snapshot.version != version:
+                cache_stats.miss("chess-snapshot", jk_name)
+                snapshot = _load_snapshot(jk_name, version)
+                self._snapshots[jk_name] = snapshot
+            else:
+                cache_stats.hit("chess-snapshot", jk_name)
+            return snapshot
+
+    def peek(self, jk_name: str) -> Optional[ChessSnapshot]:
+        """Returns the current snapshot only if it is already loaded; never touches the database."""
+        snapshot = self._snapshots.get(jk_name)
+        if snapshot is not None and snapshot.version == data_versions.current(jk_name, CHESS):
+            return snapshot
+        return None
+
+    def invalidate(self, jk_name: str) -> Optional[int]:
+        """Bumps the chess version of a complex; the next reader rebuilds its snapshot."""
+        version = data_versions.bump(jk_name, CHESS)
+        if version is None:
+            self.discard(jk_name)
+        return version
+
+    def discard(self, jk_name: str) -> None:
+        """Drops the loaded snapshot without a version change (the version store is unavailable)."""
+        with self._lock:
+            self._snapshots.pop(jk_name, None)
+
+    def invalidate_all(self) -> None:
+        for jk_name in list(self._snapshots):
+            self.invalidate(jk_name)
+
+
+chess_snapshots = ChessSnapshotStore()
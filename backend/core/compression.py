@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import gzip
+from typing import Dict, Optional, Tuple
+
+try:  # Brotli is optional: without it clients are served gzip
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+# Bodies smaller than this are sent as is: headers would eat the savings.
+MIN_COMPRESS_SIZE = 1024
+
+# Content types worth compressing; images, PDFs and archives are already compressed.
+COMPRESSIBLE_TYPES: Tuple[str, ...] = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# (gzip level, brotli quality): fast for per-request compression, maximal for cached bodies
+# that are compressed once per data version.
+FAST = (6, 4)
+BEST = (9, 11)
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Encodings this process can produce, most preferred first."""
+    return (BROTLI, GZIP) if brotli is not None else (GZIP,)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported encoding allowed by an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[token] = weight
+
+    best: Optional[str] = None
+    best_weight = 0.0
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    if content_type.startswith("text/event-stream"):
+        return False
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, level: Tuple[int, int] = FAST) -> bytes:
+    if encoding == BROTLI and brotli is not None:
+        return brotli.compress(body, quality=level[1])
+    if encoding == GZIP:
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(body, compresslevel=level[0], mtime=0)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from backend.core.cache_backend import REDIS, connect_sqlite, redis_sync_client
+
+# Data kinds tracked per residential complex.
+CHESS = "chess"
+PRICES = "prices"
+REGISTRY = "registry"
+SETTINGS = "settings"
+RENDERS = "renders"
+
+ALL_KINDS: Tuple[str, ...] = (CHESS, PRICES, REGISTRY, SETTINGS, RENDERS)
+
+
+# Stored version fields: latest bump of a kind, last bump of the whole kind, last bump of one scope.
+_LATEST = "v"
+_FULL = "f"
+_SCOPED = "s"
+
+_Field = Tuple[Any, ...]
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LocalVersionStore:
+    """Versions private to this process (scripts and tests without a shared cache)."""
+
+    def __init__(self) -> None:
+        self._counter = itertools.count(_now_ms())
+        self._epoch = next(self._counter)
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def bump(self, fields: List[_Field]) -> int:
+        return next(self._counter)
+
+    def load(self) -> Dict[_Field, int]:
+        return {}
+
+
+class SQLiteVersionStore:
+    """
+    Versions in a table of the shared cache file. Stored versions only grow
+    (a late writer never overwrites a newer number), so concurrent bumps from
+    several workers or processes need no transaction.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS data_versions (field TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+        )
+        now = _now_ms()
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO data_versions (field, version) VALUES (?, ?)", [("counter", now), ("epoch", now)],
+        )
+        self._epoch = self._connection.execute("SELECT version FROM data_versions WHERE field = 'epoch'").fetchone()[0]
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def bump(self, fields: List[_Field]) -> int:
+        with self._lock:
+            version = self._connection.execute(
+                "UPDATE data_versions SET version = version + 1 WHERE field = 'counter' RETURNING version"
+            ).fetchone()[0]
+            self._connection.executemany(
+                "INSERT INTO data_versions (field, version) VALUES (?, ?)"
+                " ON CONFLICT(field) DO UPDATE SET version = MAX(version, excluded.version)",
+                [(_encode(field), version) for field in fields],
+            )
+        return version
+
+    def load(self) -> Dict[_Field, int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT field, version FROM data_versions WHERE field NOT IN ('counter', 'epoch')"
+            ).fetchall()
+        return {_decode(field): version for field, version in rows}
+
+
+class RedisVersionStore:
+    """
+    Versions in Redis: INCR for the counter, a sorted set updated with
+    ``ZADD GT`` for the fields, so a stored version never goes back.
+    ``client`` is a synchronous redis client.
+    """
+
+    def __init__(self, client: Any, prefix: str = "estate:data-versions") -> None:
+        self._client = client
+        self._counter_key = f"{prefix}:counter"
+        self._epoch_key = f"{prefix}:epoch"
+        self._fields_key = f"{prefix}:fields"
+        now = _now_ms()
+        self._client.set(self._counter_key, now, nx=True)
+        self._client.set(self._epoch_key, now, nx=True)
+        self._epoch = int(self._client.get(self._epoch_key))
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def bump(self, fields: List[_Field]) -> int:
+        version = int(self._client.incr(self._counter_key))
+        self._client.zadd(self._fields_key, {_encode(field): version for field in fields}, gt=True)
+        return version
+
+    def load(self) -> Dict[_Field, int]:
+        return {
+            _decode(field): int(version)
+            for field, version in self._client.zrange(self._fields_key, 0, -1, withscores=True)
+        }
+
+
+def _encode(field: _Field) -> str:
+    return json.dumps(field, ensure_ascii=False)
+
+
+def _decode(field: Any) -> _Field:
+    if isinstance(field, bytes):
+        field = field.decode("utf-8")
+    return tuple(json.loads(field))
+
+
+def create_version_store(kind: str, redis_url: str, sqlite_path: str) -> Any:
+    """
+    Shared version store for the cache backend ``kind``: Redis for redis, the
+    SQLite cache file otherwise. With the memory backend the file is still used,
+    so scripts running next to the server (Excel import) can announce changes.
+    """
+    if kind == REDIS:
+        return RedisVersionStore(redis_sync_client(redis_url))
+    return SQLiteVersionStore(sqlite_path)
+
+
+class DataVersions:
+    """
+    Version registry for complex data, shared by every worker and process.
+
+    Every (complex, kind) pair carries its own version. All versions are drawn
+    from one monotonically increasing counter kept in the version store, so a
+    larger number is always newer data regardless of complex, kind or the
+    worker that made the change, and every worker computes the same ETags.
+    Pairs never bumped share the store's epoch. Reads are served from memory;
+    ``refresh`` pulls the bumps made elsewhere (on a cache bus message and
+    periodically).
+
+    A kind can also be bumped for some of its parts only (``scopes``, e.g. the
+    blocks whose apartments changed). ``current_scoped`` then moves for those
+    parts and for whole-kind bumps, but not for changes in other parts.
+
+    Version numbers come only from the store. When it cannot be reached a bump
+    returns None and is kept to be stored again by the next ``refresh``; the
+    caller drops its local entries meanwhile.
+    """
+
+    def __init__(self, store: Any = None) -> None:
+        self._lock = threading.Lock()
+        self._configure_locked(store or LocalVersionStore())
+
+    def _configure_locked(self, store: Any) -> None:
+        self._store = store
+        self._epoch = store.epoch()
+        self._versions: Dict[Tuple[str, str], int] = {}
+        # Last bump of the whole kind, without scopes
+        self._full_versions: Dict[Tuple[str, str], int] = {}
+        self._scoped_versions: Dict[Tuple[str, str, Hashable], int] = {}
+        # Bumps the store failed to take, stored again on refresh
+        self._unstored: List[_Field] = []
+
+    def configure(self, store: Any) -> None:
+        """Switches to ``store`` and loads the versions kept there."""
+        with self._lock:
+            self._configure_locked(store)
+        self.refresh()
+
+    def current(self, jk_name: str, kind: str) -> int:
+        return self._versions.get((jk_name, kind), self._epoch)
+
+    def current_scoped(self, jk_name: str, kind: str, scope: Hashable) -> int:
+        """Version of one part of a kind: moves when that part or the whole kind changes."""
+        return max(
+            self._full_versions.get((jk_name, kind), self._epoch),
+            self._scoped_versions.get((jk_name, kind, scope), 0),
+        )
+
+    def _merge_locked(self, fields: Dict[_Field, int]) -> Dict[str, Set[str]]:
+        """Applies stored versions newer than the known ones; returns the changed kinds per complex."""
+        changed: Dict[str, Set[str]] = {}
+        for field, version in fields.items():
+            marker, jk_name, kind = field[:3]
+            if marker == _LATEST:
+                target, key = self._versions, (jk_name, kind)
+            elif marker == _FULL:
+                target, key = self._full_versions, (jk_name, kind)
+            else:
+                target, key = self._scoped_versions, (jk_name, kind, field[3])
+            if version > target.get(key, 0):
+                target[key] = version
+                changed.setdefault(jk_name, set()).add(kind)
+        return changed
+
+    def _store_unstored(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            fields, self._unstored = self._unstored, []
+        if not fields:
+            return {}
+        try:
+            version = self._store.bump(fields)
+        except Exception as exc:  # noqa: BLE001 - try again on the next refresh
+            print(f"[data-versions] Failed to store {len(fields)} pending bumps: {exc}")
+            with self._lock:
+                self._unstored[:0] = fields
+            return {}
+        with self._lock:
+            return self._merge_locked({field: version for field in fields})
+
+    def refresh(self) -> Dict[str, Set[str]]:
+        """
+        Stores the bumps the store failed to take earlier, then pulls the
+        versions bumped by other workers or processes; returns the changed
+        kinds per complex.
+        """
+        changed = self._store_unstored()
+        try:
+            fields = self._store.load()
+        except Exception as exc:  # noqa: BLE001 - keep serving the known versions
+            print(f"[data-versions] Failed to load versions: {exc}")
+            return changed
+        with self._lock:
+            for jk_name, kinds in self._merge_locked(fields).items():
+                changed.setdefault(jk_name, set()).update(kinds)
+        return changed
+
+    def bump(self, jk_name: str, *kinds: str, scopes: Iterable[Hashable] = ()) -> Optional[int]:
+        """
+        Marks the given kinds (all kinds when omitted) of a complex as changed,
+        optionally only in ``scopes``. Returns the new version, or None when the
+        store failed: the bump is then stored by the next ``refresh``.
+        """
+        targets: Iterable[str] = kinds or ALL_KINDS
+        scopes = tuple(scopes)
+        fields: List[_Field] = []
+        for kind in targets:
+            fields.append((_LATEST, jk_name, kind))
+            if scopes:
+                fields.extend((_SCOPED, jk_name, kind, scope) for scope in scopes)
+            else:
+                fields.append((_FULL, jk_name, kind))
+        try:
+            version = self._store.bump(fields)
+        except Exception as exc:  # noqa: BLE001 - a made-up number could collide with a later stored one
+            print(f"[data-versions] Failed to store a bump of '{jk_name}', retrying on refresh: {exc}")
+            with self._lock:
+                self._unstored.extend(fields)
+            return None
+        with self._lock:
+            self._merge_locked({field: version for field in fields})
+        return version
+
+
+data_versions = DataVersions()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, Hashable, Set, Tuple
+
+# Events a subscriber may lag behind before it is told to resynchronise.
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Sent instead of further events once a subscriber's queue overflows.
+OVERFLOW_EVENT: Dict[str, Any] = {"type": "reset", "reason": "overflow"}
+
+_Subscriber = Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Dict[str, Any]]"]
+
+
+class EventHub:
+    """
+    In-process publish/subscribe hub with one channel per key.
+
+    Every subscriber gets its own bounded asyncio queue and receives each event
+    published to its channel. Publishing never blocks: a subscriber that falls
+    too far behind gets its queue replaced by a single reset event. ``publish``
+    may be called from any thread.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> None:
+        self._lock = threading.Lock()
+        self._queue_size = queue_size
+        self._channels: Dict[Hashable, Set[_Subscriber]] = {}
+
+    def subscribe(self, channel: Hashable) -> "asyncio.Queue[Dict[str, Any]]":
+        """Registers a subscriber on the running event loop and returns its queue."""
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel: Hashable, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if not subscribers:
+                return
+            for subscriber in [item for item in subscribers if item[1] is queue]:
+                subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[channel]
+
+    def subscriber_count(self, channel: Hashable) -> int:
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+    def publish(self, channel: Hashable, event: Dict[str, Any]) -> int:
+        """Fans ``event`` out to every subscriber of ``channel``; returns the number of subscribers."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return 0
+
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+
+        for loop, queue in subscribers:
+            if loop is current_loop:
+                _deliver(queue, event)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(_deliver, queue, event)
+        return len(subscribers)
+
+
+def _deliver(queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(OVERFLOW_EVENT)
+
+
+event_hub = EventHub()
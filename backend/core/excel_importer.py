@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import re
+from contextlib import contextmanager
 from datetime import date, datetime
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from openpyxl import load_workbook
+from sqlalchemy import Table, bindparam, delete, func, insert, select, update
 from sqlalchemy.orm import Session
 
 from backend.database.models import (
@@ -54,6 +58,9 @@ CONTRACT_HEADER_MAP: Dict[str, str] = {
 
 DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d")
 
+# Rows per executemany batch: memory stays flat however long the sheet is.
+IMPORT_CHUNK_SIZE = 5000
+
 
 _CYR_TO_LAT = {
     "А": "A", "а": "a",
@@ -151,121 +158,386 @@ def _parse_date_value(value: Any) -> Optional[date]:
     return None
 
 
-def _map_headers(headers: List[Any], aliases: Dict[str, Iterable[str]]) -> Dict[str, int]:
-    header_map: Dict[str, int] = {}
-    normalized_headers = [_normalize_header(header) for header in headers]
+def _compile_aliases(aliases: Dict[str, Iterable[str]]) -> Dict[str, str]:
+    """Normalized header -> field, built once per alias table instead of per import."""
+    compiled: Dict[str, str] = {}
     for field, patterns in aliases.items():
-        for idx, header in enumerate(normalized_headers):
-            if header and header in patterns:
-                header_map[field] = idx
-                break
+        for pattern in patterns:
+            normalized = _normalize_header(pattern)
+            if normalized:
+                compiled.setdefault(normalized, field)
+    return compiled
+
+
+_CHESS_HEADER_FIELDS = _compile_aliases(CHESS_HEADER_ALIASES)
+
+
+def _map_headers(headers: List[Any], fields: Dict[str, str]) -> Dict[str, int]:
+    """Column of every known field; the first matching header wins."""
+    header_map: Dict[str, int] = {}
+    for idx, header in enumerate(headers):
+        field = fields.get(_normalize_header(header))
+        if field is not None:
+            header_map.setdefault(field, idx)
     return header_map
 
 
-def import_chess_from_excel(db: Session, complex_obj: ResidentialComplex, file_path: str) -> int:
-    workbook = load_workbook(file_path, data_only=True)
-    sheet = workbook.active
+@contextmanager
+def _open_sheet(file_path: str) -> Iterator[Iterator[Tuple[Any, ...]]]:
+    """Rows of the active sheet as value tuples, streamed by openpyxl in read-only mode."""
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # Some exporters write a wrong <dimension>; read every row to its last cell instead
+        sheet.reset_dimensions()
+        yield sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
 
-    headers = [cell.value for cell in sheet[1]]
-    header_map = _map_headers(headers, {k: {_normalize_header(h) for h in v} for k, v in CHESS_HEADER_ALIASES.items()})
 
-    required = {"block_name", "status", "unit_number", "floor"}
-    if not required.issubset(header_map):
-        missing = required - header_map.keys()
-        raise ValueError(f"Отсутствуют обязательные колонки в шахматке: {', '.join(sorted(missing))}")
+def _pad(row: Tuple[Any, ...], width: int) -> Tuple[Any, ...]:
+    # Read-only rows end at their last filled cell
+    return row if len(row) >= width else row + (None,) * (width - len(row))
 
-    db.query(ApartmentUnit).filter(ApartmentUnit.complex_id == complex_obj.id).delete(synchronize_session=False)
 
-    new_units: List[ApartmentUnit] = []
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        if all(cell is None for cell in row):
-            continue
+def _timestamps(table: Table, *names: str) -> Dict[str, Any]:
+    # Filled in by the database (UTC, like the columns' utcnow defaults): an executemany then
+    # binds no timestamps, so SQLAlchemy neither calls the Python default nor converts a datetime per row
+    return {name: func.current_timestamp() for name in names if name in table.c}
 
-        block_name = row[header_map["block_name"]]
-        unit_number = row[header_map["unit_number"]]
-        floor = row[header_map["floor"]]
 
-        normalized_unit_number = _normalize_unit_number(unit_number)
-        floor_int = _coerce_int(floor)
+def _insert_rows(db: Session, table: Table, rows: List[Dict[str, Any]]) -> int:
+    """One Core executemany for a chunk of rows, without building ORM objects."""
+    if rows:
+        db.execute(insert(table).values(**_timestamps(table, "created_at", "updated_at")), rows)
+    return len(rows)
 
-        if not normalized_unit_number or floor_int is None:
-            continue
 
-        payload = {str(headers[idx]): row[idx] for idx in range(len(headers)) if headers[idx] is not None}
+# Natural key of a unit within its complex (uq_apartment_unit): block, floor, unit number.
+UnitKey = Tuple[str, int, str]
 
-        unit_type_value = None
-        if "unit_type" in header_map:
-            raw_type = row[header_map["unit_type"]]
-            unit_type_value = str(raw_type).strip() if raw_type is not None else None
+# Unit columns a chess import writes besides the key; their values make up the row's content hash.
+CHESS_CONTENT_FIELDS: Tuple[str, ...] = ("unit_type", "status", "rooms", "area_sqm", "raw_payload")
 
-        status_raw = row[header_map["status"]]
-        status_value = str(status_raw).strip() if status_raw is not None else ""
+# Units a diff lists by key per kind of change; the counts are always complete.
+DIFF_REPORT_LIMIT = 50
 
-        rooms_value = _coerce_int(row[header_map["rooms"]]) if "rooms" in header_map else None
-        area_value = _coerce_float(row[header_map["area_sqm"]]) if "area_sqm" in header_map else None
+_DELETE_CHUNK_SIZE = 500
 
-        new_units.append(
-            ApartmentUnit(
-                complex_id=complex_obj.id,
-                block_name=str(block_name).strip() if block_name is not None else "",
-                unit_type=unit_type_value,
-                status=status_value,
-                rooms=rooms_value,
-                unit_number=normalized_unit_number,
-                area_sqm=area_value,
-                floor=floor_int,
-                raw_payload=payload or None,
-            )
-        )
 
-    if new_units:
-        db.bulk_save_objects(new_units)
+def _is_status_column(name: Any) -> bool:
+    # The same raw_payload columns set_apartment_status keeps in line with the status
+    return isinstance(name, str) and "статус" in name.lower()
 
-    return len(new_units)
 
+def _digest(value: Any) -> bytes:
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).digest()
 
-def import_price_from_excel(db: Session, complex_obj: ResidentialComplex, file_path: str) -> int:
-    workbook = load_workbook(file_path, data_only=True)
-    sheet = workbook.active
 
-    headers = [cell.value for cell in sheet[1]]
-    if not headers or len(headers) < 2:
-        raise ValueError("Некорректный формат price_shaxamtka.xlsx: отсутствуют заголовки")
+def _content_hashes(row: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """Hash of a unit's content, and of its content without the status and the status columns of raw_payload."""
+    payload = row["raw_payload"] or {}
+    rest = _digest([
+        row["unit_type"], row["rooms"], row["area_sqm"],
+        {name: value for name, value in payload.items() if not _is_status_column(name)},
+    ])
+    full = _digest([rest.hex(), row["status"], {name: value for name, value in payload.items() if _is_status_column(name)}])
+    return full, rest
 
-    category_headers = headers[1:]
-    parsed_categories = [str(header) for header in category_headers]
 
-    db.query(ChessboardPriceEntry).filter(ChessboardPriceEntry.complex_id == complex_obj.id).delete(synchronize_session=False)
+def _unit_key(row: Dict[str, Any]) -> UnitKey:
+    return row["block_name"], row["floor"], row["unit_number"]
 
-    new_entries: List[ChessboardPriceEntry] = []
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        floor_val = _coerce_int(row[0] if row else None)
-        if floor_val is None:
-            continue
 
-        for order_index, category in enumerate(parsed_categories):
-            price_val = _coerce_float(row[order_index + 1] if len(row) > order_index + 1 else None)
-            if price_val is None:
+def _key_dict(key: UnitKey) -> Dict[str, Any]:
+    return {"block": key[0], "floor": key[1], "unitNumber": key[2]}
+
+
+def _changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Changed unit columns, raw_payload ones by their sheet header."""
+    fields = [field for field in CHESS_CONTENT_FIELDS if field != "raw_payload" and old[field] != new[field]]
+    old_payload = old["raw_payload"] or {}
+    new_payload = new["raw_payload"] or {}
+    for name in list(new_payload) + [name for name in old_payload if name not in new_payload]:
+        if old_payload.get(name) != new_payload.get(name) and name not in fields:
+            fields.append(name)
+    return fields
+
+
+class ChessImportDiff:
+    """What a chess import changed in the units of a complex (or would change, in a dry run)."""
+
+    def __init__(self, complex_id: int, dry_run: bool = False) -> None:
+        self.complex_id = complex_id
+        self.dry_run = dry_run
+        self.total = 0
+        self.unchanged = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.blocks: Set[str] = set()
+        # (unit id, key, old status, new status) of every updated unit whose status moved
+        self.status_changes: List[Tuple[int, UnitKey, str, str]] = []
+        self._status_only_updates = True
+        self._samples: Dict[str, List[Dict[str, Any]]] = {"inserted": [], "updated": [], "deleted": []}
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    @property
+    def status_only(self) -> bool:
+        """Only statuses of existing units changed: clients can apply the changes as status deltas."""
+        return self.changed and not self.inserted and not self.deleted and self._status_only_updates
+
+    def _sample(self, kind: str, entry: Dict[str, Any]) -> None:
+        if len(self._samples[kind]) < DIFF_REPORT_LIMIT:
+            self._samples[kind].append(entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dryRun": self.dry_run,
+            "total": self.total,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "unchanged": self.unchanged,
+            "statusOnly": self.status_only,
+            "blocks": sorted(self.blocks),
+            "units": self._samples,
+        }
+
+
+def _existing_units(db: Session, complex_id: int) -> Dict[UnitKey, Tuple[int, bytes, bytes, str]]:
+    """Key -> (id, content hash, hash without status, status) of the units a complex has now."""
+    table = ApartmentUnit.__table__
+    columns = [table.c.id, table.c.block_name, table.c.floor, table.c.unit_number] + [
+        table.c[field] for field in CHESS_CONTENT_FIELDS
+    ]
+    units: Dict[UnitKey, Tuple[int, bytes, bytes, str]] = {}
+    result = db.execute(
+        select(*columns).where(table.c.complex_id == complex_id).execution_options(yield_per=IMPORT_CHUNK_SIZE)
+    )
+    for unit in result.mappings():
+        full, rest = _content_hashes(unit)
+        units[_unit_key(unit)] = (unit["id"], full, rest, unit["status"])
+    return units
+
+
+def _iter_chess_rows(file_path: str, complex_id: int) -> Iterator[Dict[str, Any]]:
+    """Unit rows of a chess sheet, ready for insertion."""
+    with _open_sheet(file_path) as rows:
+        headers = list(next(rows, ()))
+        header_map = _map_headers(headers, _CHESS_HEADER_FIELDS)
+
+        required = {"block_name", "status", "unit_number", "floor"}
+        if not required.issubset(header_map):
+            missing = required - header_map.keys()
+            raise ValueError(f"Отсутствуют обязательные колонки в шахматке: {', '.join(sorted(missing))}")
+
+        width = len(headers)
+        payload_columns = [(idx, str(header)) for idx, header in enumerate(headers) if header is not None]
+        block_idx = header_map["block_name"]
+        unit_idx = header_map["unit_number"]
+        floor_idx = header_map["floor"]
+        status_idx = header_map["status"]
+        type_idx = header_map.get("unit_type")
+        rooms_idx = header_map.get("rooms")
+        area_idx = header_map.get("area_sqm")
+
+        for row in rows:
+            row = _pad(row, width)
+            if all(cell is None for cell in row):
                 continue
-            new_entries.append(
-                ChessboardPriceEntry(
-                    complex_id=complex_obj.id,
-                    floor=floor_val,
-                    category_key=str(category),
-                    price_per_sqm=price_val,
-                    order_index=order_index,
-                )
-            )
 
-    if new_entries:
-        db.bulk_save_objects(new_entries)
+            normalized_unit_number = _normalize_unit_number(row[unit_idx])
+            floor_int = _coerce_int(row[floor_idx])
+
+            if not normalized_unit_number or floor_int is None:
+                continue
+
+            payload = {name: row[idx] for idx, name in payload_columns}
+
+            unit_type_value = None
+            if type_idx is not None:
+                raw_type = row[type_idx]
+                unit_type_value = str(raw_type).strip() if raw_type is not None else None
+
+            block_name = row[block_idx]
+            status_raw = row[status_idx]
+
+            yield {
+                "complex_id": complex_id,
+                "block_name": str(block_name).strip() if block_name is not None else "",
+                "unit_type": unit_type_value,
+                "status": str(status_raw).strip() if status_raw is not None else "",
+                "rooms": _coerce_int(row[rooms_idx]) if rooms_idx is not None else None,
+                "unit_number": normalized_unit_number,
+                "area_sqm": _coerce_float(row[area_idx]) if area_idx is not None else None,
+                "floor": floor_int,
+                "raw_payload": payload or None,
+            }
+
+
+def _describe_updates(db: Session, diff: ChessImportDiff, samples: List[Tuple[int, Dict[str, Any]]]) -> None:
+    if not samples:
+        return
+    table = ApartmentUnit.__table__
+    old_rows = {
+        unit["id"]: unit
+        for unit in db.execute(
+            select(table.c.id, *[table.c[field] for field in CHESS_CONTENT_FIELDS])
+            .where(table.c.id.in_([unit_id for unit_id, _ in samples]))
+        ).mappings()
+    }
+    for unit_id, row in samples:
+        old = old_rows.get(unit_id)
+        diff._sample("updated", {**_key_dict(_unit_key(row)), "fields": _changed_fields(old, row) if old else []})
+
+
+def sync_chess_from_excel(
+        db: Session,
+        complex_obj: ResidentialComplex,
+        file_path: str,
+        dry_run: bool = False,
+) -> ChessImportDiff:
+    """
+    Brings the units of a complex in line with its chess sheet. Rows are matched
+    on the natural key (block, floor, unit number) and compared by content hash:
+    changed units are updated in place, so their ids and the contracts linked to
+    them survive; new ones are inserted and missing ones deleted. The sheet is
+    read and compared before the first write, so the write transaction only
+    holds the changes. With ``dry_run`` nothing is written.
+    """
+    table = ApartmentUnit.__table__
+    existing = _existing_units(db, complex_obj.id)
+    # A complex without units gets every row inserted: stream them instead of holding the sheet
+    stream_inserts = not existing and not dry_run
+
+    diff = ChessImportDiff(complex_obj.id, dry_run)
+    seen: Set[UnitKey] = set()
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    update_samples: List[Tuple[int, Dict[str, Any]]] = []
+
+    for row in _iter_chess_rows(file_path, complex_obj.id):
+        key = _unit_key(row)
+        if key in seen:
+            raise ValueError(f"Помещение повторяется в шахматке: блок {key[0]}, этаж {key[1]}, номер {key[2]}")
+        seen.add(key)
+        diff.total += 1
+
+        current = existing.get(key)
+        if current is None:
+            diff.inserted += 1
+            diff.blocks.add(key[0])
+            diff._sample("inserted", _key_dict(key))
+            if not dry_run:
+                inserts.append(row)
+                if stream_inserts and len(inserts) >= IMPORT_CHUNK_SIZE:
+                    _insert_rows(db, table, inserts)
+                    inserts = []
+            continue
+
+        unit_id, current_full, current_rest, current_status = current
+        full, rest = _content_hashes(row)
+        if full == current_full:
+            diff.unchanged += 1
+            continue
+
+        diff.updated += 1
+        diff.blocks.add(key[0])
+        if rest != current_rest:
+            diff._status_only_updates = False
+        if row["status"] != current_status:
+            diff.status_changes.append((unit_id, key, current_status, row["status"]))
+        if len(update_samples) < DIFF_REPORT_LIMIT:
+            update_samples.append((unit_id, row))
+        if not dry_run:
+            updates.append({**row, "unit_id": unit_id})
+
+    deleted = [(unit_id, key) for key, (unit_id, *_) in existing.items() if key not in seen]
+    diff.deleted = len(deleted)
+    for unit_id, key in deleted:
+        diff.blocks.add(key[0])
+        diff._sample("deleted", _key_dict(key))
+    _describe_updates(db, diff, update_samples)
+
+    if dry_run:
+        return diff
+
+    deleted_ids = [unit_id for unit_id, _ in deleted]
+    for start in range(0, len(deleted_ids), _DELETE_CHUNK_SIZE):
+        db.execute(delete(table).where(table.c.id.in_(deleted_ids[start:start + _DELETE_CHUNK_SIZE])))
+    update_stmt = update(table).where(table.c.id == bindparam("unit_id")).values(**_timestamps(table, "updated_at"))
+    for start in range(0, len(updates), IMPORT_CHUNK_SIZE):
+        db.execute(update_stmt, updates[start:start + IMPORT_CHUNK_SIZE])
+    for start in range(0, len(inserts), IMPORT_CHUNK_SIZE):
+        _insert_rows(db, table, inserts[start:start + IMPORT_CHUNK_SIZE])
+
+    return diff
+
+
+def import_chess_from_excel(db: Session, complex_obj: ResidentialComplex, file_path: str) -> int:
+    """Syncs the units of a complex with its chess sheet; returns the number of units in the sheet."""
+    return sync_chess_from_excel(db, complex_obj, file_path).total
+
 
-    return len(new_entries)
+def import_price_from_excel(db: Session, complex_obj: ResidentialComplex, file_path: str) -> int:
+    with _open_sheet(file_path) as rows:
+        headers = list(next(rows, ()))
+        if not headers or len(headers) < 2:
+            raise ValueError("Некорректный формат price_shaxamtka.xlsx: отсутствуют заголовки")
+
+        category_headers = headers[1:]
+        parsed_categories = [str(header) for header in category_headers]
+
+        db.query(ChessboardPriceEntry).filter(ChessboardPriceEntry.complex_id == complex_obj.id).delete(synchronize_session=False)
+
+        table = ChessboardPriceEntry.__table__
+        imported = 0
+        chunk: List[Dict[str, Any]] = []
+        for row in rows:
+            floor_val = _coerce_int(row[0] if row else None)
+            if floor_val is None:
+                continue
+
+            for order_index, category in enumerate(parsed_categories):
+                price_val = _coerce_float(row[order_index + 1] if len(row) > order_index + 1 else None)
+                if price_val is None:
+                    continue
+                chunk.append({
+                    "complex_id": complex_obj.id,
+                    "floor": floor_val,
+                    "category_key": category,
+                    "price_per_sqm": price_val,
+                    "order_index": order_index,
+                })
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                imported += _insert_rows(db, table, chunk)
+                chunk = []
+
+        imported += _insert_rows(db, table, chunk)
+
+    return imported
+
+
+def _apartment_ids(db: Session, complex_id: int) -> Dict[Tuple[int, str, str], int]:
+    """(floor, unit number, normalized block) -> apartment id for a complex, loaded in one query."""
+    lookup: Dict[Tuple[int, str, str], int] = {}
+    units = db.execute(
+        select(ApartmentUnit.id, ApartmentUnit.block_name, ApartmentUnit.floor, ApartmentUnit.unit_number)
+        .where(ApartmentUnit.complex_id == complex_id)
+        .order_by(ApartmentUnit.id)
+    )
+    for unit_id, block_name, floor, unit_number in units:
+        lookup.setdefault((floor, unit_number, _normalize_block_name(block_name)), unit_id)
+    return lookup
 
 
 def _find_apartment_id(
-        db: Session,
-        complex_id: int,
+        lookup: Dict[Tuple[int, str, str], int],
         block_name: Any,
         floor: Optional[int],
         unit_number: Any,
@@ -275,99 +547,83 @@ def _find_apartment_id(
     normalized_number = _normalize_unit_number(unit_number)
     if not normalized_number:
         return None
-
-    candidates = (
-        db.query(ApartmentUnit)
-        .filter(
-            ApartmentUnit.complex_id == complex_id,
-            ApartmentUnit.floor == floor,
-            ApartmentUnit.unit_number == normalized_number,
-        )
-        .all()
-    )
-
-    target = next(
-        (
-            unit for unit in candidates
-            if _normalize_block_name(unit.block_name) == _normalize_block_name(block_name)
-        ),
-        None,
-    )
-    return target.id if target else None
+    return lookup.get((floor, normalized_number, _normalize_block_name(block_name)))
 
 
 def import_contract_registry_from_excel(db: Session, complex_obj: ResidentialComplex, file_path: str) -> int:
-    workbook = load_workbook(file_path, data_only=True)
-    sheet = workbook.active
-
-    headers = [str(cell.value).strip() if cell.value is not None else "" for cell in sheet[1]]
-    normalized_headers = [_normalize_header(header) for header in headers]
-
-    db.query(ContractRegistryEntry).filter(ContractRegistryEntry.complex_id == complex_obj.id).delete(synchronize_session=False)
-
-    new_entries: List[ContractRegistryEntry] = []
-    seen_numbers: set[str] = set()
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        if all(value is None for value in row):
-            continue
-
-        entry_data: Dict[str, Any] = {
-            "complex_id": complex_obj.id,
-            "extra_data": {},
-        }
-
-        for idx, header_key in enumerate(normalized_headers):
-            value = row[idx] if idx < len(row) else None
-            original_header = headers[idx] if idx < len(headers) else ""
-
-            attr = CONTRACT_HEADER_MAP.get(header_key)
-            if not attr:
-                if original_header:
-                    entry_data["extra_data"][original_header] = value
+    with _open_sheet(file_path) as rows:
+        headers = [str(value).strip() if value is not None else "" for value in next(rows, ())]
+        normalized_headers = [_normalize_header(header) for header in headers]
+
+        db.query(ContractRegistryEntry).filter(ContractRegistryEntry.complex_id == complex_obj.id).delete(synchronize_session=False)
+
+        apartment_ids = _apartment_ids(db, complex_obj.id)
+        table = ContractRegistryEntry.__table__
+        imported = 0
+        chunk: List[Dict[str, Any]] = []
+        seen_numbers: set[str] = set()
+        for row in rows:
+            if all(value is None for value in row):
                 continue
 
-            if attr == "contract_date":
-                parsed_date = _parse_date_value(value)
-                entry_data[attr] = parsed_date or datetime.utcnow().date()
-            elif attr in {"floor", "rooms"}:
-                entry_data[attr] = _coerce_int(value)
-            elif attr in {"total_price", "price_per_sqm", "down_payment_percent", "down_payment_amount", "area_sqm"}:
-                entry_data[attr] = _coerce_float(value)
-            elif attr == "apartment_number":
-                entry_data[attr] = _normalize_unit_number(value)
-            else:
-                entry_data[attr] = str(value).strip() if value is not None else None
-
-        if not entry_data.get("contract_number"):
-            continue
+            entry_data: Dict[str, Any] = {
+                "complex_id": complex_obj.id,
+                "extra_data": {},
+            }
+
+            for idx, header_key in enumerate(normalized_headers):
+                value = row[idx] if idx < len(row) else None
+                original_header = headers[idx] if idx < len(headers) else ""
+
+                attr = CONTRACT_HEADER_MAP.get(header_key)
+                if not attr:
+                    if original_header:
+                        entry_data["extra_data"][original_header] = value
+                    continue
+
+                if attr == "contract_date":
+                    parsed_date = _parse_date_value(value)
+                    entry_data[attr] = parsed_date or datetime.utcnow().date()
+                elif attr in {"floor", "rooms"}:
+                    entry_data[attr] = _coerce_int(value)
+                elif attr in {"total_price", "price_per_sqm", "down_payment_percent", "down_payment_amount", "area_sqm"}:
+                    entry_data[attr] = _coerce_float(value)
+                elif attr == "apartment_number":
+                    entry_data[attr] = _normalize_unit_number(value)
+                else:
+                    entry_data[attr] = str(value).strip() if value is not None else None
+
+            if not entry_data.get("contract_number"):
+                continue
 
-        if not entry_data.get("buyer_full_name"):
-            entry_data["buyer_full_name"] = ""
+            if not entry_data.get("buyer_full_name"):
+                entry_data["buyer_full_name"] = ""
 
-        if not entry_data.get("contract_date"):
-            entry_data["contract_date"] = datetime.utcnow().date()
+            if not entry_data.get("contract_date"):
+                entry_data["contract_date"] = datetime.utcnow().date()
 
-        contract_number = entry_data["contract_number"]
-        if contract_number in seen_numbers:
-            continue
-        seen_numbers.add(contract_number)
-
-        if "floor" in entry_data:
-            apartment_id = _find_apartment_id(
-                db,
-                complex_obj.id,
-                entry_data.get("block_name"),
-                entry_data.get("floor"),
-                entry_data.get("apartment_number"),
-            )
-            entry_data["apartment_id"] = apartment_id
+            contract_number = entry_data["contract_number"]
+            if contract_number in seen_numbers:
+                continue
+            seen_numbers.add(contract_number)
+
+            if "floor" in entry_data:
+                apartment_id = _find_apartment_id(
+                    apartment_ids,
+                    entry_data.get("block_name"),
+                    entry_data.get("floor"),
+                    entry_data.get("apartment_number"),
+                )
+                entry_data["apartment_id"] = apartment_id
 
-        if not entry_data["extra_data"]:
-            entry_data["extra_data"] = None
+            if not entry_data["extra_data"]:
+                entry_data["extra_data"] = None
 
-        new_entries.append(ContractRegistryEntry(**entry_data))
+            chunk.append(entry_data)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                imported += _insert_rows(db, table, chunk)
+                chunk = []
 
-    if new_entries:
-        db.bulk_save_objects(new_entries)
+        imported += _insert_rows(db, table, chunk)
 
-    return len(new_entries)
+    return imported
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # type: ignore
+
+from backend.core.cache_stats import cache_stats
+from backend.core.plan_cache import PLAN_CACHE_ROOT
+
+FLOOR_PLAN_CACHE_ROOT = PLAN_CACHE_ROOT.parent / "floor_plan_cache"
+PAGE_INDEX_PATH = FLOOR_PLAN_CACHE_ROOT / "page_index.json"
+
+# Rendered pages kept on disk; the least recently sent ones are removed first.
+MAX_RENDER_CACHE_BYTES = 256 * 1024 * 1024
+MAX_RENDER_CACHE_FILES = 2000
+
+# Complexes whose floor plan PDF has no floor captions: page of the first floor,
+# the following floors come one page after another.
+PDF_PAGE_OVERRIDES: Dict[str, int] = {
+    "ЖК_Рассвет": 1,
+}
+
+# "Этаж 12" / "FLOOR 3" once whitespace is removed and the text is lowercased
+_FLOOR_CAPTION = re.compile(r"(?:этаж|floor)(\d+)")
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan_floor_captions(pdf_path: Path) -> List[List[str]]:
+    """Digits following every 'этаж'/'floor' caption, per page."""
+    pages: List[List[str]] = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            normalized = re.sub(r"\s+", "", (page.get_text() or "").lower())
+            pages.append(_FLOOR_CAPTION.findall(normalized))
+    return pages
+
+
+class PdfPageIndex:
+    """
+    Floor → page index of floor plan PDFs, persisted as JSON.
+
+    Each PDF is scanned once: its floor captions are stored together with the
+    file's mtime, size and SHA-256. A changed mtime or size re-hashes the file
+    and only a changed hash triggers a new scan, so a copied or touched PDF
+    keeps its index across restarts.
+    """
+
+    def __init__(self, path: Path = PAGE_INDEX_PATH) -> None:
+        self._lock = threading.Lock()
+        self._path = path
+        self._entries: Optional[Dict[str, Dict[str, object]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, object]]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self._path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._entries, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self._path)
+
+    def entry(self, pdf_path: Path) -> Dict[str, object]:
+        """``{"mtime", "size", "sha256", "pages": [[floor digits, ...], ...]}`` of a PDF."""
+        stat = pdf_path.stat()
+        key = str(pdf_path)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                cache_stats.hit("floor-plan-index")
+                return entry
+
+            cache_stats.miss("floor-plan-index")
+            digest = _file_hash(pdf_path)
+            if entry is None or entry["sha256"] != digest:
+                entry = {"sha256": digest, "pages": _scan_floor_captions(pdf_path)}
+            entry = {**entry, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+            entries[key] = entry
+            self._save()
+            return entry
+
+    def path_for_hash(self, pdf_hash: str) -> Optional[Path]:
+        """Indexed PDF whose content has this hash (or hash prefix), if it still exists."""
+        with self._lock:
+            candidates = [key for key, entry in self._load().items() if str(entry.get("sha256", "")).startswith(pdf_hash)]
+        for key in candidates:
+            path = Path(key)
+            if path.is_file():
+                return path
+        return None
+
+    def page_for_floor(
+            self,
+            jk_name: str,
+            pdf_path: Path,
+            floor_number: Optional[int],
+    ) -> Tuple[Optional[int], int, str]:
+        """
+        (page index, page count, PDF hash). The page index is None when the floor
+        is unknown or no page is captioned with it.
+        """
+        entry = self.entry(pdf_path)
+        pages: List[List[str]] = entry["pages"]  # type: ignore[assignment]
+        page_count = len(pages)
+        pdf_hash: str = entry["sha256"]  # type: ignore[assignment]
+        if floor_number is None:
+            return None, page_count, pdf_hash
+
+        override = PDF_PAGE_OVERRIDES.get(jk_name)
+        if override is not None:
+            return max(0, min(override + max(0, floor_number - 1), page_count - 1)), page_count, pdf_hash
+
+        # A caption matches when it starts with the floor number, as a substring search would
+        tokens = (str(floor_number), f"{floor_number:02d}")
+        for index, captions in enumerate(pages):
+            if any(caption.startswith(token) for caption in captions for token in tokens):
+                return index, page_count, pdf_hash
+        return None, page_count, pdf_hash
+
+
+class PageRenderCache:
+    """
+    PNG renders of PDF pages on disk, named by the PDF hash and page number.
+
+    A changed PDF gets a new hash and therefore new files; the old ones age out.
+    Every hit refreshes the file's mtime, and writes evict the least recently
+    used files once the cache exceeds its size or file count limit.
+    """
+
+    def __init__(
+            self,
+            root: Path = FLOOR_PLAN_CACHE_ROOT,
+            max_bytes: int = MAX_RENDER_CACHE_BYTES,
+            max_files: int = MAX_RENDER_CACHE_FILES,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._root = root
+        self._max_bytes = max_bytes
+        self._max_files = max_files
+
+    def path_for(self, pdf_hash: str, page_index: int) -> Path:
+        return self._root / f"{pdf_hash[:24]}_p{page_index}.png"
+
+    def get(self, pdf_path: Path, pdf_hash: str, page_index: int) -> Path:
+        target = self.path_for(pdf_hash, page_index)
+        try:
+            os.utime(target)
+            cache_stats.hit("floor-plan-render")
+            return target
+        except FileNotFoundError:
+            pass
+
+        cache_stats.miss("floor-plan-render")
+        self._root.mkdir(parents=True, exist_ok=True)
+        with fitz.open(pdf_path) as doc:
+            page = doc.load_page(max(0, min(page_index, doc.page_count - 1)))
+            pixmap = page.get_pixmap()
+            tmp_path = target.with_name(f"{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            pixmap.save(str(tmp_path), output="png")
+        os.replace(tmp_path, target)
+        self._evict(keep=target)
+        return target
+
+    def _evict(self, keep: Path) -> int:
+        with self._lock:
+            files = []
+            with os.scandir(self._root) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            if total <= self._max_bytes and len(files) <= self._max_files:
+                return 0
+
+            removed = 0
+            count = len(files)
+            for _, size, path in sorted(files):
+                if total <= self._max_bytes and count <= self._max_files:
+                    break
+                if path == str(keep):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                count -= 1
+                removed += 1
+            if removed:
+                cache_stats.evicted("floor-plan-render", None, removed)
+            return removed
+
+
+floor_page_index = PdfPageIndex()
+page_renders = PageRenderCache()
+
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:  # fcntl is POSIX only: elsewhere concurrent saves may lose each other's counts
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+# Keys remembered per (endpoint, complex); the least requested half goes when it overflows.
+MAX_KEYS_PER_COMPLEX = 5000
+
+# Counts are multiplied by this once per DECAY_INTERVAL_SECONDS, so the ranking follows recent traffic.
+DECAY = 0.5
+DECAY_INTERVAL_SECONDS = 900
+
+_Params = Tuple[str, ...]
+_Counts = Dict[Tuple[str, str], Dict[_Params, float]]
+
+
+class HotKeys:
+    """
+    Request counts of parameterized endpoint keys (e.g. apartment-info
+    parameters), so a warmup can prepare the most requested ones.
+
+    Counting is a dict update under a lock. ``save`` merges the counts made
+    since the previous save into a JSON file shared by the workers of a host
+    and reloads the merged ranking; the file survives restarts, so the first
+    warmup after a deploy already knows what is hot. The read-merge-write runs
+    under an exclusive file lock, and the file records when the counts were
+    last decayed, so the decay applies once per period however many workers
+    save.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_keys: int = MAX_KEYS_PER_COMPLEX) -> None:
+        self._lock = threading.Lock()
+        self._path = Path(path) if path else None
+        self._max_keys = max_keys
+        self._counts: _Counts = {}
+        self._decayed_at = time.time()
+        self._pending: Dict[Tuple[str, str], Dict[_Params, int]] = {}
+        self._loaded = False
+
+    def configure(self, path: Optional[str]) -> None:
+        with self._lock:
+            self._path = Path(path) if path else None
+            self._loaded = False
+
+    def record(self, endpoint: str, jk_name: str, params: _Params) -> None:
+        key = (endpoint, jk_name)
+        with self._lock:
+            pending = self._pending.setdefault(key, {})
+            pending[params] = pending.get(params, 0) + 1
+            if len(pending) > self._max_keys:
+                self._pending[key] = _trim(pending, self._max_keys)
+
+    def top(self, endpoint: str, jk_name: str, limit: int) -> List[_Params]:
+        """Most requested parameter tuples, most requested first."""
+        key = (endpoint, jk_name)
+        with self._lock:
+            self._ensure_loaded()
+            merged: Dict[_Params, float] = dict(self._counts.get(key, {}))
+            for params, count in self._pending.get(key, {}).items():
+                merged[params] = merged.get(params, 0.0) + count
+        return [params for params, _ in sorted(merged.items(), key=lambda item: -item[1])[:limit]]
+
+    def _ensure_loaded(self) -> None:
+        # Called with self._lock held
+        if self._loaded:
+            return
+        self._loaded = True
+        self._counts, _ = _read(self._path)
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock of the shared file, held by one worker's save at a time."""
+        if self._path is None or fcntl is None:
+            yield
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path.with_name(f"{self._path.name}.lock"), "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """Merges the counts since the last save into the shared file; decays the ranking when its period is over."""
+        with self._lock, self._file_lock():
+            pending, self._pending = self._pending, {}
+            if self._path is not None:
+                counts, decayed_at = _read(self._path)
+            else:
+                counts, decayed_at = self._counts, self._decayed_at
+            now = time.time()
+            # A missing file starts its period now instead of decaying right away
+            if decayed_at is None:
+                decayed_at = now
+            elif now - decayed_at >= DECAY_INTERVAL_SECONDS:
+                decayed_at = now
+                for key, keys in list(counts.items()):
+                    decayed = {params: count * DECAY for params, count in keys.items() if count * DECAY >= 0.01}
+                    if decayed:
+                        counts[key] = decayed
+                    else:
+                        del counts[key]
+            for key, keys in pending.items():
+                target = counts.setdefault(key, {})
+                for params, count in keys.items():
+                    target[params] = target.get(params, 0.0) + count
+                if len(target) > self._max_keys:
+                    counts[key] = _trim(target, self._max_keys)
+            self._counts, self._decayed_at = counts, decayed_at
+            self._loaded = True
+            if self._path is None:
+                return
+            payload = {
+                "decayedAt": decayed_at,
+                "keys": [
+                    {"endpoint": endpoint, "jk": jk_name, "keys": [[list(params), count] for params, count in keys.items()]}
+                    for (endpoint, jk_name), keys in counts.items()
+                ],
+            }
+            tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+
+
+def _trim(counts: Dict[_Params, float], max_keys: int) -> Dict[_Params, float]:
+    ranked = sorted(counts.items(), key=lambda item: -item[1])
+    return dict(ranked[:max_keys // 2])
+
+
+def _read(path: Optional[Path]) -> Tuple[_Counts, Optional[float]]:
+    """Counts stored in the shared file and the time of their last decay (None without a file)."""
+    if path is None:
+        return {}, None
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}, None
+    if not isinstance(raw, dict):
+        return {}, None
+    counts: _Counts = {}
+    for item in raw.get("keys") or ():
+        try:
+            counts[(item["endpoint"], item["jk"])] = {
+                tuple(str(value) for value in params): float(count) for params, count in item["keys"]
+            }
+        except (KeyError, TypeError, ValueError):
+            continue
+    try:
+        decayed_at = float(raw["decayedAt"])
+    except (KeyError, TypeError, ValueError):
+        decayed_at = None
+    return counts, decayed_at
+
+
+hot_keys = HotKeys()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from backend.core.compression import BROTLI, GZIP
+
+# Suffixes that tell compressed representations of one body apart: "<digest>-gzip"
+_ENCODING_SUFFIXES = tuple(f"-{encoding}" for encoding in (GZIP, BROTLI))
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from everything a response depends on: endpoint, parameters, data versions."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    ETag of ``etag``'s body sent with content-coding ``encoding``: gzip, Brotli
+    and identity bytes differ, so they must not share one strong tag.
+    """
+    if encoding is None or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def add_vary(headers: MutableHeaders, field: str) -> None:
+    """``add_vary_header`` that keeps fields already listed (by the endpoint or another middleware) once."""
+    listed = {value.strip().lower() for value in headers.get("vary", "").split(",")}
+    if field.lower() not in listed:
+        headers.add_vary_header(field)
+
+
+def _base_etag(tag: str) -> str:
+    """Tag without the weak prefix and the content-coding suffix."""
+    tag = tag.strip().removeprefix("W/")
+    for suffix in _ENCODING_SUFFIXES:
+        if tag.endswith(f'{suffix}"'):
+            return f'{tag[:-len(suffix) - 1]}"'
+    return tag
+
+
+def _matching_tag(request: Request, etag: str) -> Optional[str]:
+    """Tag of If-None-Match naming any representation of ``etag``, as the client sent it."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    for tag in header.split(","):
+        if _base_etag(tag) == etag:
+            return tag.strip()
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    If-None-Match check; uses weak comparison as RFC 9110 requires for GET and
+    accepts the tag of any content-coding of the body.
+    """
+    return _matching_tag(request, etag) is not None
+
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Stamps ``etag`` on the outgoing response. Returns a bodiless 304 when the
+    client already holds this version, so the caller can skip building the body.
+    """
+    response.headers["ETag"] = etag
+    matched = _matching_tag(request, etag)
+    if matched is not None:
+        headers = {
+            key: value for key, value in response.headers.items()
+            if key not in ("content-length", "content-type")
+        }
+        # The client keeps the tag of the representation it holds (gzip, Brotli or identity)
+        headers["etag"] = matched if matched.endswith('"') else etag
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
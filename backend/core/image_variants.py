@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+try:  # Pillow is optional: without it the original images are served
+    from PIL import Image, features
+except ImportError:  # pragma: no cover - depends on the environment
+    Image = None
+    features = None
+
+from backend.core.cache_stats import cache_stats
+from backend.core.plan_cache import PLAN_CACHE_ROOT
+
+VARIANT_ROOT = PLAN_CACHE_ROOT.parent / "image_variants"
+
+# Requested widths are rounded up to one of these, so a handful of files serve every screen.
+VARIANT_WIDTHS: Tuple[int, ...] = (320, 640, 1280)
+
+AVIF = "avif"
+WEBP = "webp"
+PNG = "png"
+JPEG = "jpeg"
+
+MEDIA_TYPES: Dict[str, str] = {
+    AVIF: "image/avif",
+    WEBP: "image/webp",
+    PNG: "image/png",
+    JPEG: "image/jpeg",
+}
+
+# Images that get variants; SVG renders are served as they are.
+SOURCE_SUFFIXES = frozenset({".png", ".jpg", ".jpeg"})
+
+_SAVE_OPTIONS: Dict[str, Dict[str, object]] = {
+    AVIF: {"quality": 55},
+    WEBP: {"quality": 80, "method": 4},
+    PNG: {"optimize": True},
+    JPEG: {"quality": 85, "optimize": True, "progressive": True},
+}
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def avif_supported() -> bool:
+    return Image is not None and bool(features.check("avif"))
+
+
+def variant_width(requested: Optional[int]) -> Optional[int]:
+    """Smallest width bucket that is at least ``requested`` (the largest bucket for bigger requests)."""
+    if requested is None or requested <= 0:
+        return None
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def source_format(source: Path) -> str:
+    return JPEG if source.suffix.lower() in (".jpg", ".jpeg") else PNG
+
+
+def negotiate_format(accept: Optional[str], source: Path, allow_avif: bool = True) -> str:
+    """Best format the client accepts: AVIF, then WebP, otherwise the source's own format."""
+    accept = (accept or "").lower()
+    if allow_avif and "image/avif" in accept and avif_supported():
+        return AVIF
+    if "image/webp" in accept and available():
+        return WEBP
+    return source_format(source)
+
+
+class ImageVariantStore:
+    """
+    Resized and re-encoded copies of images, addressed by content.
+
+    A variant is named by the SHA-256 of the source bytes, the width bucket and
+    the format, so identical sources share their variants and an edited source
+    gets new names (old variants are left for a cleanup, never served). Source
+    hashes are remembered per path together with mtime and size. Images
+    narrower than the bucket are only re-encoded, never enlarged.
+    """
+
+    def __init__(self, root: Path = VARIANT_ROOT) -> None:
+        self._lock = threading.Lock()
+        self._root = root
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def digest(self, source: Path) -> str:
+        stat = source.stat()
+        key = str(source)
+        known = self._digests.get(key)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(source, "rb") as handle:
+            for chunk in iter(lambda: handle.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._digests[key] = (stat.st_mtime_ns, stat.st_size, value)
+        return value
+
+    def path_for(self, digest: str, width: int, fmt: str) -> Path:
+        return self._root / digest[:2] / f"{digest[:32]}_w{width}.{fmt}"
+
+    def get(self, source: Path, width: int, fmt: str) -> Path:
+        """Path of the variant, generated on first use. Raises RuntimeError without Pillow."""
+        if Image is None:
+            raise RuntimeError("Image variants require the 'Pillow' package (pip install Pillow)")
+
+        target = self.path_for(self.digest(source), width, fmt)
+        if target.exists():
+            cache_stats.hit("image-variant")
+            return target
+
+        cache_stats.miss("image-variant")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with Image.open(source) as image:
+            image.load()
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            if fmt == JPEG:
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA")
+            tmp_path = target.with_name(f"{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            image.save(tmp_path, format=fmt.upper(), **_SAVE_OPTIONS[fmt])
+        os.replace(tmp_path, target)
+        return target
+
+    def pregenerate(
+            self,
+            sources: Iterable[Path],
+            widths: Sequence[int] = VARIANT_WIDTHS,
+            formats: Sequence[str] = (WEBP,),
+    ) -> Dict[str, int]:
+        """Generates every (width, format) variant of ``sources``; returns counts."""
+        counts = {"sources": 0, "variants": 0, "failed": 0}
+        for source in sources:
+            counts["sources"] += 1
+            for width in widths:
+                for fmt in formats:
+                    try:
+                        self.get(source, width, fmt)
+                        counts["variants"] += 1
+                    except Exception as exc:  # noqa: BLE001 - one broken image must not stop the run
+                        print(f"[image-variants] Failed {source} ({width}px, {fmt}): {exc}")
+                        counts["failed"] += 1
+        return counts
+
+
+image_variants = ImageVariantStore()
@@ -1,6 +1,11 @@
 import time
+from typing import Optional
 from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from backend.core.compression import MIN_COMPRESS_SIZE, compress, is_compressible, negotiate_encoding
+from backend.core.http_cache import add_vary, encoded_etag
 from backend.core.logging_config import request_logger
 from backend.core.rate_limiter import RateLimitMiddleware
 import logging
@@ -123,12 +128,22 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
             "/api/complexes/apartment-info",
             "/api/complexes/jk/",
             "/api/complexes/aggregate",
+            "/api/complexes/nocache/",
+            "/api/complexes/cache-stats",
+            "/api/complexes/plan-prewarm",
+            "/api/complexes/warmup",
+            "/api/complexes/search",
         ]
 
         is_critical = any(request.url.path.startswith(path) for path in critical_paths)
 
+        # Ответы с адресом по хэшу содержимого (тайлы планов) кешируются навсегда
+        is_immutable = "immutable" in response.headers.get("Cache-Control", "")
+
         if request.url.path.startswith("/api/"):
-            if is_critical:
+            if is_immutable:
+                pass
+            elif is_critical:
                 # Для критичных данных: браузер может кешировать, но ДОЛЖЕН проверять
                 # актуальность на сервере при КАЖДОМ запросе
                 response.headers["Cache-Control"] = "no-cache, must-revalidate"
@@ -136,6 +151,75 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
                 # Для остальных API: кешируем на 5 минут
                 response.headers["Cache-Control"] = "public, max-age=300, must-revalidate"
 
-            response.headers["Vary"] = "Accept-Encoding"
+            # add, not replace: /plan-image also varies by Accept (WebP/AVIF)
+            add_vary(response.headers, "Accept-Encoding")
 
         return response
+
+
+class CompressionMiddleware:
+    """
+    gzip/Brotli сжатие ответов API по Accept-Encoding.
+
+    Сжимаются только ответы, целиком отправленные одним сообщением: потоковые
+    ответы (SSE, файлы) проходят без изменений. Ответы, уже сжатые эндпоинтом
+    (готовые варианты из payload_cache), тоже не трогаем. ETag сжатого ответа
+    получает суффикс кодировки ("<hash>-gzip"). Подключать первым,
+    чтобы стоять ближе всех к приложению — BaseHTTPMiddleware отдаёт тело
+    дальше уже по частям.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_COMPRESS_SIZE, path_prefix: str = "/api/") -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = "content-encoding" in headers or not is_compressible(headers.get("content-type"))
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            initial, start_message = start_message, None
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(initial)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers = MutableHeaders(raw=initial["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], encoding)
+            add_vary(headers, "Accept-Encoding")
+            await send(initial)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+from backend.core.cache_stats import cache_stats
+from backend.core.compression import BEST, MIN_COMPRESS_SIZE, compress, negotiate_encoding
+from backend.core.http_cache import add_vary, encoded_etag
+
+JSON_MEDIA_TYPE = "application/json"
+
+# Wire formats of the complex payloads: row lists (default) or parallel column arrays.
+ROWS = "rows"
+COLUMNAR = "columnar"
+PAYLOAD_FORMATS: Tuple[str, ...] = (ROWS, COLUMNAR)
+
+# Bodies kept in memory; a few per complex (jk, blocks, aggregate × formats).
+MAX_CACHED_PAYLOADS = 128
+# apartment-info bodies are small and many: one per requested apartment.
+MAX_APARTMENT_INFO_PAYLOADS = 20000
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(payload: Any) -> bytes:
+    """Serializes a payload to compact UTF-8 JSON; NaN/inf become null."""
+    return orjson.dumps(payload, default=_default, option=_ORJSON_OPTIONS)
+
+
+def columnar(rows: Sequence[Sequence[Any]], columns: Sequence[str]) -> Dict[str, List[Any]]:
+    """Transposes row lists into one array per named column; short rows are padded with null."""
+    return {
+        name: [row[index] if index < len(row) else None for row in rows]
+        for index, name in enumerate(columns)
+    }
+
+
+def records_columnar(records: Sequence[Dict[str, Any]], fields: Sequence[str]) -> Dict[str, List[Any]]:
+    """Same as ``columnar`` for a list of dicts."""
+    return {name: [record.get(name) for record in records] for name in fields}
+
+
+class CachedPayload:
+    """Serialized body plus its compressed variants, each built on first use."""
+
+    __slots__ = ("body", "_encoded")
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+        """Body in ``encoding``; small bodies always go out uncompressed."""
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return None, self.body
+        variant = self._encoded.get(encoding)
+        if variant is None:
+            variant = self._encoded[encoding] = compress(self.body, encoding, BEST)
+        return encoding, variant
+
+
+def json_bytes_response(request: Request, response: Optional[Response], payload: CachedPayload) -> Response:
+    """
+    Sends pre-serialized JSON in the best encoding the client accepts. Headers
+    already set on the endpoint's injected ``response`` (ETag, Cache-Control,
+    Vary) are carried over, since FastAPI ignores them once a Response is
+    returned; a compressed body gets the ETag of its encoding.
+    """
+    encoding, body = payload.encoded(negotiate_encoding(request.headers.get("accept-encoding")))
+    result = Response(content=body, media_type=JSON_MEDIA_TYPE)
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                result.headers.append(key, value)
+    if encoding is not None:
+        result.headers["Content-Encoding"] = encoding
+        if "etag" in result.headers:
+            result.headers["ETag"] = encoded_etag(result.headers["etag"], encoding)
+    add_vary(result.headers, "Accept-Encoding")
+    return result
+
+
+class PayloadCache:
+    """
+    LRU of ready-to-send JSON bodies and their gzip/Brotli variants.
+
+    Keys are ``(endpoint, complex name or None, *variant)``; None marks bodies
+    that combine all complexes (aggregate). Every entry is stored together with
+    the version it was built from (usually the response ETag), so a lookup with
+    another version is a miss. ``invalidate`` takes one complex's entries and
+    the cross-complex ones out of the cache early; their bodies stay reachable
+    through ``get_stale`` until rebuilt, for stale-while-revalidate.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_PAYLOADS) -> None:
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, CachedPayload]]" = OrderedDict()
+        # Invalidated entries, kept only as stale fallbacks
+        self._stale: "OrderedDict[Hashable, Tuple[Hashable, CachedPayload]]" = OrderedDict()
+
+    def get(self, key: Tuple[Any, ...], version: Hashable) -> Optional[CachedPayload]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+            else:
+                cached = None
+        if cached is None:
+            cache_stats.miss(f"payload:{key[0]}", key[1])
+            return None
+        cache_stats.hit(f"payload:{key[0]}", key[1])
+        return cached[1]
+
+    def contains(self, key: Tuple[Any, ...], version: Hashable) -> bool:
+        """Whether ``key`` is cached in ``version``; unlike ``get`` not counted as a lookup."""
+        with self._lock:
+            cached = self._entries.get(key)
+        return cached is not None and cached[0] == version
+
+    def get_stale(self, key: Tuple[Any, ...]) -> Optional[Tuple[Hashable, CachedPayload]]:
+        """Last body stored under ``key`` whatever its version, with that version; None if there is none."""
+        with self._lock:
+            return self._entries.get(key) or self._stale.get(key)
+
+    def put(self, key: Tuple[Any, ...], version: Hashable, body: bytes) -> CachedPayload:
+        payload = CachedPayload(body)
+        with self._lock:
+            self._stale.pop(key, None)
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def invalidate(self, jk_name: str) -> int:
+        """Drops the entries of one complex and the cross-complex ones; returns how many."""
+        with self._lock:
+            stale = [key for key in self._entries if key[1] is None or key[1] == jk_name]
+            for key in stale:
+                self._stale[key] = self._entries.pop(key)
+            while len(self._stale) > self._max_entries:
+                self._stale.popitem(last=False)
+        for key in stale:
+            cache_stats.evicted(f"payload:{key[0]}", key[1])
+        return len(stale)
+
+    def discard(self, key: Tuple[Any, ...]) -> None:
+        """Forgets ``key`` entirely, including its stale body."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stale.pop(key, None)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stale.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+payload_cache = PayloadCache()
+apartment_info_payloads = PayloadCache(MAX_APARTMENT_INFO_PAYLOADS)
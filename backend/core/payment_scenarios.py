@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import threading
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from backend.core.cache_stats import cache_stats
+from backend.core.chess_snapshot import ChessSnapshot, chess_snapshots
+from backend.core.data_versions import CHESS, PRICES, SETTINGS, data_versions
+from backend.core.price_grid import PAYMENT_SHARES, price_grids
+from backend.database import SessionLocal
+from backend.database.models import ResidentialComplex
+
+# Installment plans: share paid upfront, the rest in equal monthly payments.
+INSTALLMENT_SHARES: Tuple[int, ...] = (70, 50, 30)
+DEFAULT_INSTALLMENT_MONTHS = 36
+
+# Hybrid plan: 30% upfront, 40% over 18 months, the last 30% in month 19. Priced like the 30% plan.
+HYBRID_DOWN_SHARE = 30
+HYBRID_FINAL_SHARE = 30
+HYBRID_MONTHS = 18
+
+# Mortgage after delivery: 20% down, the monthly payment quoted "from" 1% of the loan.
+MORTGAGE_DOWN_SHARE = 20
+MORTGAGE_MONTHLY_FACTOR = 0.01
+MORTGAGE_ANNUAL_RATE = 18
+MORTGAGE_MAX_YEARS = 20
+
+# Example apartment area (m²) of the landing complexes, as advertised on the landing.
+SAMPLE_AREAS: Dict[str, float] = {
+    "ЖК_Бахор": 55.67,
+    "ЖК_Рассвет": 65.38,
+}
+
+# Example apartment area when a complex has no units with an area.
+DEFAULT_SAMPLE_AREA = 65.38
+
+_RESIDENTIAL = "жилой"
+
+
+def sample_area(jk_name: str, snapshot: ChessSnapshot) -> float:
+    """
+    Area of the example apartment: the configured one (``SAMPLE_AREAS``), else
+    the smallest residential area, so amounts quoted "from" stay true minimums.
+    """
+    if jk_name in SAMPLE_AREAS:
+        return SAMPLE_AREAS[jk_name]
+    residential = np.array(
+        [str(unit_type or "").strip().lower() == _RESIDENTIAL for unit_type in snapshot.unit_types], dtype=bool,
+    )
+    areas = snapshot.areas[~np.isnan(snapshot.areas)]
+    if residential.any():
+        selected = snapshot.areas[residential[snapshot.type_codes] & ~np.isnan(snapshot.areas)]
+        if selected.size:
+            areas = selected
+    areas = areas[areas > 0]
+    if not areas.size:
+        return DEFAULT_SAMPLE_AREA
+    return float(areas.min())
+
+
+class InstallmentSettings:
+    __slots__ = ("months", "start_date", "hybrid_enabled")
+
+    def __init__(self, months: Optional[int], start_date: Optional[date], hybrid_enabled: Optional[bool]) -> None:
+        # Without a start date the complex has no installment plan configured: the standard term applies
+        self.months = (months if start_date is not None else None) or DEFAULT_INSTALLMENT_MONTHS
+        self.start_date = start_date
+        self.hybrid_enabled = bool(hybrid_enabled)
+
+
+class PaymentScenarios:
+    """
+    Every payment plan of one complex on every floor of its price grid, for the
+    example apartment (``area`` m²): total, down payment, monthly payment and
+    term. Computed once per price/settings/chess version; floors missing any
+    price are left out, as the landing cannot show an incomplete set of plans.
+    """
+
+    def __init__(
+            self,
+            jk_name: str,
+            key: Tuple[int, int, int],
+            settings: InstallmentSettings,
+            area: float,
+            floors: np.ndarray,
+            per_m2: np.ndarray,
+    ) -> None:
+        self.jk_name = jk_name
+        self.key = key
+        self.settings = settings
+        self.area = area
+
+        totals = per_m2 * area
+        complete = ~np.isnan(per_m2).any(axis=1)
+        self._floors: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        for row in np.flatnonzero(complete):
+            self._floors[int(floors[row])] = self._plans(per_m2[row], totals[row])
+
+    def _plans(self, per_m2: np.ndarray, totals: np.ndarray) -> Dict[str, Dict[str, Any]]:
+        months = self.settings.months
+        by_share = {share: (float(per_m2[column]), float(totals[column])) for column, share in enumerate(PAYMENT_SHARES)}
+        plans: Dict[str, Dict[str, Any]] = {}
+        price, total = by_share[100]
+        plans["full"] = {
+            "share": 100, "pricePerM2": price, "total": total,
+            "downPayment": total, "monthlyPayment": 0.0, "months": 0,
+        }
+        for share in INSTALLMENT_SHARES:
+            price, total = by_share[share]
+            down = total * (share / 100)
+            plans[f"installment_{share}"] = {
+                "share": share, "pricePerM2": price, "total": total,
+                "downPayment": down, "monthlyPayment": (total - down) / months, "months": months,
+            }
+
+        price, total = by_share[HYBRID_DOWN_SHARE]
+        down = total * (HYBRID_DOWN_SHARE / 100)
+        final = total * (HYBRID_FINAL_SHARE / 100)
+        plans["hybrid"] = {
+            "share": HYBRID_DOWN_SHARE, "pricePerM2": price, "total": total,
+            "downPayment": down, "monthlyPayment": (total - down - final) / HYBRID_MONTHS, "months": HYBRID_MONTHS,
+            "finalPayment": final, "enabled": self.settings.hybrid_enabled,
+        }
+
+        down = total * (MORTGAGE_DOWN_SHARE / 100)
+        loan = total - down
+        plans["mortgage"] = {
+            "share": MORTGAGE_DOWN_SHARE, "pricePerM2": price, "total": total,
+            "downPayment": down, "monthlyPayment": loan * MORTGAGE_MONTHLY_FACTOR, "months": MORTGAGE_MAX_YEARS * 12,
+            "loanAmount": loan, "annualRate": MORTGAGE_ANNUAL_RATE,
+        }
+        return plans
+
+    @property
+    def floors(self) -> Tuple[int, ...]:
+        return tuple(sorted(self._floors))
+
+    def floor(self, floor: int) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Plans on ``floor`` with unrounded amounts; None when the floor has no complete prices."""
+        return self._floors.get(floor)
+
+    def to_dict(self, floor: Optional[int] = None) -> Dict[str, Any]:
+        """JSON view: amounts rounded to whole sums; all floors, or only ``floor``."""
+        floors = self.floors if floor is None else tuple(number for number in (floor,) if number in self._floors)
+        return {
+            "jkName": self.jk_name,
+            "sampleArea": self.area,
+            "installmentMonths": self.settings.months,
+            "installmentStartDate": self.settings.start_date.isoformat() if self.settings.start_date else None,
+            "hybridInstallmentEnabled": self.settings.hybrid_enabled,
+            "floors": {
+                str(number): {
+                    name: {field: _rounded(value) for field, value in plan.items()}
+                    for name, plan in self._floors[number].items()
+                }
+                for number in floors
+            },
+        }
+
+
+def _rounded(value: Any) -> Any:
+    return round(value) if isinstance(value, float) else value
+
+
+def _load_settings(jk_name: str) -> InstallmentSettings:
+    session = SessionLocal()
+    try:
+        complex_obj = (
+            session.query(ResidentialComplex)
+            .filter(ResidentialComplex.name == jk_name)
+            .first()
+        )
+        if not complex_obj:
+            raise HTTPException(status_code=404, detail=f"ЖК '{jk_name}' не найден")
+        return InstallmentSettings(
+            complex_obj.installment_months,
+            complex_obj.installment_start_date,
+            complex_obj.hybrid_installment_enabled,
+        )
+    finally:
+        session.close()
+
+
+class PaymentScenarioStore:
+    """Keeps the payment scenarios per complex; rebuilt when its prices, installment settings or units change."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._scenarios: Dict[str, PaymentScenarios] = {}
+
+    @staticmethod
+    def key(jk_name: str) -> Tuple[int, int, int]:
+        return (
+            data_versions.current(jk_name, PRICES),
+            data_versions.current(jk_name, SETTINGS),
+            # The example apartment comes from the chessboard
+            data_versions.current(jk_name, CHESS),
+        )
+
+    def get(self, jk_name: str) -> PaymentScenarios:
+        key = self.key(jk_name)
+        scenarios = self._scenarios.get(jk_name)
+        if scenarios is not None and scenarios.key == key:
+            cache_stats.hit("payment-scenarios", jk_name)
+            return scenarios
+
+        with self._lock:
+            key = self.key(jk_name)
+            scenarios = self._scenarios.get(jk_name)
+            if scenarios is None or scenarios.key != key:
+                cache_stats.miss("payment-scenarios", jk_name)
+                settings = _load_settings(jk_name)
+                grid = price_grids.get(jk_name)
+                scenarios = PaymentScenarios(
+                    jk_name,
+                    key,
+                    settings,
+                    sample_area(jk_name, chess_snapshots.get(jk_name)),
+                    grid.floors,
+                    grid.unit_prices(grid.floors, PAYMENT_SHARES),
+                )
+                self._scenarios[jk_name] = scenarios
+            else:
+                cache_stats.hit("payment-scenarios", jk_name)
+            return scenarios
+
+    def discard(self, jk_name: str) -> None:
+        with self._lock:
+            self._scenarios.pop(jk_name, None)
+
+
+payment_scenarios = PaymentScenarioStore()
@@ -1,16 +1,37 @@
 from __future__ import annotations
 
+import json
 import os
 import re
 import shutil
-import tempfile
+import threading
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import fitz  # type: ignore
 
+try:  # fcntl is POSIX only: elsewhere concurrent saves of the text index may drop entries
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+from backend.core.asset_manifest import ComplexAssets, asset_manifests
+from backend.core.cache_stats import cache_stats
+
 PLAN_CACHE_ROOT = Path("backend/static/floorplans")
-PLAN_SOURCE_ROOT = Path("static/Жилые_Комплексы")
+PLAN_TEXT_INDEX_PATH = PLAN_CACHE_ROOT / "pdf_text_index.json"
+
+# A plan matches an apartment when one of its area captions is this close (m²).
+AREA_TOLERANCE = 0.15
+
+_AREA_PATTERNS = (
+    re.compile(r"(\d+[\.,]?\d*)\s*м²"),
+    re.compile(r"(\d+[\.,]?\d*)\s*м2"),
+    re.compile(r"(\d+[\.,]?\d*)\s*м"),
+)
+# Runs of digits and separators: a numeric size occurs in the page text only inside one of them
+_LABEL_PATTERN = re.compile(r"[\d.,]+")
 
 
 def _ensure_directory(path: Path) -> None:
@@ -43,20 +64,188 @@ def _build_cached_path(jk_name: str, block_name: str, apartment_size: str | floa
     return jk_dir / filename
 
 
-def _candidate_plan_files(jk_name: str, apartment_size: str | float | int) -> Iterable[Path]:
-    base_dir = PLAN_SOURCE_ROOT / jk_name / "Planirovki"
-    if not base_dir.exists():
-        return []
+def _tmp_path(cache_path: Path) -> Path:
+    """Unique sibling to write into before replacing ``cache_path``: readers never see a partial image."""
+    return cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+
 
+def _candidate_plan_files(assets: ComplexAssets, apartment_size: str | float | int) -> Iterable[Path]:
     apartment_size = str(apartment_size)
     potential_files: list[Path] = []
     for ext in ("jpg", "jpeg", "png", "svg"):
-        potential = base_dir / f"{apartment_size}.{ext}"
-        if potential.exists():
+        potential = assets.plan_file(f"{apartment_size}.{ext}")
+        if potential is not None:
             potential_files.append(potential)
     return potential_files
 
 
+def _page_labels(text: str) -> List[str]:
+    return _LABEL_PATTERN.findall(text)
+
+
+def _page_areas(text: str) -> List[float]:
+    areas: List[float] = []
+    for pattern in _AREA_PATTERNS:
+        for match in pattern.findall(text):
+            try:
+                areas.append(float(str(match).replace(",", ".")))
+            except ValueError:
+                continue
+    return areas
+
+
+class _PdfText:
+    """Labels and areas of one PDF, with the areas sorted for range lookups."""
+
+    __slots__ = ("mtime", "size", "labels", "areas", "area_pages")
+
+    def __init__(self, mtime: int, size: int, labels: List[List[str]], areas: List[Tuple[float, int]]) -> None:
+        self.mtime = mtime
+        self.size = size
+        self.labels = labels
+        areas = sorted(areas)
+        self.areas = [area for area, _ in areas]
+        self.area_pages = [page for _, page in areas]
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "mtime": self.mtime,
+            "size": self.size,
+            "labels": self.labels,
+            "areas": [[area, page] for area, page in zip(self.areas, self.area_pages)],
+        }
+
+    def find_page(self, apartment_size: str | float | int) -> Optional[int]:
+        """First page that shows the size verbatim or an area within ``AREA_TOLERANCE`` of it."""
+        size_text = str(apartment_size)
+        target_size = float(size_text.replace(",", "."))
+
+        best: Optional[int] = None
+        for page, labels in enumerate(self.labels):
+            if any(size_text in label for label in labels):
+                best = page
+                break
+
+        # The bisect window is widened a little and re-checked exactly, so float rounding
+        # at the tolerance boundary gives the same answer as a linear scan.
+        low = bisect_left(self.areas, target_size - AREA_TOLERANCE - 1e-9)
+        high = bisect_right(self.areas, target_size + AREA_TOLERANCE + 1e-9)
+        for index in range(low, high):
+            if abs(self.areas[index] - target_size) <= AREA_TOLERANCE:
+                page = self.area_pages[index]
+                if best is None or page < best:
+                    best = page
+        return best
+
+
+def _read_text_index(path: Path) -> Dict[str, _PdfText]:
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    entries: Dict[str, _PdfText] = {}
+    for key, value in raw.items() if isinstance(raw, dict) else ():
+        try:
+            entries[key] = _PdfText(
+                value["mtime"], value["size"], value["labels"],
+                [(area, page) for area, page in value["areas"]],
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+    return entries
+
+
+def _extract_text(pdf_path: Path, mtime: int, size: int) -> _PdfText:
+    labels: List[List[str]] = []
+    areas: List[Tuple[float, int]] = []
+    with fitz.open(pdf_path) as doc:
+        for page_index, page in enumerate(doc):
+            try:
+                text = page.get_text() or ""
+            except Exception:
+                text = ""
+            labels.append(_page_labels(text))
+            areas.extend((area, page_index) for area in _page_areas(text))
+    return _PdfText(mtime, size, labels, areas)
+
+
+class PlanTextIndex:
+    """
+    One-time text extraction of the plan PDFs, persisted as JSON.
+
+    For each PDF and page it keeps the number-like labels (for the verbatim
+    size match) and every area parsed from "NN.NN м²/м2/м" captions. Entries
+    are invalidated by file mtime and size. A lookup then costs a scan over a
+    few labels and a bisect over the sorted areas, and only the chosen page of
+    the PDF is opened for rendering.
+
+    A PDF is extracted under its own lock, so lookups of other PDFs do not wait
+    for it. The JSON file is shared by the prewarm processes: a save re-reads
+    it under a file lock and adds only the new entry, keeping the entries the
+    other processes wrote meanwhile.
+    """
+
+    def __init__(self, path: Path = PLAN_TEXT_INDEX_PATH) -> None:
+        self._lock = threading.Lock()
+        self._path = path
+        self._entries: Optional[Dict[str, _PdfText]] = None
+        self._pdf_locks: Dict[str, threading.Lock] = {}
+
+    def _cached(self, key: str, stat: os.stat_result) -> Optional[_PdfText]:
+        with self._lock:
+            if self._entries is None:
+                self._entries = _read_text_index(self._path)
+            entry = self._entries.get(key)
+        if entry is not None and entry.mtime == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+        return None
+
+    def _pdf_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._pdf_locks.setdefault(key, threading.Lock())
+
+    def _save(self, key: str, entry: _PdfText) -> None:
+        """Adds ``entry`` to the shared file and picks up the entries other processes stored."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path.with_name(f"{self._path.name}.lock"), "a+") as lock_handle:
+            if fcntl is not None:
+                fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            stored = _read_text_index(self._path)
+            stored[key] = entry
+            tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+            payload = {name: value.to_json() for name, value in stored.items()}
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+        with self._lock:
+            entries = self._entries if self._entries is not None else {}
+            for name, value in stored.items():
+                entries.setdefault(name, value)
+            entries[key] = entry
+            self._entries = entries
+
+    def get(self, pdf_path: Path) -> _PdfText:
+        stat = pdf_path.stat()
+        key = str(pdf_path)
+        entry = self._cached(key, stat)
+        if entry is not None:
+            cache_stats.hit("plan-text-index")
+            return entry
+
+        with self._pdf_lock(key):
+            # Another thread may have extracted this PDF while we waited
+            entry = self._cached(key, stat)
+            if entry is not None:
+                cache_stats.hit("plan-text-index")
+                return entry
+            cache_stats.miss("plan-text-index")
+            entry = _extract_text(pdf_path, stat.st_mtime_ns, stat.st_size)
+            self._save(key, entry)
+            return entry
+
+
+plan_text_index = PlanTextIndex()
+
+
 def _generate_from_pdf(
     pdf_path: Path,
     apartment_size: str | float | int,
@@ -65,44 +254,17 @@ def _generate_from_pdf(
     if not pdf_path.exists():
         return None
 
-    doc = None
     try:
-        doc = fitz.open(pdf_path)
-        target_size = float(str(apartment_size).replace(",", "."))
-
-        for page in doc:
-            try:
-                text = page.get_text() or ""
-            except Exception:
-                text = ""
-
-            # direct text match first
-            if str(apartment_size) in text:
-                pix = page.get_pixmap()
-                pix.save(cache_path)
-                return cache_path
-
-            # fallback using regex for numeric patterns with tolerance
-            size_patterns = [
-                r"(\d+[\.,]?\d*)\s*м²",
-                r"(\d+[\.,]?\d*)\s*м2",
-                r"(\d+[\.,]?\d*)\s*м",
-            ]
-            for pattern in size_patterns:
-                for match in re.findall(pattern, text):
-                    try:
-                        found_size = float(str(match).replace(",", "."))
-                    except ValueError:
-                        continue
-                    if abs(found_size - target_size) <= 0.15:
-                        pix = page.get_pixmap()
-                        pix.save(cache_path)
-                        return cache_path
+        page_index = plan_text_index.get(pdf_path).find_page(apartment_size)
+        if page_index is None:
+            return None
+        tmp_path = _tmp_path(cache_path)
+        with fitz.open(pdf_path) as doc:
+            doc.load_page(page_index).get_pixmap().save(str(tmp_path), output="png")
+        os.replace(tmp_path, cache_path)
+        return cache_path
     except Exception as exc:  # noqa: BLE001
         print(f"[plan-cache] Failed to render '{pdf_path}': {exc}")
-    finally:
-        if doc is not None:
-            doc.close()
     return None
 
 
@@ -118,41 +280,23 @@ def ensure_plan_image_cached(
     """
     cache_path = _build_cached_path(jk_name, block_name, apartment_size)
     if cache_path.exists():
+        cache_stats.hit("plan-image", jk_name)
         return cache_path
+    cache_stats.miss("plan-image", jk_name)
+
+    assets = asset_manifests.get(jk_name)
+    candidate_files = list(_candidate_plan_files(assets, apartment_size))
 
-    candidate_files = list(_candidate_plan_files(jk_name, apartment_size))
-    base_dir = PLAN_SOURCE_ROOT / jk_name / "Planirovki"
-
-    # include block-based PDFs as fallbacks
-    normalized_block = block_name.strip()
-    normalized_variants = {
-        normalized_block,
-        normalized_block.replace(" ", ""),
-        normalized_block.replace(" ", "_"),
-        normalized_block.replace(" ", "-"),
-        normalized_block.replace(",", ""),
-        normalized_block.replace(".", ""),
-        normalized_block.replace(",", "_"),
-        normalized_block.replace(".", "_"),
-    }
-    if normalized_block.startswith("Блок"):
-        suffix = normalized_block.split(" ", 1)[-1]
-        normalized_variants.update({
-            suffix,
-            suffix.replace(" ", ""),
-            suffix.replace(" ", "_"),
-            suffix.replace(" ", "-"),
-        })
-
-    pdf_candidates = [base_dir / f"{variant}.pdf" for variant in normalized_variants]
-    if base_dir.exists():
-        for file in base_dir.iterdir():
-            if file.suffix.lower() == ".pdf":
-                pdf_candidates.append(file)
+    # the block's own PDF first, then every other plan PDF as a fallback
+    block_pdf = assets.block_pdf(block_name)
+    pdf_candidates = [block_pdf] if block_pdf is not None else []
+    pdf_candidates.extend(path for path in assets.plan_pdfs if path != block_pdf)
 
     if candidate_files:
         source_file = candidate_files[0]
-        shutil.copyfile(source_file, cache_path)
+        tmp_path = _tmp_path(cache_path)
+        shutil.copyfile(source_file, tmp_path)
+        os.replace(tmp_path, cache_path)
         return cache_path
 
     for pdf_path in pdf_candidates:
@@ -161,21 +305,3 @@ def ensure_plan_image_cached(
             return cached
 
     raise FileNotFoundError(f"Plan not found for {jk_name}, block '{block_name}', size={apartment_size}")
-
-
-def prewarm_plan_cache(
-    jk_name: str,
-    block_sizes: Iterable[tuple[str, str | float | int]],
-) -> None:
-    """Pre-populates cached plan images for the provided block/size pairs."""
-    for block_name, apartment_size in block_sizes:
-        if not block_name or apartment_size in (None, ""):
-            continue
-        try:
-            ensure_plan_image_cached(jk_name, block_name, apartment_size)
-        except FileNotFoundError:
-            # Missing individual plans are acceptable; continue warming others.
-            continue
-        except Exception as exc:  # noqa: BLE001
-            print(f"[plan-cache] Warmup error for {jk_name}/{block_name}/{apartment_size}: {exc}")
-
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:  # fcntl is POSIX only: elsewhere every worker may run its own prewarm
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+from backend.core.asset_manifest import PLANS_DIR, asset_manifests
+from backend.core.plan_cache import PLAN_CACHE_ROOT, _build_cached_path, ensure_plan_image_cached
+
+PREWARM_STATE_PATH = PLAN_CACHE_ROOT / "prewarm_state.json"
+PREWARM_LOCK_PATH = PLAN_CACHE_ROOT / "prewarm.lock"
+
+# Outcome of one (block, size) entry, as kept in the state file
+RENDERED = "rendered"
+MISSING = "missing"
+FAILED = "failed"
+
+Pair = Tuple[str, str]
+
+
+def source_fingerprint(jk_name: str) -> str:
+    """
+    Name, size and mtime of every file in the complex's plan folder. A plan
+    may come from any of them (the block PDF falls back to the others), so the
+    whole folder is one fingerprint.
+    """
+    plans_dir = asset_manifests.get(jk_name).base_dir / PLANS_DIR
+    digest = hashlib.sha1()
+    try:
+        with os.scandir(plans_dir) as entries:
+            files = sorted((entry.name, entry.stat()) for entry in entries if entry.is_file())
+    except OSError:
+        files = []
+    for name, stat in files:
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _entry_key(block_name: str, apartment_size: str) -> str:
+    return f"{block_name}|{apartment_size}"
+
+
+def _prewarm_chunk(jk_name: str, pairs: List[Pair], force: bool) -> Dict[str, str]:
+    """
+    Process pool task: renders the plans of one block. With ``force`` the
+    cached images were made from older source files and are rendered again.
+    """
+    outcomes: Dict[str, str] = {}
+    for block_name, apartment_size in pairs:
+        key = _entry_key(block_name, apartment_size)
+        try:
+            if force:
+                _build_cached_path(jk_name, block_name, apartment_size).unlink(missing_ok=True)
+            ensure_plan_image_cached(jk_name, block_name, apartment_size)
+            outcomes[key] = RENDERED
+        except FileNotFoundError:
+            # Missing individual plans are acceptable; they are retried once the sources change
+            outcomes[key] = MISSING
+        except Exception as exc:  # noqa: BLE001
+            print(f"[plan-prewarm] Error for {jk_name}/{block_name}/{apartment_size}: {exc}")
+            outcomes[key] = FAILED
+    return outcomes
+
+
+class PlanPrewarmJob:
+    """
+    Renders plan images for every (block, size) of the complexes in a process
+    pool, so PyMuPDF never blocks the event loop.
+
+    The work is split into one task per block (its PDF is the main source).
+    A state file remembers, per complex, the fingerprint of the plan folder and
+    the outcome of each entry: while the fingerprint is unchanged, entries with
+    an image on disk (or known to have no plan) are skipped; once it changes,
+    the complex's images are rendered again. Only one worker process of a host
+    runs the job at a time (file lock); progress is reported by ``status``.
+    """
+
+    def __init__(self, state_path: Path = PREWARM_STATE_PATH, lock_path: Path = PREWARM_LOCK_PATH) -> None:
+        self._state_path = state_path
+        self._lock_path = lock_path
+        self._task: Optional[asyncio.Task] = None
+        self._progress: Dict[str, Any] = {"state": "idle"}
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self._state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, Dict[str, Any]]) -> None:
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._state_path.with_name(f"{self._state_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self._state_path)
+
+    def _acquire_lock(self) -> Optional[Any]:
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self._lock_path, "a+")
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def _plan(
+            self,
+            targets: Dict[str, Set[Pair]],
+            state: Dict[str, Dict[str, Any]],
+    ) -> Tuple[List[Tuple[str, List[Pair], bool]], Dict[str, str], int]:
+        """(tasks, fingerprint per complex, skipped entries) for this run."""
+        tasks: List[Tuple[str, List[Pair], bool]] = []
+        fingerprints: Dict[str, str] = {}
+        skipped = 0
+        for jk_name, pairs in targets.items():
+            fingerprint = fingerprints[jk_name] = source_fingerprint(jk_name)
+            previous = state.get(jk_name)
+            # Without a previous run the images on disk are trusted, as ensure_plan_image_cached does
+            force = previous is not None and previous.get("fingerprint") != fingerprint
+            outcomes: Dict[str, str] = previous.get("entries", {}) if previous and not force else {}
+
+            by_block: Dict[str, List[Pair]] = {}
+            for block_name, apartment_size in sorted(pairs):
+                outcome = outcomes.get(_entry_key(block_name, apartment_size))
+                if outcome == MISSING or (
+                        outcome == RENDERED and _build_cached_path(jk_name, block_name, apartment_size).exists()
+                ):
+                    skipped += 1
+                    continue
+                by_block.setdefault(block_name, []).append((block_name, apartment_size))
+            tasks.extend((jk_name, block_pairs, force) for block_pairs in by_block.values())
+        return tasks, fingerprints, skipped
+
+    def status(self) -> Dict[str, Any]:
+        progress = dict(self._progress)
+        progress["complexes"] = {jk: dict(counts) for jk, counts in progress.get("complexes", {}).items()}
+        return progress
+
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, targets: Dict[str, Iterable[Pair]], workers: Optional[int] = None) -> bool:
+        """Starts ``run`` in the background unless a run is in progress; True if started."""
+        if self.running():
+            return False
+        self._task = asyncio.get_running_loop().create_task(self.run(targets, workers))
+        self._task.add_done_callback(self._run_done)
+        return True
+
+    @staticmethod
+    def _run_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[plan-prewarm] Prewarm failed: {task.exception()}")
+
+    async def run(self, targets: Dict[str, Iterable[Pair]], workers: Optional[int] = None) -> Dict[str, Any]:
+        targets = {jk_name: set(pairs) for jk_name, pairs in targets.items()}
+        loop = asyncio.get_running_loop()
+        lock = await loop.run_in_executor(None, self._acquire_lock)
+        if lock is None:
+            self._progress = {"state": "busy", "checked_at": time.time(), "complexes": {}}
+            return self.status()
+
+        try:
+            state = await loop.run_in_executor(None, self._load_state)
+            tasks, fingerprints, skipped = await loop.run_in_executor(None, self._plan, targets, state)
+            complexes = {
+                jk_name: {"total": len(pairs), "pending": 0, "done": 0} for jk_name, pairs in targets.items()
+            }
+            for jk_name, pairs, _ in tasks:
+                complexes[jk_name]["pending"] += len(pairs)
+            self._progress = {
+                "state": "running",
+                "started_at": time.time(),
+                "finished_at": None,
+                "total": sum(len(pairs) for pairs in targets.values()),
+                "skipped": skipped,
+                "pending": sum(len(pairs) for _, pairs, _ in tasks),
+                "done": 0,
+                RENDERED: 0,
+                MISSING: 0,
+                FAILED: 0,
+                "complexes": complexes,
+            }
+
+            results: Dict[str, Dict[str, str]] = {}
+            if tasks:
+                max_workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+                # spawn: forking a process with a running event loop and threads is not safe
+                with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+
+                    async def submit(jk_name: str, pairs: List[Pair], force: bool) -> Tuple[str, Dict[str, str]]:
+                        future = executor.submit(_prewarm_chunk, jk_name, pairs, force)
+                        return jk_name, await asyncio.wrap_future(future)
+
+                    for chunk in asyncio.as_completed([submit(*task) for task in tasks]):
+                        jk_name, outcomes = await chunk
+                        results.setdefault(jk_name, {}).update(outcomes)
+                        self._progress["done"] += len(outcomes)
+                        complexes[jk_name]["done"] += len(outcomes)
+                        for outcome in outcomes.values():
+                            self._progress[outcome] += 1
+
+            for jk_name, fingerprint in fingerprints.items():
+                previous = state.get(jk_name)
+                entries = dict(previous.get("entries", {})) if previous and previous.get("fingerprint") == fingerprint else {}
+                entries.update(results.get(jk_name, {}))
+                state[jk_name] = {"fingerprint": fingerprint, "entries": entries}
+            await loop.run_in_executor(None, self._save_state, state)
+
+            self._progress["state"] = "finished"
+            self._progress["finished_at"] = time.time()
+            print(
+                f"[plan-prewarm] {self._progress[RENDERED]} rendered, {self._progress[MISSING]} without plan, "
+                f"{self._progress[FAILED]} failed, {skipped} unchanged "
+                f"in {self._progress['finished_at'] - self._progress['started_at']:.1f}s"
+            )
+            return self.status()
+        except BaseException as exc:
+            self._progress.update(state="failed", finished_at=time.time(), error=str(exc))
+            raise
+        finally:
+            lock.close()
+
+
+plan_prewarm = PlanPrewarmJob()
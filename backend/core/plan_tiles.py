@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import fitz  # type: ignore
+
+from backend.core.cache_stats import cache_stats
+from backend.core.floor_plan_cache import FLOOR_PLAN_CACHE_ROOT, floor_page_index
+
+TILE_ROOT = FLOOR_PLAN_CACHE_ROOT / "tiles"
+
+TILE_SIZE = 256
+# Tiles are addressed by this many leading hex digits of the PDF's SHA-256.
+TILE_ID_LENGTH = 24
+# The deepest level renders the page at this many pixels per PDF point (288 dpi).
+FULL_SCALE = 4.0
+
+# Pages whose display list is kept in memory: tiles of one page are requested together.
+MAX_DISPLAY_LISTS = 8
+
+_DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile}" Overlap="0" Format="png">'
+    '<Size Width="{width}" Height="{height}"/>'
+    "</Image>"
+)
+
+
+class TileGeometry:
+    """Pixel size of a page at the deepest level and the number of levels of its pyramid."""
+
+    __slots__ = ("width", "height", "max_level", "origin")
+
+    def __init__(self, rect: "fitz.Rect") -> None:
+        self.origin = (rect.x0, rect.y0)
+        self.width = max(1, math.ceil(rect.width * FULL_SCALE))
+        self.height = max(1, math.ceil(rect.height * FULL_SCALE))
+        # DZI: level 0 is 1×1 pixel, every level doubles the size, the last one is full size
+        self.max_level = math.ceil(math.log2(max(self.width, self.height)))
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        factor = 2.0 ** (level - self.max_level)
+        return max(1, math.ceil(self.width * factor)), max(1, math.ceil(self.height * factor))
+
+    def columns_rows(self, level: int) -> Tuple[int, int]:
+        width, height = self.level_size(level)
+        return math.ceil(width / TILE_SIZE), math.ceil(height / TILE_SIZE)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"width": self.width, "height": self.height, "tileSize": TILE_SIZE, "levels": self.max_level + 1}
+
+
+class PageTileRenderer:
+    """
+    Deep Zoom (DZI) tile pyramids of PDF pages, rendered lazily.
+
+    A tile is rendered on its first request with a clip of the page and stored
+    on disk under the PDF's SHA-256, so tiles of a changed PDF get new paths
+    and never have to be invalidated. The page's display list is kept for the
+    following tiles, which turns each of them into a cheap rasterization. PDF
+    work is serialized, as PyMuPDF is not thread-safe.
+    """
+
+    def __init__(self, root: Path = TILE_ROOT, max_display_lists: int = MAX_DISPLAY_LISTS) -> None:
+        self._lock = threading.Lock()
+        self._root = root
+        self._max_display_lists = max_display_lists
+        self._pages: "OrderedDict[Tuple[str, int], Tuple[fitz.Document, fitz.DisplayList, TileGeometry]]" = OrderedDict()
+
+    def resolve(self, pdf_hash: str) -> Optional[Path]:
+        """PDF with this content hash (``TILE_ID_LENGTH`` digits); None when unknown or changed since."""
+        if len(pdf_hash) != TILE_ID_LENGTH:
+            return None
+        pdf_path = floor_page_index.path_for_hash(pdf_hash)
+        if pdf_path is None or not str(floor_page_index.entry(pdf_path)["sha256"]).startswith(pdf_hash):
+            return None
+        return pdf_path
+
+    def _page(self, pdf_path: Path, pdf_hash: str, page_index: int) -> Tuple["fitz.DisplayList", TileGeometry]:
+        # Called with self._lock held
+        key = (pdf_hash, page_index)
+        cached = self._pages.get(key)
+        if cached is not None:
+            self._pages.move_to_end(key)
+            return cached[1], cached[2]
+
+        doc = fitz.open(pdf_path)
+        if not 0 <= page_index < doc.page_count:
+            doc.close()
+            raise IndexError(f"Page {page_index} is out of range for '{pdf_path}'")
+        page = doc.load_page(page_index)
+        display_list = page.get_displaylist()
+        geometry = TileGeometry(page.rect)
+        self._pages[key] = (doc, display_list, geometry)
+        while len(self._pages) > self._max_display_lists:
+            _, (old_doc, _, _) = self._pages.popitem(last=False)
+            old_doc.close()
+        return display_list, geometry
+
+    def geometry(self, pdf_path: Path, pdf_hash: str, page_index: int) -> TileGeometry:
+        with self._lock:
+            return self._page(pdf_path, pdf_hash, page_index)[1]
+
+    def dzi(self, pdf_path: Path, pdf_hash: str, page_index: int) -> str:
+        geometry = self.geometry(pdf_path, pdf_hash, page_index)
+        return _DZI_TEMPLATE.format(tile=TILE_SIZE, width=geometry.width, height=geometry.height)
+
+    def tile_path(self, pdf_hash: str, page_index: int, level: int, column: int, row: int) -> Path:
+        return self._root / pdf_hash[:TILE_ID_LENGTH] / f"p{page_index}" / str(level) / f"{column}_{row}.png"
+
+    def tile(self, pdf_path: Path, pdf_hash: str, page_index: int, level: int, column: int, row: int) -> Path:
+        """Path of the tile PNG, rendered on first use. IndexError for a tile outside the pyramid."""
+        target = self.tile_path(pdf_hash, page_index, level, column, row)
+        if target.exists():
+            cache_stats.hit("plan-tile")
+            return target
+
+        with self._lock:
+            display_list, geometry = self._page(pdf_path, pdf_hash, page_index)
+            columns, rows = geometry.columns_rows(level) if 0 <= level <= geometry.max_level else (0, 0)
+            if not (0 <= column < columns and 0 <= row < rows):
+                raise IndexError(f"Tile {level}/{column}_{row} is outside the pyramid")
+
+            cache_stats.miss("plan-tile")
+            level_width, level_height = geometry.level_size(level)
+            scale = FULL_SCALE * 2.0 ** (level - geometry.max_level)
+            x0, y0 = column * TILE_SIZE, row * TILE_SIZE
+            x1, y1 = min(x0 + TILE_SIZE, level_width), min(y0 + TILE_SIZE, level_height)
+            origin_x, origin_y = geometry.origin
+            clip = fitz.Rect(origin_x + x0 / scale, origin_y + y0 / scale, origin_x + x1 / scale, origin_y + y1 / scale)
+            pixmap = display_list.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=False)
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f"{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            pixmap.save(str(tmp_path), output="png")
+        os.replace(tmp_path, target)
+        return target
+
+
+plan_tiles = PageTileRenderer()
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from backend.core.cache_stats import cache_stats
+from backend.core.data_versions import PRICES, data_versions
+from backend.database import SessionLocal
+from backend.database.models import ChessboardPriceEntry, ResidentialComplex
+
+# Payment schemes (share paid upfront, in percent) in the order the price sheet lists them.
+PAYMENT_SHARES: Tuple[int, ...] = (100, 70, 50, 30)
+
+# Known spellings of the price sheet headers and price keys.
+CATEGORY_ALIASES: Dict[str, int] = {
+    "1": 100, "1.0": 100, "100": 100, "100%": 100,
+    "0.7": 70, "70": 70, "70%": 70,
+    "0.5": 50, "50": 50, "50%": 50,
+    "0.3": 30, "30": 30, "30%": 30,
+}
+
+
+def category_share(category: Any) -> Optional[int]:
+    """Maps a price category ("1", "0.7", "70", "70%", 0.5 ...) to its payment share in percent."""
+    if category is None:
+        return None
+    text = str(category).strip().replace(",", ".")
+    share = CATEGORY_ALIASES.get(text)
+    if share is not None:
+        return share
+    try:
+        value = float(text.rstrip("%"))
+    except ValueError:
+        return None
+    if 0 < value <= 1:
+        value *= 100
+    share = int(round(value))
+    return share if share in PAYMENT_SHARES else None
+
+
+def _floor_number(value: Any) -> Optional[int]:
+    try:
+        number = float(str(value).strip().replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+
+class PriceGrid:
+    """
+    Dense floors × categories price-per-m² grid of one complex.
+
+    Rows follow the legacy price matrix order (floors descending), columns the
+    sheet order of categories. Missing prices are NaN. Floors resolve to rows in
+    constant time through an offset table.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            version: int,
+            floors: np.ndarray,
+            categories: Sequence[str],
+            prices: np.ndarray,
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.floors = floors
+        self.categories = tuple(categories)
+        self.prices = prices
+
+        self._min_floor = int(floors.min()) if floors.size else 0
+        span = int(floors.max()) - self._min_floor + 1 if floors.size else 0
+        self._row_by_floor = np.full(span, -1, dtype=np.int32)
+        self._row_by_floor[floors - self._min_floor] = np.arange(floors.size, dtype=np.int32)
+
+        self._column_by_share: Dict[int, int] = {}
+        for column, category in enumerate(self.categories):
+            share = category_share(category)
+            if share is not None:
+                self._column_by_share.setdefault(share, column)
+        # Unrecognised headers keep the positional meaning of the price sheet.
+        for column, share in enumerate(PAYMENT_SHARES[:len(self.categories)]):
+            self._column_by_share.setdefault(share, column)
+
+    def __len__(self) -> int:
+        return int(self.floors.shape[0])
+
+    def column(self, category: Any) -> Optional[int]:
+        share = category_share(category)
+        return self._column_by_share.get(share) if share is not None else None
+
+    def floor_rows(self, floors: Iterable[Any]) -> np.ndarray:
+        """Row index for every floor, -1 where the grid has no such floor."""
+        if isinstance(floors, np.ndarray) and np.issubdtype(floors.dtype, np.integer):
+            # Snapshot floor column: already integers, no per-unit parsing
+            values = floors.astype(np.int64, copy=False)
+        else:
+            numbers = [_floor_number(floor) for floor in floors]
+            values = np.array([number if number is not None else self._min_floor - 1 for number in numbers], dtype=np.int64)
+        offsets = values - self._min_floor
+        inside = (offsets >= 0) & (offsets < self._row_by_floor.size)
+        rows = np.full(values.shape, -1, dtype=np.int32)
+        rows[inside] = self._row_by_floor[offsets[inside]]
+        return rows
+
+    def unit_prices(self, floors: Iterable[Any], categories: Sequence[Any] = PAYMENT_SHARES) -> np.ndarray:
+        """
+        Prices per m² for N units at once: an (N, len(categories)) float array,
+        NaN where the floor or the category has no price.
+        """
+        rows = self.floor_rows(floors)
+        result = np.full((rows.size, len(categories)), np.nan, dtype=np.float64)
+        found = rows >= 0
+        for position, category in enumerate(categories):
+            column = self.column(category)
+            if column is not None:
+                result[found, position] = self.prices[rows[found], column]
+        return result
+
+    def price(self, floor: Any, category: Any) -> Optional[float]:
+        value = self.unit_prices([floor], (category,))[0, 0]
+        return None if np.isnan(value) else float(value)
+
+    def matrix(self) -> List[List[Any]]:
+        """Legacy price matrix: [floor, price per category...] rows, None for missing prices."""
+        matrix: List[List[Any]] = []
+        for row, floor in enumerate(self.floors):
+            matrix.append([int(floor)] + [None if np.isnan(value) else float(value) for value in self.prices[row]])
+        return matrix
+
+
+def _load_grid(jk_name: str, version: int) -> PriceGrid:
+    session = SessionLocal()
+    try:
+        complex_obj = (
+            session.query(ResidentialComplex)
+            .filter(ResidentialComplex.name == jk_name)
+            .first()
+        )
+        if not complex_obj:
+            raise HTTPException(status_code=404, detail=f"ЖК '{jk_name}' не найден")
+
+        entries = (
+            session.query(
+                ChessboardPriceEntry.floor,
+                ChessboardPriceEntry.category_key,
+                ChessboardPriceEntry.price_per_sqm,
+                ChessboardPriceEntry.order_index,
+            )
+            .filter(ChessboardPriceEntry.complex_id == complex_obj.id)
+            .all()
+        )
+    finally:
+        session.close()
+
+    order: Dict[str, int] = {}
+    for entry in entries:
+        order.setdefault(entry.category_key, entry.order_index)
+    categories = [key for key, _ in sorted(order.items(), key=lambda item: (item[1], item[0]))]
+    column_of = {key: column for column, key in enumerate(categories)}
+
+    floors = np.array(sorted({int(entry.floor) for entry in entries}, reverse=True), dtype=np.int32)
+    row_of = {int(floor): row for row, floor in enumerate(floors)}
+
+    prices = np.full((floors.size, len(categories)), np.nan, dtype=np.float64)
+    for entry in entries:
+        prices[row_of[int(entry.floor)], column_of[entry.category_key]] = entry.price_per_sqm
+
+    return PriceGrid(name=jk_name, version=version, floors=floors, categories=categories, prices=prices)
+
+
+class PriceGridStore:
+    """Keeps the latest price grid per complex and reloads it only when its version moves."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._grids: Dict[str, PriceGrid] = {}
+
+    def get(self, jk_name: str) -> PriceGrid:
+        version = data_versions.current(jk_name, PRICES)
+        grid = self._grids.get(jk_name)
+        if grid is not None and grid.version == version:
+            cache_stats.hit("price-grid", jk_name)
+            return grid
+
+        with self._lock:
+            grid = self._grids.get(jk_name)
+            if grid is None or grid.version != version:
+                cache_stats.miss("price-grid", jk_name)
+                grid = _load_grid(jk_name, version)
+                self._grids[jk_name] = grid
+            else:
+                cache_stats.hit("price-grid", jk_name)
+            return grid
+
+    def invalidate(self, jk_name: str) -> Optional[int]:
+        """Bumps the price version of a complex; the next reader rebuilds its grid."""
+        version = data_versions.bump(jk_name, PRICES)
+        if version is None:
+            self.discard(jk_name)
+        return version
+
+    def discard(self, jk_name: str) -> None:
+        """Drops the loaded grid without a version change (the version store is unavailable)."""
+        with self._lock:
+            self._grids.pop(jk_name, None)
+
+    def invalidate_all(self) -> None:
+        for jk_name in list(self._grids):
+            self.invalidate(jk_name)
+
+
+price_grids = PriceGridStore()
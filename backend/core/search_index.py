@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.cache_stats import cache_stats
+from backend.core.chess_snapshot import ChessSnapshot, chess_snapshots
+from backend.core.data_versions import CHESS, PRICES, data_versions
+from backend.core.unit_prices import unit_price_tables
+
+# Sort keys of ``SearchIndex.query``; a leading "-" sorts descending.
+SORT_FIELDS: Tuple[str, ...] = ("price", "area", "floor")
+SORT_PATTERN = "^-?(" + "|".join(SORT_FIELDS) + ")$"
+
+MAX_PAGE_SIZE = 200
+
+_Range = Tuple[Optional[float], Optional[float]]
+
+
+def normalize_status(value: Any) -> str:
+    """Statuses are matched case-insensitively and without surrounding spaces ("Свободна " == "свободна")."""
+    return str(value or "").strip().lower()
+
+
+def _bitset(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(mask)
+
+
+class _SortedColumn:
+    """Row positions ordered by one numeric column (NaN rows left out) for range lookups and sorting."""
+
+    __slots__ = ("values", "ascending", "descending", "missing")
+
+    def __init__(self, values: np.ndarray) -> None:
+        empty = np.isnan(values)
+        finite = np.flatnonzero(~empty)
+        self.ascending = finite[np.argsort(values[finite], kind="stable")]
+        self.descending = finite[np.argsort(-values[finite], kind="stable")]
+        self.values = values[self.ascending]
+        self.missing = np.flatnonzero(empty)
+
+    def range_mask(self, low: Optional[float], high: Optional[float], size: int) -> np.ndarray:
+        start = 0 if low is None else int(np.searchsorted(self.values, low, side="left"))
+        stop = self.values.size if high is None else int(np.searchsorted(self.values, high, side="right"))
+        mask = np.zeros(size, dtype=bool)
+        mask[self.ascending[start:stop]] = True
+        return mask
+
+    def order(self, mask: np.ndarray, descending: bool) -> np.ndarray:
+        """Matching rows in column order, rows without a value last."""
+        ordered = self.descending if descending else self.ascending
+        return np.concatenate((ordered[mask[ordered]], self.missing[mask[self.missing]]))
+
+
+class _Segment:
+    """Search columns of one complex, built from its chess snapshot and price grid versions."""
+
+    __slots__ = ("name", "key", "snapshot", "price_per_m2")
+
+    def __init__(self, name: str, key: Tuple[int, int], snapshot: ChessSnapshot, price_per_m2: np.ndarray) -> None:
+        self.name = name
+        self.key = key
+        self.snapshot = snapshot
+        self.price_per_m2 = price_per_m2
+
+
+def _load_segment(jk_name: str, key: Tuple[int, int]) -> _Segment:
+    snapshot = chess_snapshots.get(jk_name)
+    # Column 0 of the unit price table is the 100% payment scheme
+    return _Segment(jk_name, key, snapshot, unit_price_tables.get(jk_name).per_m2[:, 0])
+
+
+class SearchIndex:
+    """
+    Inverted index over the apartments of all complexes.
+
+    Equality filters (complex, status, rooms) are packed bitsets per value:
+    values of one filter are OR-ed, filters AND-ed. Range filters (area, floor,
+    total price) are binary searches in sorted columns. Facet counts follow
+    the usual multi-select rule: a facet is counted under every filter except
+    its own, so the UI can show how many units each option would add. Rows
+    keep the complex, block, floor, number order of the snapshots.
+    """
+
+    def __init__(self, key: Tuple[Tuple[str, int, int], ...], segments: Sequence[_Segment]) -> None:
+        self.key = key
+        self._segments = tuple(segments)
+        sizes = [len(segment.snapshot) for segment in self._segments]
+        self.size = int(sum(sizes))
+
+        self._segment_of = np.repeat(np.arange(len(sizes), dtype=np.int32), sizes)
+        self._position_of = np.concatenate([np.arange(size, dtype=np.int32) for size in sizes]) if sizes else np.empty(0, np.int32)
+
+        status_labels: Dict[str, int] = {}
+        status_codes: List[np.ndarray] = []
+        for segment in self._segments:
+            local = np.array(
+                [status_labels.setdefault(normalize_status(status), len(status_labels)) for status in segment.snapshot.statuses],
+                dtype=np.int32,
+            )
+            status_codes.append(local[segment.snapshot.status_codes] if local.size else np.empty(0, np.int32))
+        self._status_labels = tuple(status_labels)
+        self._status_codes = np.concatenate(status_codes) if status_codes else np.empty(0, np.int32)
+
+        rooms = _concat([segment.snapshot.rooms for segment in self._segments], np.int32)
+        self._room_labels = tuple(int(value) for value in np.unique(rooms[rooms >= 0]))
+        self._room_codes = np.searchsorted(np.array(self._room_labels, dtype=np.int32), rooms).astype(np.int32)
+        self._room_codes[rooms < 0] = -1
+
+        self._areas = _concat([segment.snapshot.areas for segment in self._segments], np.float64)
+        self._floors = _concat([segment.snapshot.floors for segment in self._segments], np.int32)
+        self._price_per_m2 = _concat([segment.price_per_m2 for segment in self._segments], np.float64)
+        # Same rounding as apartment-info's total_price
+        self._total_prices = np.round(self._price_per_m2 * self._areas)
+
+        self._complex_bits = {
+            segment.name: _bitset(self._segment_of == code) for code, segment in enumerate(self._segments)
+        }
+        self._status_bits = {label: _bitset(self._status_codes == code) for code, label in enumerate(self._status_labels)}
+        self._room_bits = {label: _bitset(self._room_codes == code) for code, label in enumerate(self._room_labels)}
+
+        self._columns = {
+            "area": _SortedColumn(self._areas),
+            "floor": _SortedColumn(self._floors.astype(np.float64)),
+            "price": _SortedColumn(self._total_prices),
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _any_of(self, bitsets: Dict[Any, np.ndarray], values: Iterable[Any]) -> np.ndarray:
+        packed = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for value in values:
+            bits = bitsets.get(value)
+            if bits is not None:
+                packed |= bits
+        return packed
+
+    def query(
+            self,
+            complexes: Sequence[str] = (),
+            statuses: Sequence[str] = (),
+            rooms: Sequence[int] = (),
+            area: _Range = (None, None),
+            floor: _Range = (None, None),
+            price: _Range = (None, None),
+            sort: Optional[str] = None,
+            skip: int = 0,
+            limit: int = 50,
+    ) -> Dict[str, Any]:
+        """``{"total", "items", "facets"}`` for one page of matching apartments."""
+        filters: Dict[str, np.ndarray] = {}
+        if complexes:
+            filters["jkName"] = self._any_of(self._complex_bits, complexes)
+        if statuses:
+            filters["status"] = self._any_of(self._status_bits, {normalize_status(status) for status in statuses})
+        if rooms:
+            filters["rooms"] = self._any_of(self._room_bits, set(rooms))
+
+        ranges: Optional[np.ndarray] = None
+        for name, (low, high) in (("area", area), ("floor", floor), ("price", price)):
+            if low is not None or high is not None:
+                column_mask = self._columns[name].range_mask(low, high, self.size)
+                ranges = column_mask if ranges is None else np.logical_and(ranges, column_mask, out=ranges)
+        if ranges is not None:
+            filters["ranges"] = _bitset(ranges)
+
+        def matching(exclude: Optional[str] = None) -> np.ndarray:
+            # Packed rows passing every filter but ``exclude``; padding bits may be set
+            packed = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+            for name, bits in filters.items():
+                if name != exclude:
+                    np.bitwise_and(packed, bits, out=packed)
+            return packed
+
+        mask = np.unpackbits(matching(), count=self.size).view(bool)
+        if sort:
+            rows = self._columns[sort.lstrip("-")].order(mask, sort.startswith("-"))
+        else:
+            rows = np.flatnonzero(mask)
+
+        facets = {
+            "jkName": _facet(matching("jkName"), self._complex_bits),
+            "status": _facet(matching("status"), self._status_bits),
+            "rooms": {str(label): count for label, count in _facet(matching("rooms"), self._room_bits).items()},
+        }
+        return {"total": int(rows.size), "items": self._items(rows[skip:skip + limit]), "facets": facets}
+
+    def _items(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        segment_codes = self._segment_of[rows].tolist()
+        positions = self._position_of[rows].tolist()
+        floors = self._floors[rows].tolist()
+        areas = self._areas[rows]
+        rooms = self._room_codes[rows]
+        price_per_m2 = self._price_per_m2[rows]
+        totals = self._total_prices[rows]
+
+        items: List[Dict[str, Any]] = []
+        for index, (segment_code, position, floor) in enumerate(zip(segment_codes, positions, floors)):
+            segment = self._segments[segment_code]
+            snapshot = segment.snapshot
+            items.append({
+                "jkName": segment.name,
+                "blockName": snapshot.block_names[snapshot.block_codes[position]],
+                "apartmentNumber": snapshot.display_numbers[position],
+                "floor": floor,
+                "apartmentSize": None if np.isnan(areas[index]) else float(areas[index]),
+                "roomsCount": self._room_labels[rooms[index]] if rooms[index] >= 0 else None,
+                "status": snapshot.statuses[snapshot.status_codes[position]],
+                "unitType": snapshot.unit_types[snapshot.type_codes[position]],
+                "pricePerM2": None if np.isnan(price_per_m2[index]) else round(float(price_per_m2[index])),
+                "totalPrice": None if np.isnan(totals[index]) else int(totals[index]),
+            })
+        return items
+
+
+def _facet(packed: np.ndarray, bitsets: Dict[Any, np.ndarray]) -> Dict[Any, int]:
+    """Rows per value: popcount of the value's bitset within the matching rows."""
+    return {value: int(np.bitwise_count(bits & packed).sum()) for value, bits in bitsets.items()}
+
+
+def _concat(arrays: List[np.ndarray], dtype: Any) -> np.ndarray:
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+
+class SearchIndexStore:
+    """
+    Keeps the search index of the current complexes. Each complex contributes
+    a segment rebuilt only when its chess or price version moves; the combined
+    index is reassembled from the segments after any change.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._segments: Dict[str, _Segment] = {}
+        self._index: Optional[SearchIndex] = None
+
+    @staticmethod
+    def _key(jk_names: Iterable[str]) -> Tuple[Tuple[str, int, int], ...]:
+        return tuple(
+            (jk_name, data_versions.current(jk_name, CHESS), data_versions.current(jk_name, PRICES))
+            for jk_name in jk_names
+        )
+
+    def get(self, jk_names: Sequence[str]) -> SearchIndex:
+        key = self._key(jk_names)
+        index = self._index
+        if index is not None and index.key == key:
+            cache_stats.hit("search-index")
+            return index
+
+        with self._lock:
+            key = self._key(jk_names)
+            index = self._index
+            if index is not None and index.key == key:
+                cache_stats.hit("search-index")
+                return index
+
+            cache_stats.miss("search-index")
+            segments: List[_Segment] = []
+            for jk_name, chess_version, prices_version in key:
+                segment = self._segments.get(jk_name)
+                if segment is None or segment.key != (chess_version, prices_version):
+                    segment = _load_segment(jk_name, (chess_version, prices_version))
+                segments.append(segment)
+            self._segments = {segment.name: segment for segment in segments}
+            self._index = SearchIndex(key, segments)
+            return self._index
+
+    def discard(self, jk_name: str) -> None:
+        """Drops a complex's segment; the combined index is reassembled on the next search."""
+        with self._lock:
+            self._segments.pop(jk_name, None)
+            self._index = None
+
+
+search_indexes = SearchIndexStore()
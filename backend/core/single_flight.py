@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from backend.core.cache_stats import cache_stats
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key.
+
+    The first caller of ``run`` for a key starts the computation in a task
+    owned by SingleFlight; it and every caller arriving while the task is in
+    flight await that task through ``asyncio.shield``. A cancelled caller
+    (a disconnected client, the first one included) only stops waiting: the
+    computation goes on and the others still get its result. Since a
+    computation outlives the request that started it, the factory must not
+    use request-scoped resources such as the request's DB session.
+
+    Nothing is remembered afterwards: caching stays the job of the stores the
+    computation writes to. Keys should contain the data version, so a
+    computation for new data never joins one for old data.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def _start(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        async def compute() -> T:
+            return await factory()
+
+        task = asyncio.get_running_loop().create_task(compute())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller has gone
+            task.exception()
+
+    async def run(
+            self,
+            key: Hashable,
+            factory: Callable[[], Awaitable[T]],
+            cache: str = "single-flight",
+            jk_name: Optional[str] = None,
+    ) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            cache_stats.coalesced(cache, jk_name)
+        else:
+            task = self._start(key, factory)
+        return await asyncio.shield(task)
+
+    def refresh(
+            self,
+            key: Hashable,
+            factory: Callable[[], Awaitable[Any]],
+            cache: str = "single-flight",
+            jk_name: Optional[str] = None,
+    ) -> bool:
+        """Starts ``factory`` in the background unless ``key`` is already in flight; True if started."""
+        if key in self._inflight:
+            return False
+        self._start(key, factory).add_done_callback(self._refresh_done)
+        return True
+
+    @staticmethod
+    def _refresh_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[single-flight] Background refresh failed: {task.exception()}")
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+single_flight = SingleFlight()
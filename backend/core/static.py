@@ -1,17 +1,70 @@
+import stat
+from pathlib import Path
 from typing import Optional
+from urllib.parse import parse_qs
 
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
 from starlette.staticfiles import StaticFiles
 
+from backend.core.image_variants import (
+    MEDIA_TYPES,
+    SOURCE_SUFFIXES,
+    available,
+    image_variants,
+    negotiate_format,
+    variant_width,
+)
+
+
+async def image_variant_response(
+        source: Path,
+        requested_width: Optional[int],
+        accept: Optional[str],
+        allow_avif: bool = False,
+) -> Optional[FileResponse]:
+    """
+    Resized WebP/AVIF (or source format) copy of ``source`` for ``?w=``, chosen by
+    the Accept header. None when no width was requested or the file has no variants.
+    """
+    width = variant_width(requested_width)
+    if width is None or not available() or source.suffix.lower() not in SOURCE_SUFFIXES:
+        return None
+    fmt = negotiate_format(accept, source, allow_avif)
+    variant = await run_in_threadpool(image_variants.get, source, width, fmt)
+    return FileResponse(variant, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
+
+
+def _requested_width(scope) -> Optional[int]:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("w")
+    if not values:
+        return None
+    try:
+        return int(values[0])
+    except ValueError:
+        return None
+
 
 class CachedStaticFiles(StaticFiles):
-    """StaticFiles with configurable Cache-Control header."""
+    """
+    StaticFiles with configurable Cache-Control header. With ``image_variants``
+    images also answer ``?w=`` with a resized WebP/AVIF copy.
+    """
 
-    def __init__(self, *args, cache_control: Optional[str] = None, **kwargs):
+    def __init__(self, *args, cache_control: Optional[str] = None, image_variants: bool = False,
+                 allow_avif: bool = False, **kwargs):
         self.cache_control = cache_control
+        self.image_variants = image_variants
+        self.allow_avif = allow_avif
         super().__init__(*args, **kwargs)
 
     async def get_response(self, path, scope):  # type: ignore[override]
-        response = await super().get_response(path, scope)
+        response = None
+        if self.image_variants:
+            response = await self._variant_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
         if (
             self.cache_control
             and response.status_code == 200
@@ -19,3 +72,14 @@ class CachedStaticFiles(StaticFiles):
         ):
             response.headers.setdefault("Cache-Control", self.cache_control)
         return response
+
+    async def _variant_response(self, path, scope) -> Optional[FileResponse]:
+        requested_width = _requested_width(scope)
+        if requested_width is None:
+            return None
+        full_path, stat_result = await run_in_threadpool(self.lookup_path, path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return await image_variant_response(
+            Path(full_path), requested_width, Headers(scope=scope).get("accept"), self.allow_avif
+        )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+
+from backend.core.cache_stats import cache_stats
+from backend.core.chess_snapshot import chess_snapshots
+from backend.core.data_versions import CHESS, PRICES, data_versions
+from backend.core.price_grid import PAYMENT_SHARES, price_grids
+
+
+class UnitPriceTable:
+    """
+    Prices of every unit of a complex under every payment scheme, in snapshot row order.
+
+    ``per_m2`` and ``totals`` are (units × ``PAYMENT_SHARES``) arrays; NaN where
+    the floor or the scheme has no price, or the unit has no area. Totals are
+    rounded the way apartment-info rounds ``total_price``.
+    """
+
+    def __init__(self, key: Tuple[int, int], ids: np.ndarray, per_m2: np.ndarray, areas: np.ndarray) -> None:
+        self.key = key
+        self.ids = ids
+        self.per_m2 = per_m2
+        self.totals = np.round(per_m2 * areas[:, np.newaxis])
+        self._id_order = np.argsort(ids, kind="stable")
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def positions(self, unit_ids: Iterable[int]) -> np.ndarray:
+        """Row position of every ``ApartmentUnit.id``, -1 for ids the table does not know."""
+        wanted = np.fromiter(unit_ids, dtype=np.int64)
+        sorted_ids = self.ids[self._id_order]
+        found = np.searchsorted(sorted_ids, wanted).clip(0, max(len(self) - 1, 0))
+        positions = np.full(wanted.shape, -1, dtype=np.int64)
+        if len(self):
+            hit = sorted_ids[found] == wanted
+            positions[hit] = self._id_order[found[hit]]
+        return positions
+
+    def rows(self) -> Dict[str, Any]:
+        """Payload enrichment for row lists: one [100, 70, 50, 30] price list per shaxmatka row."""
+        return {
+            "shares": list(PAYMENT_SHARES),
+            "pricePerM2": np.round(self.per_m2),
+            "total": self.totals,
+        }
+
+    def columns(self) -> Dict[str, Any]:
+        """Payload enrichment for the columnar format: one array per payment scheme."""
+        per_m2 = np.round(self.per_m2)
+        return {
+            "shares": list(PAYMENT_SHARES),
+            "pricePerM2": {str(share): np.ascontiguousarray(per_m2[:, column]) for column, share in enumerate(PAYMENT_SHARES)},
+            "total": {str(share): np.ascontiguousarray(self.totals[:, column]) for column, share in enumerate(PAYMENT_SHARES)},
+        }
+
+
+def _load_table(jk_name: str, key: Tuple[int, int]) -> UnitPriceTable:
+    snapshot = chess_snapshots.get(jk_name)
+    try:
+        per_m2 = price_grids.get(jk_name).unit_prices(snapshot.floors, PAYMENT_SHARES)
+    except Exception as exc:  # noqa: BLE001 - units are still listed, without prices
+        print(f"[prices] No price grid for {jk_name}: {exc}")
+        per_m2 = np.full((len(snapshot), len(PAYMENT_SHARES)), np.nan)
+    return UnitPriceTable(key, snapshot.ids, per_m2, snapshot.areas)
+
+
+class UnitPriceStore:
+    """Keeps the unit price table per complex, rebuilt when its chess or price version moves."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tables: Dict[str, UnitPriceTable] = {}
+
+    @staticmethod
+    def key(jk_name: str) -> Tuple[int, int]:
+        return data_versions.current(jk_name, CHESS), data_versions.current(jk_name, PRICES)
+
+    def get(self, jk_name: str) -> UnitPriceTable:
+        key = self.key(jk_name)
+        table = self._tables.get(jk_name)
+        if table is not None and table.key == key:
+            cache_stats.hit("unit-prices", jk_name)
+            return table
+
+        with self._lock:
+            key = self.key(jk_name)
+            table = self._tables.get(jk_name)
+            if table is None or table.key != key:
+                cache_stats.miss("unit-prices", jk_name)
+                table = _load_table(jk_name, key)
+                self._tables[jk_name] = table
+            else:
+                cache_stats.hit("unit-prices", jk_name)
+            return table
+
+    def discard(self, jk_name: str) -> None:
+        with self._lock:
+            self._tables.pop(jk_name, None)
+
+
+unit_price_tables = UnitPriceStore()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Complexes warmed at the same time: the builders hand their heavy parts to the thread pool.
+WARMUP_CONCURRENCY = 4
+
+# Invalidations of one complex arriving within this window lead to a single warmup.
+INVALIDATION_DEBOUNCE_SECONDS = 2.0
+
+# A warmer fills one endpoint's caches for a complex and returns how many entries it built.
+Warmer = Callable[[str], Awaitable[int]]
+
+
+class WarmupEngine:
+    """
+    Fills the endpoint caches ahead of the first visitor.
+
+    Endpoints register warmers that build their cache entries (payload bytes,
+    compressed variants, data contexts) exactly as a request would. ``run``
+    warms complexes concurrently, the warmers of one complex one after another
+    (they share the chess snapshot), and records per complex and per warmer
+    how long it took and how many entries were built. ``schedule`` warms one
+    complex shortly after its invalidation, coalescing bursts of updates.
+    """
+
+    def __init__(self, concurrency: int = WARMUP_CONCURRENCY) -> None:
+        self._concurrency = concurrency
+        self._warmers: List[Tuple[str, Warmer]] = []
+        self._report: Dict[str, Any] = {"state": "idle", "complexes": {}}
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, name: str, warmer: Warmer) -> None:
+        self._warmers = [(existing, fn) for existing, fn in self._warmers if existing != name]
+        self._warmers.append((name, warmer))
+
+    def warmer_names(self) -> List[str]:
+        return [name for name, _ in self._warmers]
+
+    async def warm_complex(self, jk_name: str) -> Dict[str, Any]:
+        """Runs every warmer for one complex; a failing warmer does not stop the others."""
+        started = time.perf_counter()
+        warmers: Dict[str, Any] = {}
+        for name, warmer in self._warmers:
+            warmer_started = time.perf_counter()
+            try:
+                entries = await warmer(jk_name)
+                warmers[name] = {"seconds": round(time.perf_counter() - warmer_started, 4), "entries": entries}
+            except Exception as exc:  # noqa: BLE001 - reported, the next warmer still runs
+                print(f"[warmup] {name} failed for {jk_name}: {exc}")
+                warmers[name] = {"seconds": round(time.perf_counter() - warmer_started, 4), "error": str(exc)}
+        return {"seconds": round(time.perf_counter() - started, 4), "finishedAt": time.time(), "warmers": warmers}
+
+    async def run(self, jk_names: Iterable[str], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        names = list(dict.fromkeys(jk_names))
+        semaphore = asyncio.Semaphore(max(1, concurrency or self._concurrency))
+        started = time.perf_counter()
+        self._report = {"state": "running", "startedAt": time.time(), "complexes": {}}
+
+        async def warm(jk_name: str) -> None:
+            async with semaphore:
+                self._report["complexes"][jk_name] = await self.warm_complex(jk_name)
+
+        await asyncio.gather(*(warm(jk_name) for jk_name in names))
+        self._report.update(state="finished", seconds=round(time.perf_counter() - started, 4), finishedAt=time.time())
+        slowest = sorted(self._report["complexes"].items(), key=lambda item: -item[1]["seconds"])[:3]
+        print(
+            f"[warmup] {len(names)} complexes in {self._report['seconds']:.2f}s; slowest: "
+            + ", ".join(f"{jk_name} {report['seconds']:.2f}s" for jk_name, report in slowest)
+        )
+        return self.status()
+
+    def schedule(self, jk_name: str, delay: float = INVALIDATION_DEBOUNCE_SECONDS) -> None:
+        """Warms ``jk_name`` after ``delay``; another call within the delay postpones it."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        handle = self._scheduled.pop(jk_name, None)
+        if handle is not None:
+            handle.cancel()
+        self._scheduled[jk_name] = loop.call_later(delay, self._start_scheduled, jk_name)
+
+    def _start_scheduled(self, jk_name: str) -> None:
+        self._scheduled.pop(jk_name, None)
+        task = asyncio.get_running_loop().create_task(self._warm_scheduled(jk_name))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _warm_scheduled(self, jk_name: str) -> None:
+        report = await self.warm_complex(jk_name)
+        self._report.setdefault("complexes", {})[jk_name] = report
+
+    def status(self) -> Dict[str, Any]:
+        report = dict(self._report)
+        report["complexes"] = dict(report.get("complexes", {}))
+        report["scheduled"] = sorted(self._scheduled)
+        return report
+
+
+cache_warmup = WarmupEngine()
@@ -0,0 +1,205 @@
+"""Статусы квартир шахматки и журнал их изменений.
+
+Все изменения статуса квартиры проходят через `set_apartment_status`: функция
+обновляет `status` и статусные колонки `raw_payload` и дописывает строку в
+`apartment_status_changes`. `id` строки журнала служит номером изменения, по
+нему клиенты запрашивают только изменения после известного им номера.
+Полная перезагрузка шахматки ЖК отмечается отдельной строкой без квартиры
+(`record_chess_reload`) — после неё дельты неприменимы. Повторный импорт
+шахматки, поменявший только статусы, журналируется поштучно
+(`record_chess_import`), и дельты продолжают работать.
+
+Функции не делают commit: журнал сохраняется в одной транзакции с изменением.
+После commit каждая новая строка журнала публикуется в `event_hub` в канал
+`status_channel(complex_id)` — на этом построены SSE-подписки шахматки.
+Через `cache_bus` то же событие получают подписчики других воркеров.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from backend.core.cache_bus import cache_bus
+from backend.core.event_hub import event_hub
+from backend.core.excel_importer import ChessImportDiff
+from backend.database import SessionLocal
+from backend.database.models import ApartmentStatusChange, ApartmentUnit
+
+_PENDING_EVENTS_KEY = "apartment_status_events"
+
+# Источники изменений статуса
+SOURCE_UPDATE_STATUS = "update-status"
+SOURCE_UPDATE_CHESS = "update-chess"
+SOURCE_GENERATE_CONTRACT = "generate-contract"
+SOURCE_DELETE_CONTRACT = "delete-contract"
+SOURCE_REGISTRY_SYNC = "sync-registry"
+SOURCE_IMPORT = "import"
+
+
+def set_apartment_status(
+        db: Session,
+        apartment: ApartmentUnit,
+        new_status: str,
+        source: str,
+) -> Optional[ApartmentStatusChange]:
+    """Set the apartment status and log it; returns the log row, or None if the status did not change."""
+    old_status = apartment.status
+    apartment.status = new_status
+    payload = dict(apartment.raw_payload or {})
+    for key in list(payload.keys()):
+        if isinstance(key, str) and "статус" in key.lower():
+            payload[key] = new_status
+    apartment.raw_payload = payload or None
+
+    if old_status == new_status:
+        return None
+
+    change = ApartmentStatusChange(
+        complex_id=apartment.complex_id,
+        apartment_id=apartment.id,
+        block_name=apartment.block_name,
+        floor=apartment.floor,
+        unit_number=apartment.unit_number,
+        old_status=old_status,
+        new_status=new_status,
+        source=source,
+    )
+    db.add(change)
+    return change
+
+
+def record_chess_reload(db: Session, complex_id: int, source: str = SOURCE_IMPORT) -> ApartmentStatusChange:
+    """Mark that the whole chessboard of a complex was replaced."""
+    change = ApartmentStatusChange(complex_id=complex_id, source=source)
+    db.add(change)
+    return change
+
+
+def record_chess_import(
+        db: Session,
+        complex_id: int,
+        diff: ChessImportDiff,
+        source: str = SOURCE_IMPORT,
+) -> List[ApartmentStatusChange]:
+    """
+    Log a chess import. An import that only moved statuses is logged change by
+    change, like any other status update; added, removed or otherwise edited
+    units mark a reload. An import that changed nothing is not logged.
+    """
+    if not diff.changed:
+        return []
+    if not diff.status_only:
+        return [record_chess_reload(db, complex_id, source)]
+
+    changes = []
+    for apartment_id, (block_name, floor, unit_number), old_status, new_status in diff.status_changes:
+        change = ApartmentStatusChange(
+            complex_id=complex_id,
+            apartment_id=apartment_id,
+            block_name=block_name,
+            floor=floor,
+            unit_number=unit_number,
+            old_status=old_status,
+            new_status=new_status,
+            source=source,
+        )
+        db.add(change)
+        changes.append(change)
+    return changes
+
+
+def latest_status_sequence(db: Session, complex_id: int) -> int:
+    """Number of the last logged change of a complex (0 if none)."""
+    latest = (
+        db.query(func.max(ApartmentStatusChange.id))
+        .filter(ApartmentStatusChange.complex_id == complex_id)
+        .scalar()
+    )
+    return int(latest or 0)
+
+
+def chess_reloaded_since(db: Session, complex_id: int, since: int) -> bool:
+    """True if the chessboard was reloaded after change ``since``."""
+    return db.query(
+        db.query(ApartmentStatusChange.id)
+        .filter(
+            ApartmentStatusChange.complex_id == complex_id,
+            ApartmentStatusChange.id > since,
+            ApartmentStatusChange.unit_number.is_(None),
+        )
+        .exists()
+    ).scalar()
+
+
+def get_status_changes_since(
+        db: Session,
+        complex_id: int,
+        since: int,
+        limit: int,
+) -> List[ApartmentStatusChange]:
+    """Apartment status changes of a complex after ``since``, oldest first."""
+    return (
+        db.query(ApartmentStatusChange)
+        .filter(
+            ApartmentStatusChange.complex_id == complex_id,
+            ApartmentStatusChange.id > since,
+            ApartmentStatusChange.unit_number.isnot(None),
+        )
+        .order_by(ApartmentStatusChange.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def status_channel(complex_id: int) -> Tuple[str, int]:
+    """Event hub channel of a complex's status changes."""
+    return ("apartment-status", complex_id)
+
+
+def status_change_payload(change: ApartmentStatusChange) -> Dict[str, Any]:
+    """JSON form of a log row, shared by the changes API and the event stream."""
+    if change.unit_number is None:
+        return {"type": "reset", "sequence": change.id, "source": change.source}
+    return {
+        "type": "status",
+        "sequence": change.id,
+        "apartmentId": change.apartment_id,
+        "block": change.block_name,
+        "floor": change.floor,
+        "apartmentNumber": change.unit_number,
+        "status": change.new_status,
+        "previousStatus": change.old_status,
+        "source": change.source,
+        "changedAt": change.created_at.isoformat() + "Z" if change.created_at else None,
+    }
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_status_events(session: Session, flush_context: Any) -> None:
+    for obj in session.new:
+        if isinstance(obj, ApartmentStatusChange):
+            session.info.setdefault(_PENDING_EVENTS_KEY, []).append(
+                (obj.complex_id, status_change_payload(obj))
+            )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_status_events(session: Session) -> None:
+    for complex_id, payload in session.info.pop(_PENDING_EVENTS_KEY, ()):
+        event_hub.publish(status_channel(complex_id), payload)
+        # Подписчики SSE могут быть подключены к другим воркерам
+        cache_bus.publish_threadsafe("status-event", complexId=complex_id, event=payload)
+
+
+async def _apply_remote_status_event(message: Dict[str, Any]) -> None:
+    event_hub.publish(status_channel(message["complexId"]), message["event"])
+
+
+cache_bus.on("status-event", _apply_remote_status_event)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_status_events(session: Session, previous_transaction: Any) -> None:
+    if not session.in_transaction():
+        session.info.pop(_PENDING_EVENTS_KEY, None)
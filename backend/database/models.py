@@ -20,7 +20,7 @@ from backend.api.leads.schemas import LeadState, LeadStatus
 from backend.api.rop.schemas import ExpenseCategory
 from backend.database import Base
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Time, ARRAY, Date, JSON, Float, Enum, Text, \
-    Boolean, UniqueConstraint
+    Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 
 
@@ -737,6 +737,7 @@ class ResidentialComplex(Base):
     apartments = relationship("ApartmentUnit", back_populates="complex", cascade="all, delete-orphan")
     contract_entries = relationship("ContractRegistryEntry", back_populates="complex", cascade="all, delete-orphan")
     price_entries = relationship("ChessboardPriceEntry", back_populates="complex", cascade="all, delete-orphan")
+    status_changes = relationship("ApartmentStatusChange", back_populates="complex", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<ResidentialComplex(id={self.id}, name={self.name!r})>"
@@ -834,3 +835,33 @@ class ChessboardPriceEntry(Base):
             f"<ChessboardPriceEntry(id={self.id}, complex={self.complex_id}, floor={self.floor}, "
             f"category={self.category_key!r})>"
         )
+
+
+class ApartmentStatusChange(Base):
+    """Append-only log of apartment status changes; ``id`` is the change sequence number."""
+    __tablename__ = 'apartment_status_changes'
+
+    id = Column(Integer, primary_key=True)
+    complex_id = Column(Integer, ForeignKey('residential_complexes.id', ondelete='CASCADE'), nullable=False)
+    apartment_id = Column(Integer, ForeignKey('apartment_units.id', ondelete='SET NULL'), nullable=True)
+    # NULL block/floor/number — шахматка ЖК была перезагружена целиком, клиентам нужен полный перезапрос
+    block_name = Column(String, nullable=True)
+    floor = Column(Integer, nullable=True)
+    unit_number = Column(String, nullable=True)
+    old_status = Column(String, nullable=True)
+    new_status = Column(String, nullable=True)
+    source = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    complex = relationship("ResidentialComplex", back_populates="status_changes")
+
+    __table_args__ = (
+        Index('ix_apartment_status_changes_complex_seq', 'complex_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return (
+            f"<ApartmentStatusChange(id={self.id}, complex={self.complex_id}, unit={self.unit_number!r}, "
+            f"{self.old_status!r}->{self.new_status!r})>"
+        )
@@ -5,8 +5,6 @@ from aiogram import Bot
 from aiogram.client.session.aiohttp import AiohttpSession
 from authlib.jose import jwt
 from fastapi.openapi.models import Response
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from jose import JWTError
 from sqlalchemy.orm import Session
 from starlette import status
@@ -37,13 +35,14 @@ from backend.core.middleware import (
     LoggingMiddleware,
     SecurityHeadersMiddleware,
     DatabaseConnectionMiddleware,
-    NoCacheMiddleware
+    NoCacheMiddleware,
+    CompressionMiddleware,
 )
 from backend.core.static import CachedStaticFiles
 from backend.core.rate_limiter import RateLimitMiddleware
 from backend.core.logging_config import setup_logging
 from backend.database.userservice import get_user_by_login, get_all_users
-from backend.core.cache_utils import warmup_complex_caches
+from backend.core.cache_utils import init_shared_cache, stop_shared_cache, warmup_complex_caches
 from config import logger, templates
 from backend.crm.admin.main import router as admin_router
 from backend.crm.seller.main import router as seller_router
@@ -72,6 +71,7 @@ app = FastAPI(
 )
 
 # Добавляем middleware (порядок важен!)
+app.add_middleware(CompressionMiddleware)  # Первым: сжимает ответ до того, как BaseHTTPMiddleware разобьёт тело на части
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(NoCacheMiddleware)  # Предотвращаем кеширование API в браузере
@@ -109,7 +109,13 @@ app.mount(
 )
 app.mount(
     "/static",
-    CachedStaticFiles(directory="static", cache_control="public, max-age=31536000, immutable"),
+    CachedStaticFiles(
+        directory="static",
+        cache_control="public, max-age=31536000, immutable",
+        # ?w=640 — уменьшенная копия рендера в WebP/AVIF по Accept
+        image_variants=True,
+        allow_avif=settings.IMAGE_VARIANTS_AVIF,
+    ),
     name="static"
 )
 
@@ -136,25 +142,28 @@ app.add_middleware(
 @app.on_event("startup")
 async def on_startup():
     """Функция, которая выполняется при старте сервера."""
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    # Общий кэш и рассылка инвалидаций между воркерами (settings.CACHE_BACKEND)
+    await init_shared_cache()
     # Можно также выполнить первоначальную загрузку данных, если необходимо:
     Base.metadata.create_all(bind=engine)  # Создание таблиц, если их нет
     init_roles()
-    try:
-        await warmup_complex_caches()
-    except Exception as exc:  # noqa: BLE001
-        logger.warning(f"Cache warmup failed: {exc}")
+    # Прогрев кэшей идёт в фоне: сервер принимает запросы, не дожидаясь его
     asyncio.create_task(_periodic_cache_warmup())
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_shared_cache()
+
+
 async def _periodic_cache_warmup(interval_seconds: int = 900) -> None:
-    """Re-populates caches on a rolling schedule to keep landing data fresh (every 15 minutes)."""
+    """Populates caches right away, then on a rolling schedule to keep landing data fresh (every 15 minutes)."""
     while True:
-        await asyncio.sleep(interval_seconds)
         try:
             await warmup_complex_caches()
         except Exception as exc:  # noqa: BLE001
             logger.warning(f"Scheduled cache warmup failed: {exc}")
+        await asyncio.sleep(interval_seconds)
     # asyncio.get_event_loop().create_task(run_bot())
     # await bot.set_webhook(WEBHOOK_URL, allowed_updates=USED_UPDATE_TYPES)
     # dp.include_router(draw_router)
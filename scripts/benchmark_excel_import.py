@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List
+
+from openpyxl import Workbook
+
+CHESS_HEADERS = ["Блок", "Тип", "Статус", "Кол-во комнат", "Номер помещения", "Площадь м2", "Этаж", "Примечание"]
+PRICE_HEADERS = ["Этаж", "1", "0.7", "0.5", "0.3"]
+STATUSES = ("Свободна", "Продана", "Бронь")
+
+
+def write_chess_workbook(path: Path, rows: int) -> None:
+    """Synthetic jk_data.xlsx: blocks of 16 floors × 10 units."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(CHESS_HEADERS)
+    rng = random.Random(rows)
+    for index in range(rows):
+        block, rest = divmod(index, 160)
+        floor, unit = divmod(rest, 10)
+        sheet.append([
+            f"Блок-{block + 1}",
+            "жилой" if unit else "нежилой",
+            rng.choice(STATUSES),
+            rng.randint(1, 4),
+            f"{floor + 1}{unit + 1:02d}",
+            round(rng.uniform(30, 120), 2),
+            floor + 1,
+            None if rng.random() < 0.9 else "угловая",
+        ])
+    workbook.save(path)
+
+
+def write_price_workbook(path: Path, rows: int) -> None:
+    """Synthetic price_shaxamtka.xlsx: one row per floor, four payment schemes."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(PRICE_HEADERS)
+    for floor in range(1, rows + 1):
+        base = 7_000_000 + floor * 1000
+        sheet.append([floor, base, base + 250_000, base + 500_000, base + 750_000])
+    workbook.save(path)
+
+
+def _run_import(kind: str, workbook_path: str, database_path: str) -> Dict[str, float]:
+    # Runs in a fresh process so that peak RSS belongs to this import alone
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.core.excel_importer import import_chess_from_excel, import_price_from_excel
+    from backend.database import Base
+    from backend.database.models import ResidentialComplex
+
+    engine = create_engine(f"sqlite:///{database_path}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        complex_obj = ResidentialComplex(name="ЖК_Бенчмарк", slug="zhk-benchmark")
+        session.add(complex_obj)
+        session.commit()
+
+        importer = import_chess_from_excel if kind == "chess" else import_price_from_excel
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        imported = importer(session, complex_obj, workbook_path)
+        session.commit()
+        seconds = time.perf_counter() - started
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        session.close()
+        engine.dispose()
+    return {"imported": imported, "seconds": seconds, "peak_mb": rss_after / 1024, "growth_mb": (rss_after - rss_before) / 1024}
+
+
+def benchmark(sizes: List[int], repeat: int) -> None:
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        root = Path(workdir)
+        print(f"{'import':<7}{'rows':>9}{'imported':>10}{'seconds':>10}{'rows/s':>10}{'peak MB':>10}{'growth MB':>11}")
+        for rows in sizes:
+            workbooks = {"chess": root / f"jk_data_{rows}.xlsx", "price": root / f"price_{rows}.xlsx"}
+            write_chess_workbook(workbooks["chess"], rows)
+            write_price_workbook(workbooks["price"], rows)
+            for kind, path in workbooks.items():
+                runs = []
+                for attempt in range(repeat):
+                    database = root / f"{kind}_{rows}_{attempt}.db"
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        runs.append(pool.submit(_run_import, kind, str(path), str(database)).result())
+                best = min(runs, key=lambda run: run["seconds"])
+                print(
+                    f"{kind:<7}{rows:>9}{int(best['imported']):>10}{best['seconds']:>10.2f}"
+                    f"{rows / best['seconds']:>10.0f}{best['peak_mb']:>10.0f}{best['growth_mb']:>11.0f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Excel import on synthetic workbooks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="sheet sizes to import")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the fastest is reported")
+    args = parser.parse_args()
+    benchmark(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
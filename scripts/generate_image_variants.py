@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+from backend.core.asset_manifest import ASSET_ROOT, RENDER_DIR
+from backend.core.image_variants import (
+    AVIF,
+    SOURCE_SUFFIXES,
+    VARIANT_WIDTHS,
+    WEBP,
+    available,
+    avif_supported,
+    image_variants,
+)
+from backend.core.plan_cache import PLAN_CACHE_ROOT
+
+
+def _images(directory: Path, recursive: bool = False) -> List[Path]:
+    if not directory.is_dir():
+        return []
+    paths = directory.rglob("*") if recursive else directory.iterdir()
+    return sorted(path for path in paths if path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES)
+
+
+def collect_sources(complexes: Iterable[str] | None = None) -> List[Path]:
+    """Renders of the complexes and their cached plan images."""
+    names = list(complexes) if complexes else sorted(p.name for p in ASSET_ROOT.iterdir() if p.is_dir())
+    sources: List[Path] = []
+    for name in names:
+        sources.extend(_images(ASSET_ROOT / name / RENDER_DIR))
+        sources.extend(_images(PLAN_CACHE_ROOT / name))
+    return sources
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pregenerate WebP/AVIF variants of renders and plan images")
+    parser.add_argument("complexes", nargs="*", help="complex folder names (default: all)")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(VARIANT_WIDTHS))
+    parser.add_argument("--avif", action="store_true", help="also generate AVIF variants")
+    args = parser.parse_args()
+
+    if not available():
+        raise SystemExit("Pillow is not installed (pip install Pillow)")
+    formats = [WEBP]
+    if args.avif:
+        if not avif_supported():
+            raise SystemExit("This Pillow build has no AVIF support")
+        formats.append(AVIF)
+
+    started = time.perf_counter()
+    counts = image_variants.pregenerate(collect_sources(args.complexes), args.widths, formats)
+    print(f"Generated variants: {counts} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
 from pathlib import Path
 
+from backend.core.cache_utils import announce_complex_changes
+from backend.core.data_versions import CHESS, PRICES, REGISTRY
 from backend.database import SessionLocal
 from backend.database.models import ResidentialComplex
+from backend.database.apartment_status_service import record_chess_import
 from backend.core.excel_importer import (
-    import_chess_from_excel,
+    sync_chess_from_excel,
     import_price_from_excel,
     import_contract_registry_from_excel,
 )
@@ -20,9 +25,15 @@ def slugify(name: str) -> str | None:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Import complexes from their Excel files into the database")
+    parser.add_argument('--dry-run', action='store_true', help="only report what the chess import would change")
+    args = parser.parse_args()
+
     if not BASE_DIR.exists():
         raise SystemExit(f"Base directory '{BASE_DIR}' not found")
 
+    # Complexes and data kinds the running server must reload (empty: everything)
+    changes: dict[str, tuple[str, ...]] = {}
     session = SessionLocal()
     try:
         for complex_dir in sorted(p for p in BASE_DIR.iterdir() if p.is_dir()):
@@ -32,6 +43,7 @@ def main() -> None:
                 .filter(ResidentialComplex.name == name)
                 .first()
             )
+            is_new = complex_obj is None
             if complex_obj:
                 complex_obj.slug = slugify(name)
             else:
@@ -39,25 +51,52 @@ def main() -> None:
                 session.add(complex_obj)
                 session.flush()
 
+            chess_path = complex_dir / 'jk_data.xlsx'
+            if args.dry_run:
+                if chess_path.exists():
+                    diff = sync_chess_from_excel(session, complex_obj, str(chess_path), dry_run=True)
+                    print(f"{name}: {diff.to_dict()}")
+                session.rollback()
+                continue
+
             summary: dict[str, int] = {}
+            kinds: list[str] = []
 
-            chess_path = complex_dir / 'jk_data.xlsx'
             if chess_path.exists():
-                summary['apartments'] = import_chess_from_excel(session, complex_obj, str(chess_path))
+                diff = sync_chess_from_excel(session, complex_obj, str(chess_path))
+                record_chess_import(session, complex_obj.id, diff)
+                summary['apartments'] = diff.total
+                summary.update(inserted=diff.inserted, updated=diff.updated, deleted=diff.deleted)
+                if diff.changed:
+                    kinds.append(CHESS)
+                if diff.deleted:
+                    # Contracts of deleted apartments lose their apartment_id (SET NULL)
+                    kinds.append(REGISTRY)
 
             price_path = complex_dir / 'price_shaxamtka.xlsx'
             if price_path.exists():
                 summary['prices'] = import_price_from_excel(session, complex_obj, str(price_path))
+                kinds.append(PRICES)
 
             registry_path = complex_dir / 'contract_registry.xlsx'
             if registry_path.exists():
                 summary['contracts'] = import_contract_registry_from_excel(session, complex_obj, str(registry_path))
+                if REGISTRY not in kinds:
+                    kinds.append(REGISTRY)
 
             session.commit()
+            if is_new:
+                changes[name] = ()
+            elif kinds:
+                changes[name] = tuple(kinds)
             print(f"Imported {name}: {summary}")
     finally:
         session.close()
 
+    if changes:
+        # The server caches complex data until its version moves: bump the versions it reads
+        asyncio.run(announce_complex_changes(changes))
+
 
 if __name__ == '__main__':
     main()
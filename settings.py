@@ -35,6 +35,23 @@ class Settings:
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
     
+    # Кэш: memory — только для одного воркера; redis или sqlite — общий кэш и рассылка инвалидаций между воркерами
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory").lower()
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/1")
+    CACHE_SQLITE_PATH: str = os.getenv("CACHE_SQLITE_PATH", "cache.sqlite3")
+    # Кэш: пока ответ пересобирается, лендинг получает предыдущую версию
+    CACHE_STALE_WHILE_REVALIDATE: bool = os.getenv("CACHE_STALE_WHILE_REVALIDATE", "True").lower() == "true"
+    # Прогрев кэшей: сколько ЖК греть одновременно, сколько самых частых apartment-info на ЖК,
+    # прогревать ли ЖК сразу после сброса его кэшей и где хранить статистику запросов
+    CACHE_WARMUP_CONCURRENCY: int = int(os.getenv("CACHE_WARMUP_CONCURRENCY", "4"))
+    CACHE_WARMUP_APARTMENT_INFO: int = int(os.getenv("CACHE_WARMUP_APARTMENT_INFO", "200"))
+    CACHE_WARMUP_ON_INVALIDATE: bool = os.getenv("CACHE_WARMUP_ON_INVALIDATE", "True").lower() == "true"
+    CACHE_HOT_KEYS_PATH: str = os.getenv("CACHE_HOT_KEYS_PATH", "hot_keys.json")
+    # Прогрев планировок: число процессов рендеринга (0 — по числу ядер)
+    PLAN_PREWARM_WORKERS: int = int(os.getenv("PLAN_PREWARM_WORKERS", "0"))
+    # Уменьшенные копии картинок (?w=): AVIF дополнительно к WebP, кодируется заметно дольше
+    IMAGE_VARIANTS_AVIF: bool = os.getenv("IMAGE_VARIANTS_AVIF", "False").lower() == "true"
+
     # CORS
     ALLOWED_ORIGINS: List[str] = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:8000").split(",")
     